@@ -0,0 +1,10 @@
+-- Near-duplicate chunks link to the canonical chunk instead of storing an embedding.
+-- Additive and nullable; deleting the canonical chunk unlinks its duplicates.
+ALTER TABLE "DocumentChunk" ADD COLUMN "canonicalChunkId" TEXT;
+
+ALTER TABLE "DocumentChunk"
+  ADD CONSTRAINT "DocumentChunk_canonicalChunkId_fkey"
+  FOREIGN KEY ("canonicalChunkId") REFERENCES "DocumentChunk"("id")
+  ON DELETE SET NULL ON UPDATE CASCADE;
+
+CREATE INDEX "DocumentChunk_canonicalChunkId_idx" ON "DocumentChunk"("canonicalChunkId");
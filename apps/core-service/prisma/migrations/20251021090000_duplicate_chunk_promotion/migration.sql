@@ -0,0 +1,38 @@
+-- Near-duplicate chunks store no embedding; search scores them with their canonical's.
+-- Drop vectors that linked duplicates stored before (their canonical's is used instead).
+DELETE FROM "Embedding" e
+USING "DocumentChunk" c
+WHERE e."chunkId" = c."id"
+  AND c."canonicalChunkId" IS NOT NULL
+  AND EXISTS (SELECT 1 FROM "Embedding" ce WHERE ce."chunkId" = c."canonicalChunkId");
+
+-- When a canonical chunk is deleted (directly or with its document), its first surviving
+-- duplicate takes over its embedding and becomes the canonical of the remaining duplicates,
+-- so no duplicate is left without a vector. An AFTER trigger only sees chunks that survive
+-- the DELETE, and it fires before the foreign-key actions (ON DELETE SET NULL on the links,
+-- CASCADE on "Embedding"): triggers on one table fire in name order, and theirs start "RI_".
+CREATE OR REPLACE FUNCTION "promote_duplicate_chunk"() RETURNS trigger AS $$
+DECLARE
+  heir TEXT;
+BEGIN
+  SELECT c."id" INTO heir
+  FROM "DocumentChunk" c
+  WHERE c."canonicalChunkId" = OLD."id"
+  ORDER BY c."createdAt", c."id"
+  LIMIT 1;
+  IF heir IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  UPDATE "DocumentChunk" SET "canonicalChunkId" = NULL WHERE "id" = heir;
+  UPDATE "DocumentChunk" SET "canonicalChunkId" = heir WHERE "canonicalChunkId" = OLD."id";
+  IF NOT EXISTS (SELECT 1 FROM "Embedding" WHERE "chunkId" = heir) THEN
+    UPDATE "Embedding" SET "chunkId" = heir WHERE "chunkId" = OLD."id";
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "DocumentChunk_promote_duplicate"
+AFTER DELETE ON "DocumentChunk"
+FOR EACH ROW EXECUTE FUNCTION "promote_duplicate_chunk"();
@@ -9,9 +9,20 @@ import {
   IsPositive,
   IsString,
   Min,
+  ValidateIf,
   ValidateNested,
 } from 'class-validator';
 
+export class ChunkRefDto {
+  @IsString()
+  @IsNotEmpty()
+  documentId!: string;
+
+  @IsInt()
+  @Min(0)
+  index!: number;
+}
+
 export class ReindexChunkDto {
   @IsInt()
   @Min(0)
@@ -21,15 +32,22 @@ export class ReindexChunkDto {
   @IsNotEmpty()
   text!: string;
 
+  // Required unless the chunk is a near-duplicate linked via `duplicateOf`
+  @ValidateIf((c: ReindexChunkDto) => c.duplicateOf === undefined)
   @IsArray()
   @ArrayMinSize(1)
   @IsNumber({}, { each: true })
-  embedding!: number[];
+  embedding?: number[];
 
   @IsInt()
   @Min(0)
   @IsOptional()
   tokens?: number;
+
+  @IsOptional()
+  @ValidateNested()
+  @Type(() => ChunkRefDto)
+  duplicateOf?: ChunkRefDto;
 }
 
 export class UpsertReindexDto {
@@ -64,15 +64,17 @@ export class InternalService {
       );
     }
 
-    // Validate embedding dimensions per-chunk
-    for (const c of dto.chunks) {
-      if (!Array.isArray(c.embedding) || c.embedding.length !== dto.dim) {
+    // Validate embedding dimensions per-chunk (near-duplicates carry no embedding)
+    const embedded = dto.chunks.filter((c) => !c.duplicateOf);
+    for (const c of embedded) {
+      const embedding = c.embedding ?? [];
+      if (!Array.isArray(c.embedding) || embedding.length !== dto.dim) {
         throw new BadRequestException(
-          `Embedding dimension mismatch at index ${c.index}: expected ${dto.dim}, got ${c.embedding.length}`,
+          `Embedding dimension mismatch at index ${c.index}: expected ${dto.dim}, got ${embedding.length}`,
         );
       }
       // Ensure all numbers are finite
-      if (!c.embedding.every((v) => Number.isFinite(v))) {
+      if (!embedding.every((v) => Number.isFinite(v))) {
         throw new BadRequestException(
           `Embedding contains non-finite numbers at index ${c.index}`,
         );
@@ -84,16 +86,20 @@ export class InternalService {
       idx: c.index,
       text: c.text,
       tokens: Number.isFinite(c.tokens as any) ? (c.tokens as number) : null,
-      embedding: c.embedding,
+      embedding: c.duplicateOf ? null : c.embedding,
+      dup_doc: c.duplicateOf?.documentId ?? null,
+      dup_idx: c.duplicateOf?.index ?? null,
       newid: randomUUID(),
     }));
+    const data = JSON.stringify(payload);
 
     // Execute in a single transaction using raw SQL + jsonb_to_recordset and pgvector cast
-    await this.prisma.$transaction(async (tx) => {
+    const unlinked = await this.prisma.$transaction(async (tx) => {
       await tx.$executeRaw`WITH data AS (
         SELECT *
-        FROM jsonb_to_recordset(CAST(${JSON.stringify(payload)} AS jsonb)) AS
-          t(idx int, text text, tokens int, embedding double precision[], newid text)
+        FROM jsonb_to_recordset(CAST(${data} AS jsonb)) AS
+          t(idx int, text text, tokens int, embedding double precision[],
+            dup_doc text, dup_idx int, newid text)
       ), upsert_chunks AS (
         INSERT INTO "DocumentChunk" ("id","documentId","index","text","tokens","createdAt","updatedAt")
         SELECT COALESCE(dc."id", d.newid) AS id,
@@ -116,15 +122,65 @@ export class InternalService {
              NOW()
       FROM data d
       JOIN "DocumentChunk" c ON c."documentId" = ${dto.documentId}::text AND c."index" = d.idx
+      WHERE d.dup_doc IS NULL
       ON CONFLICT ("chunkId")
       DO UPDATE SET "model" = EXCLUDED."model",
                     "dim" = EXCLUDED."dim",
                     "embedding" = EXCLUDED."embedding";`;
+
+      // Separate statements so canonical chunks inserted above are visible.
+      // Link near-duplicates to their canonical chunk (same subject only); clear stale links.
+      await tx.$executeRaw`WITH data AS (
+        SELECT *
+        FROM jsonb_to_recordset(CAST(${data} AS jsonb)) AS t(idx int, dup_doc text, dup_idx int)
+      ), canon AS (
+        SELECT d.idx, cc."id" AS canonical_id
+        FROM data d
+        LEFT JOIN "Document" cd ON cd."id" = d.dup_doc AND cd."subjectId" = ${subjectId}::text
+        LEFT JOIN "DocumentChunk" cc ON cc."documentId" = cd."id" AND cc."index" = d.dup_idx
+      )
+      UPDATE "DocumentChunk" c
+      SET "canonicalChunkId" = canon.canonical_id
+      FROM canon
+      WHERE c."documentId" = ${dto.documentId}::text
+        AND c."index" = canon.idx
+        AND c."canonicalChunkId" IS DISTINCT FROM canon.canonical_id;`;
+
+      // A chunk that became a duplicate passes its links on to its own canonical, so
+      // links stay one level deep and every duplicate resolves to a stored vector
+      await tx.$executeRaw`UPDATE "DocumentChunk" d
+      SET "canonicalChunkId" = c."canonicalChunkId"
+      FROM "DocumentChunk" c
+      WHERE c."documentId" = ${dto.documentId}::text
+        AND c."canonicalChunkId" IS NOT NULL
+        AND d."canonicalChunkId" = c."id";`;
+
+      // Duplicates keep no vector of their own: search resolves them through
+      // canonicalChunkId. Drop the one a chunk stored before it became a duplicate.
+      await tx.$executeRaw`DELETE FROM "Embedding" e
+      USING "DocumentChunk" c
+      WHERE e."chunkId" = c."id"
+        AND c."documentId" = ${dto.documentId}::text
+        AND c."canonicalChunkId" IS NOT NULL
+        AND EXISTS (SELECT 1 FROM "Embedding" ce WHERE ce."chunkId" = c."canonicalChunkId");`;
+
+      // Duplicates whose canonical is missing or has no vector (not stored yet, or
+      // rejected) cannot be resolved; report them so the caller re-sends them embedded
+      const rows = await tx.$queryRaw<Array<{ idx: number }>>`SELECT d.idx
+      FROM jsonb_to_recordset(CAST(${data} AS jsonb)) AS d(idx int, dup_doc text)
+      JOIN "DocumentChunk" c ON c."documentId" = ${dto.documentId}::text AND c."index" = d.idx
+      LEFT JOIN "Embedding" ce ON ce."chunkId" = c."canonicalChunkId"
+      WHERE d.dup_doc IS NOT NULL
+        AND ce."chunkId" IS NULL
+      ORDER BY d.idx;`;
+      return rows.map((r) => Number(r.idx));
     });
 
     return {
       upsertedChunks: dto.chunks.length,
-      upsertedEmbeddings: dto.chunks.length,
+      upsertedEmbeddings: embedded.length,
+      linkedDuplicates: dto.chunks.length - embedded.length - unlinked.length,
+      unlinkedDuplicates: unlinked,
     };
   }
 
@@ -1,6 +1,7 @@
 import { Injectable, OnModuleDestroy, OnModuleInit } from '@nestjs/common';
 import { ConfigService } from '@nestjs/config';
 import { connect } from 'amqplib';
+import { randomBytes } from 'crypto';
 import type {
   Connection as AmqpConnection,
   Channel as AmqpChannel,
@@ -68,6 +69,24 @@ export class QueueService implements OnModuleInit, OnModuleDestroy {
     this.connection = null;
   }
 
+  /**
+   * AMQP options for a job message. The W3C traceparent and publish time let
+   * oracle-service trace the job and measure its queue wait.
+   */
+  private messageOptions() {
+    const now = Date.now();
+    return {
+      persistent: true,
+      contentType: 'application/json',
+      contentEncoding: 'utf-8',
+      timestamp: Math.floor(now / 1000),
+      headers: {
+        traceparent: `00-${randomBytes(16).toString('hex')}-${randomBytes(8).toString('hex')}-01`,
+        'x-published-at': now,
+      },
+    };
+  }
+
   publishDocumentJob(payload: {
     documentId: string;
     s3Key: string;
@@ -83,11 +102,7 @@ export class QueueService implements OnModuleInit, OnModuleDestroy {
     const ok = this.channel.sendToQueue(
       this.queueName,
       Buffer.from(JSON.stringify(payload)),
-      {
-        persistent: true,
-        contentType: 'application/json',
-        contentEncoding: 'utf-8',
-      },
+      this.messageOptions(),
     );
     if (!ok) {
       throw new Error('Failed to enqueue job: internal buffer full');
@@ -122,11 +137,7 @@ export class QueueService implements OnModuleInit, OnModuleDestroy {
     const ok = this.channel.sendToQueue(
       this.reindexQueueName,
       Buffer.from(JSON.stringify(payload)),
-      {
-        persistent: true,
-        contentType: 'application/json',
-        contentEncoding: 'utf-8',
-      },
+      this.messageOptions(),
     );
     if (!ok) {
       throw new Error('Failed to enqueue reindex job: internal buffer full');
@@ -0,0 +1,51 @@
+import { ServiceUnavailableException } from '@nestjs/common';
+import { ConfigService } from '@nestjs/config';
+import { EmbeddingService } from './embedding.service';
+
+jest.mock('axios', () => ({
+  __esModule: true,
+  default: { post: jest.fn() },
+}));
+
+import axios from 'axios';
+
+const post = axios.post as unknown as jest.Mock;
+
+describe('EmbeddingService.embedTexts', () => {
+  const service = new EmbeddingService({
+    get: jest.fn(() => ({ oracleEmbed: { url: 'http://oracle:8001/' } })),
+  } as unknown as ConfigService);
+
+  const reply = (matrix: Float32Array, rows: number, dim: number, dtype = 'float32') => ({
+    data: matrix.buffer,
+    headers: {
+      'x-embedding-shape': `${rows},${dim}`,
+      'x-embedding-dtype': dtype,
+      'x-embedding-model': 'stub-miniLM',
+    },
+  });
+
+  afterEach(() => jest.clearAllMocks());
+
+  it('pins dtype=float32 and decodes one vector per text', async () => {
+    post.mockResolvedValue(reply(new Float32Array([1, 0, 0, 0, 1, 0]), 2, 3));
+
+    const out = await service.embedTexts(['alpha', 'beta']);
+
+    const [url, body, options] = post.mock.calls[0];
+    expect(url).toBe('http://oracle:8001/embed/batch');
+    expect(body).toEqual({ texts: ['alpha', 'beta'] });
+    expect(options.params).toEqual({ dtype: 'float32' });
+    expect(options.headers.Accept).toBe('application/octet-stream');
+    expect(out.dim).toBe(3);
+    expect(Array.from(out.embeddings[1])).toEqual([0, 1, 0]);
+  });
+
+  it('rejects a quantized body instead of misreading it', async () => {
+    post.mockResolvedValue(reply(new Float32Array([1, 0, 0, 0, 1, 0]), 2, 3, 'int8'));
+
+    await expect(service.embedTexts(['alpha', 'beta'])).rejects.toBeInstanceOf(
+      ServiceUnavailableException,
+    );
+  });
+});
@@ -55,4 +55,70 @@ export class EmbeddingService {
       throw new ServiceUnavailableException('Embedding service unavailable');
     }
   }
+
+  /**
+   * Embed many texts in one round trip via POST /embed/batch. Requests the
+   * compact float32 encoding (pinned with `dtype=float32`, whatever the oracle's
+   * quantization settings) and decodes it into one Float32Array per text.
+   */
+  async embedTexts(texts: string[]): Promise<{
+    model: string;
+    dim: number;
+    embeddings: Float32Array[];
+  }> {
+    if (!this.url) {
+      throw new ServiceUnavailableException(
+        'Oracle embed service not configured',
+      );
+    }
+    if (texts.length === 0) {
+      return { model: '', dim: 0, embeddings: [] };
+    }
+    const endpoint = `${this.url.replace(/\/$/, '')}/embed/batch`;
+    try {
+      const res = await axios.post<ArrayBuffer>(
+        endpoint,
+        { texts },
+        {
+          timeout: this.readTimeoutMs,
+          responseType: 'arraybuffer',
+          params: { dtype: 'float32' },
+          headers: { Accept: 'application/octet-stream' },
+        },
+      );
+      const dtype = res.headers['x-embedding-dtype'];
+      if (dtype !== undefined && dtype !== 'float32') {
+        throw new Error('Unexpected embed batch encoding');
+      }
+      const shape = String(res.headers['x-embedding-shape'] ?? '')
+        .split(',')
+        .map((v) => Number(v));
+      const [rows, dim] = shape;
+      if (
+        shape.length !== 2 ||
+        rows !== texts.length ||
+        !Number.isInteger(dim) ||
+        dim <= 0
+      ) {
+        throw new Error('Invalid embed batch response');
+      }
+      // Copy into an aligned buffer; the response body offset may not be 4-byte aligned
+      const bytes = new Uint8Array(res.data);
+      if (bytes.byteLength !== rows * dim * 4) {
+        throw new Error('Invalid embed batch response');
+      }
+      const matrix = new Float32Array(bytes.slice().buffer);
+      const embeddings: Float32Array[] = [];
+      for (let i = 0; i < rows; i++) {
+        embeddings.push(matrix.subarray(i * dim, (i + 1) * dim));
+      }
+      return {
+        model: String(res.headers['x-embedding-model'] ?? ''),
+        dim,
+        embeddings,
+      };
+    } catch {
+      throw new ServiceUnavailableException('Embedding service unavailable');
+    }
+  }
 }
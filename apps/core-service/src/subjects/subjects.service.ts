@@ -244,7 +244,9 @@ export class SubjectsService {
     // Build a vector literal inline to avoid parameterized cast issues in pgvector
     const vectorLiteral = `[${e.embedding.join(',')}]`;
 
-    // Execute pgvector similarity with parameterized vector cast
+    // Execute pgvector similarity with parameterized vector cast. Near-duplicate chunks
+    // store no vector: each hit is expanded to the duplicates linked to it, which share
+    // its score. Every hit yields at least one row, so the top k + offset hits suffice.
     const start = Date.now();
     let rows: Array<{
       documentId: string;
@@ -257,18 +259,28 @@ export class SubjectsService {
     }> = [];
     if (dto.threshold === undefined) {
       const sql = `
+        WITH hits AS (
+          SELECT e."chunkId",
+                 e."embedding" <=> ('${vectorLiteral}')::vector AS "dist"
+          FROM "Embedding" e
+          JOIN "DocumentChunk" ec ON e."chunkId" = ec."id"
+          JOIN "Document" ed ON ec."documentId" = ed."id"
+          WHERE ed."subjectId" = '${subjectId}'
+          ORDER BY e."embedding" <=> ('${vectorLiteral}')::vector ASC
+          LIMIT ${k + offset}
+        )
         SELECT d."id" AS "documentId",
                d."filename" AS "documentFilename",
                c."index" AS "chunkIndex",
                c."text" AS "snippet",
-               1 - (e."embedding" <=> ('${vectorLiteral}')::vector) AS "score",
+               1 - h."dist" AS "score",
                c."createdAt" AS "createdAt",
                c."updatedAt" AS "updatedAt"
-        FROM "Embedding" e
-        JOIN "DocumentChunk" c ON e."chunkId" = c."id"
+        FROM hits h
+        JOIN "DocumentChunk" c
+          ON c."id" = h."chunkId" OR c."canonicalChunkId" = h."chunkId"
         JOIN "Document" d ON c."documentId" = d."id"
-        WHERE d."subjectId" = '${subjectId}'
-        ORDER BY e."embedding" <=> ('${vectorLiteral}')::vector ASC
+        ORDER BY h."dist" ASC, c."canonicalChunkId" NULLS FIRST, c."id"
         LIMIT ${k} OFFSET ${offset}
       `;
       rows = await this.prisma.$queryRawUnsafe<
@@ -284,19 +296,29 @@ export class SubjectsService {
       >(sql);
     } else {
       const sql = `
+        WITH hits AS (
+          SELECT e."chunkId",
+                 e."embedding" <=> ('${vectorLiteral}')::vector AS "dist"
+          FROM "Embedding" e
+          JOIN "DocumentChunk" ec ON e."chunkId" = ec."id"
+          JOIN "Document" ed ON ec."documentId" = ed."id"
+          WHERE ed."subjectId" = '${subjectId}'
+            AND (e."embedding" <=> ('${vectorLiteral}')::vector) <= ${maxDist}
+          ORDER BY e."embedding" <=> ('${vectorLiteral}')::vector ASC
+          LIMIT ${k + offset}
+        )
         SELECT d."id" AS "documentId",
                d."filename" AS "documentFilename",
                c."index" AS "chunkIndex",
                c."text" AS "snippet",
-               1 - (e."embedding" <=> ('${vectorLiteral}')::vector) AS "score",
+               1 - h."dist" AS "score",
                c."createdAt" AS "createdAt",
                c."updatedAt" AS "updatedAt"
-        FROM "Embedding" e
-        JOIN "DocumentChunk" c ON e."chunkId" = c."id"
+        FROM hits h
+        JOIN "DocumentChunk" c
+          ON c."id" = h."chunkId" OR c."canonicalChunkId" = h."chunkId"
         JOIN "Document" d ON c."documentId" = d."id"
-        WHERE d."subjectId" = '${subjectId}'
-          AND (e."embedding" <=> ('${vectorLiteral}')::vector) <= ${maxDist}
-        ORDER BY e."embedding" <=> ('${vectorLiteral}')::vector ASC
+        ORDER BY h."dist" ASC, c."canonicalChunkId" NULLS FIRST, c."id"
         LIMIT ${k} OFFSET ${offset}
       `;
       rows = await this.prisma.$queryRawUnsafe<
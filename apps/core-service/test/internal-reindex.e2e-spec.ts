@@ -210,4 +210,113 @@ describe('Internal Reindex (e2e)', () => {
       expect(typeof emb?.model).toBe('string');
     }
   });
+
+  it('PUT /internal/reindex/:subjectId/chunks links near-duplicates to their canonical chunk without storing their vectors', async () => {
+    const token = await signup('reindex_dedup@test.com');
+    const subjectId = await createSubject(token, 'Dedup Subject');
+    const user = await prisma.user.findFirst({
+      where: { email: 'reindex_dedup@test.com' },
+    });
+    const [docA, docB] = [cuid(), cuid()];
+    for (const id of [docA, docB]) {
+      await prisma.document.create({
+        data: {
+          id,
+          filename: `${id}.pdf`,
+          s3Key: `documents/${user!.id}/${id}/f.pdf`,
+          status: 'UPLOADED',
+          subjectId,
+        },
+      });
+    }
+    const put = (body: object) =>
+      request(app.getHttpServer())
+        .put(`/internal/reindex/${subjectId}/chunks`)
+        .set('X-Internal-API-Key', INTERNAL_KEY)
+        .send(body)
+        .expect(200);
+
+    // Chunk 1 duplicates chunk 0 of the same batch
+    const first = await put({
+      documentId: docA,
+      model: 'stub-miniLM',
+      dim: 1536,
+      chunks: [
+        { index: 0, text: 'Slide one', embedding: Array(1536).fill(0.1) },
+        { index: 1, text: 'Slide one', duplicateOf: { documentId: docA, index: 0 } },
+      ],
+    });
+    expect(first.body).toEqual({
+      upsertedChunks: 2,
+      upsertedEmbeddings: 1,
+      linkedDuplicates: 1,
+      unlinkedDuplicates: [],
+    });
+
+    // Re-exported deck: chunk 0 links back to docA. Chunk 2 stored a vector in an
+    // earlier run; as a duplicate it drops it
+    await put({
+      documentId: docB,
+      model: 'stub-miniLM',
+      dim: 1536,
+      chunks: [{ index: 2, text: 'Slide one.', embedding: Array(1536).fill(0.2) }],
+    });
+    await put({
+      documentId: docB,
+      model: 'stub-miniLM',
+      dim: 1536,
+      chunks: [
+        { index: 0, text: 'Slide one', duplicateOf: { documentId: docA, index: 0 } },
+        { index: 2, text: 'Slide one.', duplicateOf: { documentId: docA, index: 0 } },
+      ],
+    });
+
+    const canonical = await prisma.documentChunk.findUnique({
+      where: { documentId_index: { documentId: docA, index: 0 } },
+      include: { duplicates: true },
+    });
+    expect(canonical?.canonicalChunkId).toBeNull();
+    expect(canonical?.duplicates.map((d) => `${d.documentId}:${d.index}`).sort()).toEqual(
+      [`${docA}:1`, `${docB}:0`, `${docB}:2`].sort(),
+    );
+    const embeddings = () =>
+      prisma.embedding.count({ where: { chunk: { document: { subjectId } } } });
+    expect(await embeddings()).toBe(1);
+
+    // A duplicate of a chunk that does not exist is stored but reported back
+    const orphan = await put({
+      documentId: docB,
+      model: 'stub-miniLM',
+      dim: 1536,
+      chunks: [
+        { index: 1, text: 'Slide two', duplicateOf: { documentId: docA, index: 7 } },
+      ],
+    });
+    expect(orphan.body.linkedDuplicates).toBe(0);
+    expect(orphan.body.unlinkedDuplicates).toEqual([1]);
+
+    // Deleting the canonical's document hands its vector to the first surviving duplicate
+    // (docB's chunk 2, stored before chunk 0), which becomes the canonical of the rest
+    await prisma.document.delete({ where: { id: docA } });
+    const heir = await prisma.documentChunk.findUnique({
+      where: { documentId_index: { documentId: docB, index: 2 } },
+      include: { embedding: true, duplicates: true },
+    });
+    expect(heir?.canonicalChunkId).toBeNull();
+    expect(heir?.embedding?.model).toBe('stub-miniLM');
+    expect(heir?.duplicates.map((d) => d.index)).toEqual([0]);
+    expect(await embeddings()).toBe(1);
+
+    // Missing embedding without duplicateOf is rejected
+    await request(app.getHttpServer())
+      .put(`/internal/reindex/${subjectId}/chunks`)
+      .set('X-Internal-API-Key', INTERNAL_KEY)
+      .send({
+        documentId: docB,
+        model: 'stub-miniLM',
+        dim: 1536,
+        chunks: [{ index: 1, text: 'No vector' }],
+      })
+      .expect(400);
+  });
 });
@@ -0,0 +1,490 @@
+from __future__ import annotations
+
+"""In-process approximate nearest neighbour search over chunk embeddings.
+
+`IVFIndex` is an inverted-file index for cosine similarity on L2-normalized
+float32 vectors: k-means centroids partition the vectors into `nlist` lists
+and a query scans only the `nprobe` lists whose centroids are closest. Until
+enough vectors exist to train (`min_train`), search is exact brute force.
+
+Inserts are assigned to the nearest existing centroid (the index retrains
+once it has grown 4x past its training size); deletes are tombstones,
+compacted once they exceed a quarter of the rows. The index is
+NumPy-only so the embed server does not need scikit-learn.
+
+`IndexRegistry` holds one index per subject and lazily loads snapshots
+written by the reindex worker (`<ANN_SNAPSHOT_DIR>/<subjectId>.npz`), falling
+back to building one from the subject's shared vector snapshot
+(`app/core/vector_snapshot.py`) when only that exists. A cached index is
+reloaded once the snapshot it came from is rewritten. With a subject PCA
+projection (`app/core/reduction.py`) the index lives in the reduced space.
+
+`IndexRegistry.update` applies inserts and deletes. With a snapshot directory
+it holds the subject's lock file, applies the change to the current snapshot
+and rewrites the .npz, so other processes (uvicorn workers, restarts) reload
+it; the reindex worker writes under the same lock. Without one the change
+stays in this process's memory.
+
+An index built from the shared snapshot scores the memory-mapped matrix in
+place (`IVFIndex.from_vectors`), so uvicorn workers share its pages; the first
+insert copies it into process memory. Indexes loaded from an .npz, or built in
+a PCA space, hold a private copy.
+"""
+
+import fcntl
+import math
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from app.core.reduction import ProjectionStore, SubjectProjection
+    from app.core.vector_snapshot import SnapshotStore, VectorSnapshot
+
+
+T = TypeVar("T")
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int, seed: int) -> np.ndarray:
+    """Spherical k-means (Lloyd iterations on normalized vectors)."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(data.shape[0], size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random points
+            sums[empty] = data[rng.choice(data.shape[0], size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        dim: int,
+        nlist: int = 0,
+        nprobe: int = 8,
+        min_train: int = 1024,
+        seed: int = 42,
+    ) -> None:
+        self.dim = int(dim)
+        self.nlist = int(nlist)  # 0 = ~sqrt(n) at training time
+        self.nprobe = int(nprobe)
+        self.min_train = int(min_train)
+        self.seed = seed
+
+        self._vecs = np.zeros((0, self.dim), dtype=np.float32)
+        self._n = 0  # rows used in _vecs (capacity may be larger)
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._n_dead = 0
+
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_n = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    # ----- mutation -----
+
+    @classmethod
+    def from_vectors(cls, ids: Sequence[str], vectors: np.ndarray, **kwargs: int) -> "IVFIndex":
+        """Index over `vectors`, used in place when already unit-norm float32 rows (e.g. an mmap)."""
+        index = cls(dim=int(vectors.shape[1]), **kwargs)
+        ids = [str(i) for i in ids]
+        n = len(ids)
+        norms = np.einsum("ij,ij->i", vectors, vectors) if n else np.ones(0, dtype=np.float32)
+        if (
+            vectors.dtype != np.float32
+            or not vectors.flags.c_contiguous
+            or vectors.shape[0] != n
+            or len(set(ids)) != n
+            or not np.allclose(norms, 1.0, atol=1e-3)
+        ):
+            index.add(ids, vectors)
+            return index
+        # Capacity == n: the first add() reallocates, so the (read-only) matrix is never written
+        index._vecs = vectors
+        index._n = n
+        index._ids = ids
+        index._row_of = {cid: r for r, cid in enumerate(ids)}
+        index._alive = np.ones(n, dtype=bool)
+        index._assign = np.full(n, -1, dtype=np.int32)
+        if n >= index.min_train:
+            index.train()
+        return index
+
+    def _reserve(self, extra: int) -> None:
+        need = self._n + extra
+        cap = self._vecs.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, int(cap * 1.5) + 16)
+        vecs = np.zeros((new_cap, self.dim), dtype=np.float32)
+        vecs[: self._n] = self._vecs[: self._n]
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self._n] = self._alive[: self._n]
+        assign = np.full(new_cap, -1, dtype=np.int32)
+        assign[: self._n] = self._assign[: self._n]
+        self._vecs, self._alive, self._assign = vecs, alive, assign
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Insert or replace vectors by id (a repeated id keeps its last vector)."""
+        vecs = _normalize(vectors)
+        if vecs.shape != (len(ids), self.dim):
+            raise ValueError(f"expected {len(ids)} vectors of dim {self.dim}, got {vecs.shape}")
+        ids = [str(i) for i in ids]
+        last = {cid: r for r, cid in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids, vecs = [ids[r] for r in keep], vecs[keep]
+        with self._lock:
+            self.remove([i for i in ids if i in self._row_of], compact=False)
+            self._reserve(len(ids))
+            start = self._n
+            rows = np.arange(start, start + len(ids))
+            self._vecs[rows] = vecs
+            self._alive[rows] = True
+            for r, cid in zip(rows, ids):
+                self._ids.append(cid)
+                self._row_of[cid] = int(r)
+            self._n += len(ids)
+
+            if not self.trained:
+                if len(self._row_of) >= self.min_train:
+                    self.train()
+            elif len(self._row_of) > 4 * max(self._trained_n, self.min_train):
+                # Lists sized for a much smaller index get too long; retrain
+                self.train()
+            else:
+                self._assign_rows(rows)
+
+    def remove(self, ids: Iterable[str], compact: bool = True) -> int:
+        removed = 0
+        with self._lock:
+            for cid in ids:
+                row = self._row_of.pop(str(cid), None)
+                if row is None:
+                    continue
+                self._alive[row] = False
+                self._n_dead += 1
+                removed += 1
+                if self.trained:
+                    lst = int(self._assign[row])
+                    self._lists[lst].remove(row)
+                    self._list_arrays.pop(lst, None)
+            if compact and self._n_dead > max(64, self._n // 4):
+                self._compact()
+        return removed
+
+    def _compact(self) -> None:
+        live = np.flatnonzero(self._alive[: self._n])
+        ids = [self._ids[r] for r in live]
+        vecs = self._vecs[live].copy()
+        centroids = self.centroids
+        self._vecs = np.zeros((0, self.dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._n = 0
+        self._n_dead = 0
+        self._ids = []
+        self._row_of = {}
+        self._reserve(len(ids))
+        self._vecs[: len(ids)] = vecs
+        self._alive[: len(ids)] = True
+        self._ids = ids
+        self._row_of = {cid: i for i, cid in enumerate(ids)}
+        self._n = len(ids)
+        if centroids is not None:
+            self.centroids = centroids
+            self._lists = [[] for _ in range(centroids.shape[0])]
+            self._list_arrays = {}
+            self._assign_rows(np.arange(self._n))
+
+    def _assign_rows(self, rows: np.ndarray) -> None:
+        assert self.centroids is not None
+        for lo in range(0, len(rows), 8192):
+            part = rows[lo : lo + 8192]
+            lists = np.argmax(self._vecs[part] @ self.centroids.T, axis=1).astype(np.int32)
+            self._assign[part] = lists
+            for r, lst in zip(part.tolist(), lists.tolist()):
+                self._lists[lst].append(r)
+                self._list_arrays.pop(lst, None)
+
+    def train(self, iters: int = 10) -> None:
+        """(Re)build centroids from the live vectors and reassign every row."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._n])
+            if live.size == 0:
+                return
+            nlist = self.nlist or max(1, int(round(math.sqrt(live.size))))
+            nlist = min(nlist, live.size)
+            rng = np.random.default_rng(self.seed)
+            sample_size = min(live.size, nlist * 64)
+            sample = self._vecs[rng.choice(live, size=sample_size, replace=False)]
+            self.centroids = _kmeans(sample, nlist, iters, self.seed)
+            self._trained_n = int(live.size)
+            self._lists = [[] for _ in range(nlist)]
+            self._list_arrays = {}
+            self._assign_rows(live)
+
+    # ----- query -----
+
+    def _list_rows(self, lst: int) -> np.ndarray:
+        arr = self._list_arrays.get(lst)
+        if arr is None:
+            arr = np.asarray(self._lists[lst], dtype=np.int64)
+            self._list_arrays[lst] = arr
+        return arr
+
+    def search(
+        self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        q = _normalize(query)[0]
+        with self._lock:
+            if not self._row_of:
+                return []
+            if not self.trained:
+                return self.brute_force(q, k)
+            probe = min(nprobe or self.nprobe, self.centroids.shape[0])  # type: ignore[union-attr]
+            near = _top_k(self.centroids @ q, probe)  # type: ignore[operator]
+            rows = np.concatenate([self._list_rows(int(c)) for c in near])
+            if rows.size == 0:
+                return []
+            scores = self._vecs[rows] @ q
+            best = _top_k(scores, min(k, rows.size))
+            return [(self._ids[int(rows[i])], float(scores[i])) for i in best]
+
+    def brute_force(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        q = _normalize(query)[0]
+        with self._lock:
+            if not self._row_of:
+                return []
+            # Score the contiguous block (no gather copy); mask out tombstones
+            scores = self._vecs[: self._n] @ q
+            if self._n_dead:
+                scores[~self._alive[: self._n]] = -np.inf
+            best = _top_k(scores, min(k, len(self._row_of)))
+            return [(self._ids[int(i)], float(scores[i])) for i in best]
+
+    # ----- persistence -----
+
+    def save(self, path: str) -> None:
+        """Write an .npz snapshot atomically (temp file + rename)."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._n])
+            arrays = {
+                "dim": np.array(self.dim),
+                "vectors": self._vecs[live],
+                "ids": np.array([self._ids[r] for r in live], dtype=str),
+            }
+            if self.centroids is not None:
+                arrays["centroids"] = self.centroids
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str, **kwargs: int) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(dim=int(data["dim"]), **kwargs)
+            ids = [str(x) for x in data["ids"]]
+            vectors = data["vectors"]
+            centroids = data["centroids"] if "centroids" in data.files else None
+        if centroids is not None:
+            index.centroids = centroids.astype(np.float32)
+            index._trained_n = len(ids)
+            index._lists = [[] for _ in range(centroids.shape[0])]
+        if ids:
+            index.add(ids, vectors)
+        return index
+
+
+_SUBJECT_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def snapshot_path(snapshot_dir: str, subject_id: str) -> str:
+    if not _SUBJECT_ID_RE.match(subject_id):
+        raise ValueError(f"invalid subject id for snapshot: {subject_id!r}")
+    return os.path.join(snapshot_dir, f"{subject_id}.npz")
+
+
+@contextmanager
+def snapshot_lock(snapshot_dir: str, subject_id: str) -> Iterator[None]:
+    """Exclusive lock on a subject's snapshot across processes (held while rewriting it)."""
+    path = snapshot_path(snapshot_dir, subject_id) + ".lock"
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Snapshots are replaced by rename, so the inode changes even within one mtime tick
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class IndexRegistry:
+    """Per-subject indexes for one process, loaded from snapshots on demand."""
+
+    def __init__(
+        self,
+        dim: int,
+        snapshot_dir: str = "",
+        vectors: Optional["SnapshotStore"] = None,
+        projections: Optional["ProjectionStore"] = None,
+        **index_kwargs: int,
+    ) -> None:
+        self.dim = dim
+        self.snapshot_dir = snapshot_dir
+        self.vectors = vectors
+        self.projections = projections
+        self.index_kwargs = index_kwargs
+        # subject -> (source the index was built from, projection it is in, index);
+        # source None = created empty
+        self._indexes: Dict[str, Tuple[Optional[Tuple[Any, ...]], Optional["SubjectProjection"], IVFIndex]] = {}
+        self._lock = threading.Lock()
+
+    def project(self, subject_id: str, mat: np.ndarray) -> np.ndarray:
+        """Map engine vectors into the subject's index space (its PCA projection, if any)."""
+        proj = self.projections.get(subject_id) if self.projections is not None else None
+        return proj.transform(mat) if proj is not None else np.atleast_2d(mat)
+
+    def _source(self, subject_id: str) -> Tuple[Optional[Tuple[Any, ...]], Optional["VectorSnapshot"]]:
+        """Identity of the snapshot an index would be built from now (and the vector snapshot)."""
+        if self.snapshot_dir:
+            stamp = _file_stamp(snapshot_path(self.snapshot_dir, subject_id))
+            if stamp is not None:
+                return ("npz", stamp), None
+        snap = self.vectors.get(subject_id) if self.vectors is not None else None
+        if snap is not None and len(snap):
+            # SnapshotStore returns the same object until the manifest changes
+            return ("vectors", snap), snap
+        return None, None
+
+    def get(
+        self, subject_id: str, create: bool = False, dim: Optional[int] = None
+    ) -> Optional[IVFIndex]:
+        source, snap = self._source(subject_id)
+        # ProjectionStore returns the same object until the basis file changes; an
+        # index built in an older basis would answer queries projected with the new one
+        proj = self.projections.get(subject_id) if self.projections is not None else None
+        with self._lock:
+            cached = self._indexes.get(subject_id)
+            if cached is not None and cached[0] == source and cached[1] is proj:
+                return cached[2]
+            index: Optional[IVFIndex] = None
+            if source is not None and source[0] == "npz":
+                index = IVFIndex.load(snapshot_path(self.snapshot_dir, subject_id), **self.index_kwargs)
+            elif snap is not None:
+                vecs = snap.vectors if proj is None else proj.transform(snap.vectors)
+                index = IVFIndex.from_vectors(snap.ids, vecs, **self.index_kwargs)
+            elif create:
+                index = IVFIndex(dim or self.dim, **self.index_kwargs)
+            if index is None:
+                # The snapshot behind a cached index was removed
+                self._indexes.pop(subject_id, None)
+            else:
+                self._indexes[subject_id] = (source, proj, index)
+            return index
+
+    def update(
+        self,
+        subject_id: str,
+        change: Callable[[IVFIndex], T],
+        create: bool = False,
+        dim: Optional[int] = None,
+    ) -> Tuple[Optional[IVFIndex], Optional[T], bool]:
+        """Apply `change` to the subject's index; returns (index, result, persisted).
+
+        With a snapshot directory the change is made to the latest snapshot under
+        the subject's lock and written back, so every process sees it (persisted
+        True). Each call rewrites the whole .npz, so send changes in batches.
+        Without a directory only this process's index changes.
+        """
+        if not self.snapshot_dir:
+            index = self.get(subject_id, create=create, dim=dim)
+            return index, (change(index) if index is not None else None), False
+        path = snapshot_path(self.snapshot_dir, subject_id)
+        with snapshot_lock(self.snapshot_dir, subject_id):
+            # Reloads if another process rewrote the snapshot since we cached it
+            index = self.get(subject_id, create=create, dim=dim)
+            if index is None:
+                return None, None, False
+            try:
+                result = change(index)
+                index.save(path)
+            except BaseException:
+                # The cached index may hold a change the file does not; reload next time
+                self.drop(subject_id)
+                raise
+            proj = self.projections.get(subject_id) if self.projections is not None else None
+            with self._lock:
+                # Our own write: keep the index instead of reloading it on the next get
+                self._indexes[subject_id] = (("npz", _file_stamp(path)), proj, index)
+        return index, result, True
+
+    def drop(self, subject_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(subject_id, None)
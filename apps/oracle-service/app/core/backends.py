@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+"""Embedding backend registry.
+
+`ConceptualEngine` looks up its backend by ENGINE_MODEL_NAME. Each backend
+embeds a batch of texts and declares the batch size it handles best and
+whether one instance may be shared across threads:
+
+    class MyBackend:
+        name = "my-model"
+        max_batch_size = 64
+        thread_safe = False     # the engine gives each pool thread its own instance
+
+        def __init__(self, dim: int): ...
+        def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+            # (len(texts), dim) float32/float64, rows L2-normalized
+            # (all-zero rows are allowed for texts with no usable tokens)
+
+    register_backend("my-model", MyBackend)
+
+Backends outside this package (e.g. a local ONNX model) are registered by
+listing their modules in ENGINE_BACKEND_PLUGINS; `load_plugins` imports them
+and they call `register_backend` at import time, so workers need no changes.
+Every registered backend must pass tests/test_backend_conformance.py.
+"""
+
+import hashlib
+import importlib
+import logging
+import threading
+from typing import Callable, Dict, List, Protocol, Sequence
+
+import numpy as np
+
+from app.core.hashing_embedder import HASHING_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend(Protocol):
+    name: str
+    dim: int
+    max_batch_size: int
+    thread_safe: bool
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+BackendFactory = Callable[[int], EmbeddingBackend]
+
+_REGISTRY: Dict[str, BackendFactory] = {}
+_LOADED_PLUGINS: set = set()
+_PLUGINS_LOCK = threading.Lock()
+
+
+def register_backend(name: str, factory: BackendFactory) -> BackendFactory:
+    """Register `factory(dim) -> backend` under `name` (re-registering replaces it)."""
+    _REGISTRY[name] = factory
+    return factory
+
+
+def available_backends() -> List[str]:
+    return sorted(_REGISTRY)
+
+
+def load_plugins(modules: str) -> None:
+    """Import comma-separated plugin modules once per process."""
+    with _PLUGINS_LOCK:
+        for mod in (m.strip() for m in modules.split(",")):
+            if mod and mod not in _LOADED_PLUGINS:
+                importlib.import_module(mod)
+                _LOADED_PLUGINS.add(mod)
+                logger.info("[Engine] Loaded embedding backend plugin %s", mod)
+
+
+def create_backend(name: str, dim: int) -> EmbeddingBackend:
+    factory = _REGISTRY.get(name)
+    if factory is None:
+        raise ValueError(
+            f"unknown embedding backend {name!r}; available: {', '.join(available_backends())}"
+        )
+    return factory(dim)
+
+
+class Sha256StubBackend:
+    """Deterministic pseudo-embeddings from SHA-256 digests (no semantic signal)."""
+
+    name = "stub-miniLM"
+    max_batch_size = 256
+    thread_safe = True
+
+    def __init__(self, dim: int) -> None:
+        self.dim = int(dim)
+
+    def _hash_words(self, text: str) -> bytes:
+        # SHA-256 over seed + 4-byte counter, enough digests to cover `dim` uint32 words
+        n_digests = -(-self.dim // 8)
+        base = hashlib.sha256(text.encode("utf-8", errors="ignore"))
+        parts = []
+        for counter in range(n_digests):
+            h = base.copy()
+            h.update(counter.to_bytes(4, "big"))
+            parts.append(h.digest())
+        return b"".join(parts)
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float64)
+        raw = np.frombuffer(b"".join(self._hash_words(t) for t in texts), dtype=">u4")
+        words = raw.reshape(len(texts), -1)[:, : self.dim]
+        # map each uint32 to [-1, 1]
+        mat = (words % 2000000).astype(np.float64) / 1000000.0 - 1.0
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        mat /= norms
+        return mat
+
+
+class HashingBackend:
+    """Hashed unigram/bigram TF + sparse random projection (app/core/hashing_embedder.py)."""
+
+    name = HASHING_MODEL_NAME
+    max_batch_size = 256
+    thread_safe = True  # read-only vectorizer and projection matrix
+
+    def __init__(self, dim: int) -> None:
+        from app.core.hashing_embedder import HashingEmbedder
+
+        self.dim = int(dim)
+        self._embedder = HashingEmbedder(self.dim)
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        return self._embedder.embed(texts)
+
+
+register_backend(Sha256StubBackend.name, Sha256StubBackend)
+register_backend(HashingBackend.name, HashingBackend)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+"""Columnar chunks of one document, as produced by `chunk_and_embed`.
+
+A list of chunk dicts holds every embedding as Python floats (~50 KB per
+1536-dim vector). `ChunkBatch` keeps the same data in columns:
+
+    texts       list[str]                      one per chunk
+    indices     int32 (n,)                     chunk index within the document
+    tokens      int32 (n,)                     token counts
+    rows        int32 (n,)                     row in `embeddings`, -1 for duplicates
+    duplicates  list[(doc_id, index) | None]   canonical chunk of a near-duplicate
+    embeddings  float32 (m, dim), C-contiguous  one row per embedded chunk
+
+Slicing (`batch[i:j]`) returns a view that shares the arrays and the embedding
+matrix, so the reindex worker splits a document into PUT batches without
+copying vectors. `payload_json` encodes the request body straight from the
+columns: embedding rows go to utils/codec.py as float32 array views, which
+orjson writes natively (the stdlib fallback converts one row at a time).
+
+Indexing with an int returns the legacy chunk dict, which keeps older callers
+and tests that treat `chunks` as a list of dicts working.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from utils import codec
+
+Duplicate = Optional[Tuple[str, int]]
+
+
+@dataclass(frozen=True)
+class ChunkBatch:
+    texts: List[str]
+    indices: np.ndarray
+    tokens: np.ndarray
+    rows: np.ndarray
+    duplicates: List[Duplicate]
+    embeddings: np.ndarray
+
+    @classmethod
+    def build(
+        cls,
+        texts: List[str],
+        tokens: Iterable[int],
+        embeddings: np.ndarray,
+        duplicates: Optional[List[Duplicate]] = None,
+        indices: Optional[Iterable[int]] = None,
+    ) -> "ChunkBatch":
+        """`embeddings` has a row per non-duplicate, in order; indices default to 0..n-1."""
+        n = len(texts)
+        dups: List[Duplicate] = duplicates if duplicates is not None else [None] * n
+        fresh = np.fromiter((d is None for d in dups), dtype=bool, count=n)
+        rows = np.full(n, -1, dtype=np.int32)
+        rows[fresh] = np.arange(int(fresh.sum()), dtype=np.int32)
+        mat = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if mat.shape[0] != int(fresh.sum()):
+            raise ValueError(f"expected {int(fresh.sum())} embedding rows, got {mat.shape[0]}")
+        return cls(
+            texts=list(texts),
+            indices=(
+                np.arange(n, dtype=np.int32)
+                if indices is None
+                else np.fromiter(indices, dtype=np.int32, count=n)
+            ),
+            tokens=np.fromiter(tokens, dtype=np.int32, count=n),
+            rows=rows,
+            duplicates=dups,
+            embeddings=mat,
+        )
+
+    @classmethod
+    def empty(cls, dim: int) -> "ChunkBatch":
+        return cls.build([], [], np.zeros((0, dim), dtype=np.float32))
+
+    @classmethod
+    def from_dicts(cls, chunks: List[Dict[str, Any]], dim: int) -> "ChunkBatch":
+        """Columnar copy of legacy chunk dicts (e.g. from a custom engine)."""
+        dups: List[Duplicate] = [
+            tuple(c["duplicateOf"]) if c.get("duplicateOf") is not None else None  # type: ignore[misc]
+            for c in chunks
+        ]
+        vectors = [c.get("embedding") for c, d in zip(chunks, dups) if d is None]
+        mat = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), dim)
+        return cls.build(
+            [str(c.get("text") or "") for c in chunks],
+            (int(c.get("tokens") or 0) for c in chunks),
+            mat,
+            dups,
+            indices=(int(c.get("index") or 0) for c in chunks),
+        )
+
+    @classmethod
+    def coerce(cls, chunks: Union["ChunkBatch", List[Dict[str, Any]]], dim: int) -> "ChunkBatch":
+        return chunks if isinstance(chunks, ChunkBatch) else cls.from_dicts(list(chunks), dim)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, key: Union[int, slice]) -> Any:
+        if isinstance(key, slice):
+            return ChunkBatch(
+                texts=self.texts[key],
+                indices=self.indices[key],
+                tokens=self.tokens[key],
+                rows=self.rows[key],
+                duplicates=self.duplicates[key],
+                embeddings=self.embeddings,
+            )
+        return self._chunk(range(len(self))[key])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._chunk(i) for i in range(len(self)))
+
+    def _chunk(self, i: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"index": int(self.indices[i]), "text": self.texts[i], "tokens": int(self.tokens[i])}
+        row = int(self.rows[i])
+        if row >= 0:
+            out["embedding"] = self.embeddings[row].tolist()
+        else:
+            out["duplicateOf"] = self.duplicates[i]
+        return out
+
+    def embedded(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk indices, float32 matrix) of the embedded chunks in this view."""
+        mask = self.rows >= 0
+        rows = self.rows[mask]
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            mat = self.embeddings[rows[0] : rows[-1] + 1]  # contiguous run: a view
+        else:
+            mat = self.embeddings[rows]
+        return self.indices[mask], mat
+
+    def payload_json(self, doc_id: str, model: str, dim: int) -> bytes:
+        """Body of PUT /internal/reindex/{subjectId}/chunks for this view."""
+        chunks: List[Dict[str, Any]] = []
+        for text, index, tokens, row, dup in zip(
+            self.texts, self.indices.tolist(), self.tokens.tolist(), self.rows.tolist(), self.duplicates
+        ):
+            chunk: Dict[str, Any] = {"index": index, "text": text, "tokens": tokens}
+            if row >= 0:
+                chunk["embedding"] = self.embeddings[row]  # row view; the codec writes float32 as-is
+            else:
+                chunk["duplicateOf"] = {"documentId": dup[0], "index": dup[1]}
+            chunks.append(chunk)
+        return codec.dumps({"documentId": doc_id, "model": model, "dim": dim, "chunks": chunks})
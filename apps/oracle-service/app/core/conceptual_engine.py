@@ -11,28 +11,47 @@ minimal, deterministic implementation that:
 Interface:
 
     class ConceptualEngine:
-        def __init__(self, model_name: str = "stub-miniLM", dim: int = 384): ...
-        def chunk_and_embed(self, pdf_bytes: bytes, doc_id: str) -> dict:
+        def __init__(self, model_name: str = "stub-miniLM", dim: int = 384, ...): ...
+        def embed_texts(self, texts: list[str]) -> np.ndarray:  # (n, dim) float32
+        def embed_quantized(self, texts: list[str], mode=None) -> Quantized  # see quantize.py
+        def chunk_and_embed(self, pdf_bytes: bytes, doc_id: str, dedup=None, timings=None) -> dict:
             return {
                 "model": self.model_name,
                 "dim": self.dim,
-                "chunks": [
+                "chunks": ChunkBatch,  # app/core/chunk_batch.py; chunks[i] is
                     {"index": i, "text": t, "embedding": [float,...], "tokens": int},
-                    ...
-                ],
+                    # with `dedup`, near-duplicates of earlier chunks are not embedded:
+                    {"index": j, "text": t, "duplicateOf": (doc_id, index), "tokens": int},
             }
 
 Notes:
-- No heavy ML dependencies are required for this stub.
+- The embedding algorithm is a backend looked up by `model_name` in
+  app/core/backends.py. `stub-miniLM`, the default, produces SHA-256
+  pseudo-vectors. `hashing-bigram-v1` uses hashed unigram/bigram TF with a
+  sparse random projection and carries lexical similarity. Inputs are split
+  into batches of the backend's `max_batch_size`, which run on a thread or
+  process pool when `pool` is set.
+- PyMuPDF is imported on the first `chunk_and_embed` call.
+- A `timings` dict passed to `chunk_and_embed` receives per-stage seconds and
+  counts (extract/pages, chunk/chunks, embed/embedded) for worker metrics.
 - The output shape conforms to the Internal API contract.
 """
 
 from dataclasses import dataclass
-import hashlib
-import math
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Sequence
 
-from utils.pdf import extract_text
+import numpy as np
+
+from app.core.backends import EmbeddingBackend, create_backend, load_plugins
+from app.core.chunk_batch import ChunkBatch
+from app.core.quantize import Quantized, quantize
+
+if TYPE_CHECKING:
+    from utils.dedup import NearDuplicateIndex
 
 
 @dataclass
@@ -40,11 +59,53 @@ class EngineConfig:
     model_name: str = "stub-miniLM"
     dim: int = 384
     max_chunk_chars: int = 600
+    # Default encoding for embed_quantized: float32 | float16 | int8 | binary
+    quantization: str = "float32"
+    # Where multi-batch calls run: none (caller thread) | thread | process
+    pool: str = "none"
+    pool_workers: int = 0  # 0 = os.cpu_count()
+
+
+# Process-pool children build their own backend once (see ConceptualEngine._get_executor)
+_PROCESS_BACKEND: Optional[EmbeddingBackend] = None
+
+
+def _init_process_backend(model_name: str, dim: int, plugins: str) -> None:
+    global _PROCESS_BACKEND
+    load_plugins(plugins)
+    _PROCESS_BACKEND = create_backend(model_name, dim)
+
+
+def _process_embed_batch(texts: Sequence[str]) -> np.ndarray:
+    assert _PROCESS_BACKEND is not None
+    return _PROCESS_BACKEND.embed_batch(texts)
 
 
 class ConceptualEngine:
-    def __init__(self, model_name: str = "stub-miniLM", dim: int = 384):
-        self.cfg = EngineConfig(model_name=model_name, dim=dim)
+    def __init__(
+        self,
+        model_name: str = "stub-miniLM",
+        dim: int = 384,
+        quantization: str = "float32",
+        pool: str = "none",
+        pool_workers: int = 0,
+        plugins: str = "",
+    ):
+        if pool not in ("none", "thread", "process"):
+            raise ValueError(f"pool must be none, thread or process; got {pool!r}")
+        self.cfg = EngineConfig(
+            model_name=model_name,
+            dim=dim,
+            quantization=quantization,
+            pool=pool,
+            pool_workers=pool_workers,
+        )
+        self._plugins = plugins
+        load_plugins(plugins)
+        self.backend = create_backend(model_name, dim)
+        self._local = threading.local()
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
 
     @property
     def model_name(self) -> str:
@@ -58,27 +119,64 @@ class ConceptualEngine:
         # naive token count for diagnostics
         return max(0, len(text.split()))
 
-    def _deterministic_vec(self, text: str) -> List[float]:
-        # Create a deterministic pseudo-embedding using SHA-256 expansions
-        dim = self.cfg.dim
-        out: List[float] = []
-        seed = text.encode("utf-8", errors="ignore")
-        counter = 0
-        while len(out) < dim:
-            h = hashlib.sha256(seed + counter.to_bytes(4, "big")).digest()
-            # turn bytes into floats in [-1, 1]
-            for i in range(0, len(h), 4):
-                if len(out) >= dim:
-                    break
-                chunk = h[i : i + 4]
-                val = int.from_bytes(chunk, "big", signed=False)
-                # map to [-1, 1]
-                out.append((val % 2000000) / 1000000.0 - 1.0)
-            counter += 1
-        # L2 normalize
-        norm = math.sqrt(sum(v * v for v in out)) or 1.0
-        out = [v / norm for v in out]
-        return out
+    def _thread_backend(self) -> EmbeddingBackend:
+        if self.backend.thread_safe:
+            return self.backend
+        # Pool threads get their own instance of backends with mutable state (sessions, tokenizers)
+        backend = getattr(self._local, "backend", None)
+        if backend is None:
+            on_main = threading.current_thread() is threading.main_thread()
+            backend = self.backend if on_main else create_backend(self.cfg.model_name, self.cfg.dim)
+            self._local.backend = backend
+        return backend
+
+    def _run_batch(self, texts: Sequence[str]) -> np.ndarray:
+        return self._thread_backend().embed_batch(texts)
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.cfg.pool == "none":
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                workers = self.cfg.pool_workers or os.cpu_count() or 1
+                if self.cfg.pool == "thread":
+                    self._executor = ThreadPoolExecutor(workers, thread_name_prefix="engine")
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        workers,
+                        initializer=_init_process_backend,
+                        initargs=(self.cfg.model_name, self.cfg.dim, self._plugins),
+                    )
+            return self._executor
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalized (n, dim) embeddings, computed in backend-sized batches."""
+        size = max(1, int(self.backend.max_batch_size))
+        batches = [list(texts[i : i + size]) for i in range(0, len(texts), size)]
+        if not batches:
+            return self.backend.embed_batch([])
+        executor = self._get_executor() if len(batches) > 1 else None
+        if executor is None:
+            parts = [self._run_batch(b) for b in batches]
+        elif self.cfg.pool == "process":
+            parts = list(executor.map(_process_embed_batch, batches))
+        else:
+            parts = list(executor.map(self._run_batch, batches))
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
+
+    def embed_texts(self, texts: Sequence[str], dtype: Any = np.float32) -> np.ndarray:
+        """Embed many texts in one vectorized call; returns an (n, dim) matrix."""
+        return self._embed_matrix(texts).astype(dtype, copy=False)
+
+    def embed_quantized(self, texts: Sequence[str], mode: Optional[str] = None) -> Quantized:
+        """Embed and encode in one step (`mode` defaults to `cfg.quantization`)."""
+        return quantize(self.embed_texts(texts), mode or self.cfg.quantization)
 
     def _split_text(self, text: str) -> List[str]:
         # Simple chunker by period and max length
@@ -99,19 +197,66 @@ class ConceptualEngine:
             chunks.append(buf)
         return chunks
 
-    def chunk_and_embed(self, pdf_bytes: bytes, doc_id: str) -> Dict[str, Any]:
-        text, _pages = extract_text(pdf_bytes)
+    def chunk_and_embed(
+        self,
+        pdf_bytes: bytes,
+        doc_id: str,
+        dedup: Optional["NearDuplicateIndex"] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Dict[str, Any]:
+        # PyMuPDF is only needed for documents; text-only callers (embed_server) skip it
+        from utils.pdf import extract_text
+
+        stats = timings if timings is not None else {}
+        t0 = time.perf_counter()
+        text, pages = extract_text(pdf_bytes)
+        t1 = time.perf_counter()
+        stats.update(extract=t1 - t0, pages=pages)
         if not text:
-            return {"model": self.model_name, "dim": self.dim, "chunks": []}
+            return {"model": self.model_name, "dim": self.dim, "chunks": ChunkBatch.empty(self.dim)}
         texts = self._split_text(text)
-        chunks = []
-        for i, t in enumerate(texts):
-            chunks.append(
-                {
-                    "index": i,
-                    "text": t,
-                    "embedding": self._deterministic_vec(t),
-                    "tokens": self._token_count(t),
-                }
-            )
+        dup_of: List[Any] = [None] * len(texts)
+        if dedup is not None:
+            dup_of = dedup.add_many([(doc_id, i) for i in range(len(texts))], texts)
+        fresh = [texts[i] for i, d in enumerate(dup_of) if d is None]
+        t2 = time.perf_counter()
+        vectors = self.embed_texts(fresh)
+        stats.update(chunk=t2 - t1, chunks=len(texts), embed=time.perf_counter() - t2, embedded=len(fresh))
+        chunks = ChunkBatch.build(texts, (self._token_count(t) for t in texts), vectors, dup_of)
         return {"model": self.model_name, "dim": self.dim, "chunks": chunks}
+
+
+_ENGINE: Optional[ConceptualEngine] = None
+
+
+def get_engine() -> ConceptualEngine:
+    """Process-wide engine built from settings.
+
+    Rebuilt only if the ENGINE_* settings change (e.g. tests resetting settings);
+    otherwise every task and request in the process shares one instance.
+    """
+    global _ENGINE
+    from config import get_settings
+
+    settings = get_settings()
+    eng = _ENGINE
+    wanted = EngineConfig(
+        model_name=settings.ENGINE_MODEL_NAME,
+        dim=settings.ENGINE_DIM,
+        quantization=settings.ENGINE_QUANTIZATION,
+        pool=settings.ENGINE_POOL,
+        pool_workers=settings.ENGINE_POOL_WORKERS,
+    )
+    if eng is None or eng.cfg != wanted or eng._plugins != settings.ENGINE_BACKEND_PLUGINS:
+        if eng is not None:
+            eng.close()
+        eng = ConceptualEngine(
+            model_name=wanted.model_name,
+            dim=wanted.dim,
+            quantization=wanted.quantization,
+            pool=wanted.pool,
+            pool_workers=wanted.pool_workers,
+            plugins=settings.ENGINE_BACKEND_PLUGINS,
+        )
+        _ENGINE = eng
+    return eng
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+"""Feature-hashing + sparse random projection embeddings (CPU, offline).
+
+Texts are tokenized into lowercase unigrams and bigrams (English stop words
+removed, as in the TF-IDF keyword path) and hashed into `n_features` buckets
+(scikit-learn's `HashingVectorizer`, MurmurHash3). Counts are weighted by
+sublinear term frequency (1 + log tf) and multiplied by a fixed
+`n_features x dim` sparse random projection with `nnz_per_feature` entries of
++-1/sqrt(nnz_per_feature) per row. The projection is seeded, so every process
+builds the same matrix. Rows are then L2-normalized.
+
+Unlike the SHA-256 stub, texts sharing vocabulary get similar vectors (the
+projection approximately preserves the cosine of the TF vectors), and a whole
+batch is one sparse matmul.
+"""
+
+from typing import Any, Sequence
+
+import numpy as np
+
+HASHING_MODEL_NAME = "hashing-bigram-v1"
+
+
+class HashingEmbedder:
+    def __init__(
+        self,
+        dim: int,
+        n_features: int = 1 << 18,
+        nnz_per_feature: int = 4,
+        seed: int = 20240917,
+    ) -> None:
+        # scikit-learn/SciPy are only imported when this backend is selected
+        from scipy import sparse
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.dim = int(dim)
+        self.n_features = int(n_features)
+        self._vectorizer = HashingVectorizer(
+            n_features=self.n_features,
+            ngram_range=(1, 2),
+            lowercase=True,
+            stop_words="english",
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32,
+        )
+        rng = np.random.default_rng(seed)
+        k = int(nnz_per_feature)
+        cols = rng.integers(0, self.dim, size=self.n_features * k, dtype=np.int32)
+        vals = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=self.n_features * k)
+        vals /= np.float32(np.sqrt(k))
+        indptr = np.arange(0, self.n_features * k + 1, k, dtype=np.int64)
+        self._projection = sparse.csr_matrix(
+            (vals, cols, indptr), shape=(self.n_features, self.dim), dtype=np.float32
+        )
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(n, dim) float32, L2-normalized (all-zero rows for texts without tokens)."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        tf: Any = self._vectorizer.transform(list(texts))
+        tf.data = 1.0 + np.log(tf.data)
+        mat = np.asarray((tf @ self._projection).todense(), dtype=np.float32)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        mat /= norms
+        return mat
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+"""Compact encodings for embedding matrices.
+
+Modes (bytes per 1536-dim vector, excluding the float32 norm/scale):
+
+    float32  6144   reference
+    float16  3072   ~1e-3 relative error per component
+    int8     1536   per-vector symmetric scale: x ~= code * scale
+    binary    192   sign bits (np.packbits); decodes to +-norm/sqrt(dim)
+
+Every mode stores each row's L2 norm so decoders can restore magnitudes (the
+engine's rows are unit length, but callers may quantize anything).
+
+Wire layout used by `to_bytes` / `from_bytes` (row-major, little-endian):
+codes, then `norms` float32[rows], then `scales` float32[rows] for int8 only.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+MODES = ("float32", "float16", "int8", "binary")
+
+
+@dataclass
+class Quantized:
+    mode: str
+    dim: int
+    codes: np.ndarray
+    norms: np.ndarray
+    scales: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        extra = self.scales.nbytes if self.scales is not None else 0
+        return int(self.codes.nbytes + self.norms.nbytes + extra)
+
+
+def _check_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"unknown quantization mode {mode!r}; expected one of {MODES}")
+    return mode
+
+
+def quantize(mat: np.ndarray, mode: str) -> Quantized:
+    mat = np.atleast_2d(np.asarray(mat, dtype=np.float32))
+    dim = int(mat.shape[1])
+    norms = np.linalg.norm(mat, axis=1).astype(np.float32)
+    _check_mode(mode)
+    if mode == "float32":
+        return Quantized(mode, dim, mat.astype("<f4", copy=False), norms)
+    if mode == "float16":
+        return Quantized(mode, dim, mat.astype("<f2"), norms)
+    if mode == "int8":
+        scales = (np.abs(mat).max(axis=1) / 127.0).astype(np.float32)
+        safe = np.where(scales > 0, scales, 1.0)[:, None]
+        codes = np.clip(np.rint(mat / safe), -127, 127).astype(np.int8)
+        return Quantized(mode, dim, codes, norms, scales)
+    return Quantized(mode, dim, np.packbits(mat > 0, axis=1), norms)
+
+
+def dequantize(q: Quantized) -> np.ndarray:
+    """Approximate float32 matrix (rows, dim)."""
+    if q.mode in ("float32", "float16"):
+        return q.codes.astype(np.float32)
+    if q.mode == "int8":
+        assert q.scales is not None
+        return q.codes.astype(np.float32) * q.scales[:, None]
+    signs = np.unpackbits(q.codes, axis=1, count=q.dim).astype(np.float32) * 2.0 - 1.0
+    return signs * (q.norms / np.sqrt(q.dim))[:, None]
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming_distances(query_codes: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Bit distance from one packed binary code (dim/8 bytes) to each row of `codes`."""
+    return _POPCOUNT[np.bitwise_xor(codes, query_codes[None, :])].sum(axis=1, dtype=np.int32)
+
+
+def to_bytes(q: Quantized) -> bytes:
+    parts = [np.ascontiguousarray(q.codes).tobytes(), q.norms.astype("<f4").tobytes()]
+    if q.scales is not None:
+        parts.append(q.scales.astype("<f4").tobytes())
+    return b"".join(parts)
+
+
+def from_bytes(buf: bytes, mode: str, rows: int, dim: int) -> Quantized:
+    _check_mode(mode)
+    if mode == "binary":
+        code_dtype, row_width = np.dtype("u1"), -(-dim // 8)
+    else:
+        code_dtype = np.dtype({"float32": "<f4", "float16": "<f2", "int8": "i1"}[mode])
+        row_width = dim
+    code_bytes = rows * row_width * code_dtype.itemsize
+    expected = code_bytes + rows * 4 * (2 if mode == "int8" else 1)
+    if len(buf) != expected:
+        raise ValueError(f"expected {expected} bytes for {rows}x{dim} {mode}, got {len(buf)}")
+    codes = np.frombuffer(buf, dtype=code_dtype, count=rows * row_width).reshape(rows, row_width)
+    norms = np.frombuffer(buf, dtype="<f4", count=rows, offset=code_bytes)
+    scales = None
+    if mode == "int8":
+        scales = np.frombuffer(buf, dtype="<f4", count=rows, offset=code_bytes + rows * 4)
+    return Quantized(mode, dim, codes, norms, scales)
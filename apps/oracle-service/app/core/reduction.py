@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+"""Per-subject PCA projections for in-process vector work.
+
+Most subjects are narrow enough that a few hundred principal directions keep
+nearly all of the variance of their 1536-dim chunk embeddings. After a
+reindex the worker fits a randomized PCA on a sample of the subject's vectors
+(`fit_projection`, scikit-learn, worker-side only) and stores it next to the
+vector snapshot as `<subjectId>.pca.npz`. The embed server loads it with
+`ProjectionStore` (NumPy only) and maps query vectors into the same space.
+
+`SubjectProjection.transform` centers, projects and L2-normalizes, so cosine
+similarity in the reduced space stays comparable across chunks and queries.
+A projection fitted under a different ENGINE_VERSION or source dim is ignored.
+"""
+
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.vector_snapshot import check_subject_id
+
+
+@dataclass
+class SubjectProjection:
+    mean: np.ndarray  # (source_dim,)
+    components: np.ndarray  # (target_dim, source_dim)
+    explained_variance_ratio: np.ndarray  # (target_dim,)
+    engine_version: str
+    n_samples: int
+
+    @property
+    def source_dim(self) -> int:
+        return int(self.components.shape[1])
+
+    @property
+    def target_dim(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def explained_variance(self) -> float:
+        return float(self.explained_variance_ratio.sum())
+
+    def transform(self, mat: np.ndarray) -> np.ndarray:
+        mat = np.atleast_2d(np.asarray(mat, dtype=np.float32))
+        out = (mat - self.mean) @ self.components.T
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).astype(np.float32, copy=False)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "dim": self.target_dim,
+            "sourceDim": self.source_dim,
+            "explainedVariance": round(self.explained_variance, 4),
+            "samples": self.n_samples,
+        }
+
+
+def fit_projection(
+    mat: np.ndarray,
+    target_dim: int,
+    engine_version: str,
+    sample_size: int = 4096,
+    seed: int = 42,
+) -> Optional[SubjectProjection]:
+    """Randomized PCA on up to `sample_size` rows; None if there are too few rows."""
+    # Heavy import kept out of the embed server's import path
+    from sklearn.decomposition import PCA
+
+    mat = np.asarray(mat, dtype=np.float32)
+    n, dim = mat.shape
+    if target_dim <= 0 or target_dim >= dim or n <= target_dim:
+        return None
+    if n > sample_size:
+        rng = np.random.default_rng(seed)
+        mat = mat[rng.choice(n, size=sample_size, replace=False)]
+    pca = PCA(n_components=target_dim, svd_solver="randomized", random_state=seed)
+    pca.fit(mat)
+    return SubjectProjection(
+        mean=pca.mean_.astype(np.float32),
+        components=pca.components_.astype(np.float32),
+        explained_variance_ratio=pca.explained_variance_ratio_.astype(np.float32),
+        engine_version=engine_version,
+        n_samples=int(mat.shape[0]),
+    )
+
+
+def projection_path(root: str, subject_id: str) -> str:
+    return os.path.join(root, f"{check_subject_id(subject_id)}.pca.npz")
+
+
+def save_projection(root: str, subject_id: str, proj: SubjectProjection) -> str:
+    path = projection_path(root, subject_id)
+    os.makedirs(root, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=root, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                mean=proj.mean,
+                components=proj.components,
+                explained_variance_ratio=proj.explained_variance_ratio,
+                engine_version=np.array(proj.engine_version),
+                n_samples=np.array(proj.n_samples),
+            )
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
+
+
+def remove_projection(root: str, subject_id: str) -> None:
+    try:
+        os.unlink(projection_path(root, subject_id))
+    except FileNotFoundError:
+        pass
+
+
+def load_projection(
+    root: str, subject_id: str, engine_version: str, source_dim: int
+) -> Optional[SubjectProjection]:
+    try:
+        with np.load(projection_path(root, subject_id), allow_pickle=False) as data:
+            proj = SubjectProjection(
+                mean=data["mean"],
+                components=data["components"],
+                explained_variance_ratio=data["explained_variance_ratio"],
+                engine_version=str(data["engine_version"]),
+                n_samples=int(data["n_samples"]),
+            )
+    except FileNotFoundError:
+        return None
+    if proj.engine_version != engine_version or proj.source_dim != int(source_dim):
+        return None
+    return proj
+
+
+class ProjectionStore:
+    """Per-process cache of subject projections, reloaded when the file changes."""
+
+    def __init__(self, root: str, engine_version: str, source_dim: int) -> None:
+        self.root = root
+        self.engine_version = engine_version
+        self.source_dim = source_dim
+        self._loaded: Dict[str, Tuple[Tuple[int, int, int], Optional[SubjectProjection]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, subject_id: str) -> Optional[SubjectProjection]:
+        try:
+            st = os.stat(projection_path(self.root, subject_id))
+        except FileNotFoundError:
+            with self._lock:
+                self._loaded.pop(subject_id, None)
+            return None
+        # save_projection renames a new file into place, so the inode changes even
+        # when a coarse mtime and the size do not
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._loaded.get(subject_id)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            proj = load_projection(self.root, subject_id, self.engine_version, self.source_dim)
+            self._loaded[subject_id] = (stamp, proj)
+            return proj
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import math
+import time
 from sklearn.cluster import KMeans
 from sklearn.feature_extraction.text import TfidfVectorizer
 
@@ -24,12 +25,16 @@ def _choose_k(n: int) -> int:
     return min(k, n)
 
 
-def compute_subject_topics(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def compute_subject_topics(
+    records: List[Dict[str, Any]], timings: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
     """Compute subject-level topics from chunk records.
 
     records: list of { text: str, embedding: List[float], documentId: str }
     returns: list of topics [{ label, weight, terms: [{term,score}], documentIds }]
+    timings: if given, receives "tfidf" and "kmeans" seconds
     """
+    stats = timings if timings is not None else {}
     if not records:
         return []
 
@@ -37,9 +42,11 @@ def compute_subject_topics(records: List[Dict[str, Any]]) -> List[Dict[str, Any]
     doc_ids = [str(r.get("documentId", "")) for r in records]
 
     # TF-IDF on chunk texts for term scoring and cluster labeling
+    t0 = time.perf_counter()
     vectorizer = TfidfVectorizer(max_features=5000, stop_words="english")
     tfidf = vectorizer.fit_transform(texts)
     vocab = vectorizer.get_feature_names_out()
+    stats["tfidf"] = time.perf_counter() - t0
 
     n = len(records)
     k = _choose_k(n)
@@ -47,8 +54,10 @@ def compute_subject_topics(records: List[Dict[str, Any]]) -> List[Dict[str, Any]
         return []
 
     # KMeans on TF-IDF (cheap and text-driven); alternative: embeddings if available
+    t0 = time.perf_counter()
     km = KMeans(n_clusters=k, n_init=5, random_state=42)
     labels = km.fit_predict(tfidf)
+    stats["kmeans"] = time.perf_counter() - t0
 
     topics: List[Dict[str, Any]] = []
     for c in range(k):
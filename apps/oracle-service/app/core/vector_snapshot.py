@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+"""Per-subject embedding snapshots that processes share through mmap.
+
+A snapshot is two files in `VECTOR_SNAPSHOT_DIR`:
+
+    <subjectId>.v<token>.npy   float32 (n, dim) matrix, C order
+    <subjectId>.json           manifest: format, engineVersion, dim, the .npy
+                               name, chunk ids (row order) and per-document
+                               [start, end) row offsets
+
+Readers open the matrix with `np.load(mmap_mode="r")`, so every Celery child
+and uvicorn worker on a host maps the same page-cache pages instead of holding
+its own copy. Writers never modify a published matrix: they write a new .npy,
+then atomically replace the manifest and unlink the previous matrix (processes
+that still map it keep a valid view until they reopen).
+
+A snapshot whose `engineVersion` or `dim` differs from the reader's is treated
+as absent, so bumping ENGINE_VERSION or ENGINE_DIM invalidates every subject
+until it is reindexed.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+_SUBJECT_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def check_subject_id(subject_id: str) -> str:
+    if not _SUBJECT_ID_RE.match(subject_id):
+        raise ValueError(f"invalid subject id for snapshot: {subject_id!r}")
+    return subject_id
+
+
+def manifest_path(root: str, subject_id: str) -> str:
+    return os.path.join(root, f"{check_subject_id(subject_id)}.json")
+
+
+def _matrix_re(subject_id: str) -> "re.Pattern[str]":
+    return re.compile(rf"^{re.escape(subject_id)}\.v[0-9a-f]{{12}}\.npy$")
+
+
+def _atomic_write(path: str, write) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class VectorSnapshot:
+    """Read-only view of one subject's published snapshot."""
+
+    def __init__(self, manifest: Dict, vectors: np.ndarray) -> None:
+        self.subject_id: str = manifest["subjectId"]
+        self.engine_version: str = manifest["engineVersion"]
+        self.model: str = manifest.get("model", "")
+        self.dim: int = int(manifest["dim"])
+        self.created_at: float = float(manifest.get("createdAt", 0.0))
+        self.ids: List[str] = list(manifest["ids"])
+        self.docs: Dict[str, Tuple[int, int]] = {
+            k: (int(v[0]), int(v[1])) for k, v in manifest["docs"].items()
+        }
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def doc_vectors(self, doc_id: str) -> np.ndarray:
+        start, end = self.docs.get(doc_id, (0, 0))
+        return self.vectors[start:end]
+
+
+def write_snapshot(
+    root: str,
+    subject_id: str,
+    docs: Sequence[Tuple[str, Sequence[str], np.ndarray]],
+    engine_version: str,
+    dim: int,
+    model: str = "",
+) -> str:
+    """Publish a subject's vectors; `docs` is (doc_id, chunk_ids, (n, dim) matrix) per document.
+
+    Returns the manifest path.
+    """
+    os.makedirs(root, exist_ok=True)
+    mpath = manifest_path(root, subject_id)
+
+    ids: List[str] = []
+    offsets: Dict[str, List[int]] = {}
+    parts: List[np.ndarray] = []
+    for doc_id, chunk_ids, mat in docs:
+        mat = np.asarray(mat, dtype=np.float32).reshape(-1, dim)
+        if mat.shape[0] != len(chunk_ids):
+            raise ValueError(f"document {doc_id}: {len(chunk_ids)} ids but {mat.shape[0]} rows")
+        offsets[str(doc_id)] = [len(ids), len(ids) + len(chunk_ids)]
+        ids.extend(str(c) for c in chunk_ids)
+        parts.append(mat)
+    matrix = np.ascontiguousarray(
+        np.vstack(parts) if parts else np.zeros((0, dim), dtype=np.float32)
+    )
+
+    npy_name = f"{subject_id}.v{uuid.uuid4().hex[:12]}.npy"
+    _atomic_write(os.path.join(root, npy_name), lambda f: np.save(f, matrix, allow_pickle=False))
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "subjectId": subject_id,
+        "engineVersion": engine_version,
+        "model": model,
+        "dim": int(dim),
+        "count": len(ids),
+        "createdAt": time.time(),
+        "vectors": npy_name,
+        "ids": ids,
+        "docs": offsets,
+    }
+    _atomic_write(mpath, lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+
+    # Drop superseded matrices; existing mmaps stay valid until closed
+    pattern = _matrix_re(subject_id)
+    for name in os.listdir(root):
+        if name != npy_name and pattern.match(name):
+            try:
+                os.unlink(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return mpath
+
+
+def open_snapshot(
+    root: str, subject_id: str, engine_version: str, dim: int
+) -> Optional[VectorSnapshot]:
+    """Map a subject's snapshot, or None if missing or built by another engine version/dim."""
+    mpath = manifest_path(root, subject_id)
+    for _attempt in range(2):
+        try:
+            with open(mpath, "rb") as f:
+                manifest = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        if (
+            manifest.get("format") != SNAPSHOT_FORMAT
+            or manifest.get("engineVersion") != engine_version
+            or int(manifest.get("dim", -1)) != int(dim)
+        ):
+            logger.info(
+                "[Snapshot] Ignoring stale snapshot subjectId=%s engineVersion=%s dim=%s",
+                subject_id,
+                manifest.get("engineVersion"),
+                manifest.get("dim"),
+            )
+            return None
+        try:
+            vectors = np.load(os.path.join(root, manifest["vectors"]), mmap_mode="r")
+        except FileNotFoundError:
+            # A writer replaced the snapshot between our two reads; re-read the manifest
+            continue
+        return VectorSnapshot(manifest, vectors)
+    return None
+
+
+def remove_snapshot(root: str, subject_id: str) -> None:
+    pattern = _matrix_re(subject_id)
+    for name in [os.path.basename(manifest_path(root, subject_id))] + [
+        n for n in os.listdir(root) if pattern.match(n)
+    ]:
+        try:
+            os.unlink(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+
+class SnapshotStore:
+    """Per-process cache of open snapshots, reopened when the manifest changes."""
+
+    def __init__(self, root: str, engine_version: str, dim: int) -> None:
+        self.root = root
+        self.engine_version = engine_version
+        self.dim = dim
+        self._open: Dict[str, Tuple[Tuple[int, int], Optional[VectorSnapshot]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, subject_id: str) -> Optional[VectorSnapshot]:
+        try:
+            st = os.stat(manifest_path(self.root, subject_id))
+        except FileNotFoundError:
+            with self._lock:
+                self._open.pop(subject_id, None)
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._open.get(subject_id)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            snap = open_snapshot(self.root, subject_id, self.engine_version, self.dim)
+            self._open[subject_id] = (stamp, snap)
+            return snap
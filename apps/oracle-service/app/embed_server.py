@@ -1,17 +1,128 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.core.conceptual_engine import ConceptualEngine
+from app.core.ann import IndexRegistry, IVFIndex
+from app.core.conceptual_engine import ConceptualEngine, get_engine
+from app.core.quantize import MODES, quantize, to_bytes
+from app.core.reduction import ProjectionStore
+from app.core.vector_snapshot import SnapshotStore
 from config import get_settings
+from utils.batching import MicroBatcher
+from utils.cache import TTLCache
 
 app = FastAPI(title="Oracle Embed API")
 
+# Popular search-bar queries repeat constantly; keep their vectors per process.
+_QUERY_CACHE: Optional[TTLCache] = None
+
+
+def _get_query_cache() -> TTLCache:
+    global _QUERY_CACHE
+    settings = get_settings()
+    cache = _QUERY_CACHE
+    if cache is None or (cache.maxsize, cache.ttl) != (
+        settings.EMBED_CACHE_SIZE,
+        settings.EMBED_CACHE_TTL,
+    ):
+        cache = TTLCache(settings.EMBED_CACHE_SIZE, settings.EMBED_CACHE_TTL)
+        _QUERY_CACHE = cache
+    return cache
+
+
+# Concurrent /embed misses are coalesced into one engine call per event loop.
+_BATCHER: Optional[MicroBatcher] = None
+_BATCHER_KEY: Optional[Tuple[Any, ...]] = None
+
+
+def _embed_rows(engine: ConceptualEngine, texts: List[str]) -> List[List[float]]:
+    return engine.embed_texts(texts, dtype=np.float64).tolist()
+
+
+def _get_batcher(engine: ConceptualEngine) -> MicroBatcher:
+    global _BATCHER, _BATCHER_KEY
+    settings = get_settings()
+    key = (
+        asyncio.get_running_loop(),
+        engine,
+        settings.EMBED_MICROBATCH_MAX_SIZE,
+        settings.EMBED_MICROBATCH_MAX_WAIT_MS,
+        settings.EMBED_MICROBATCH_MAX_IN_FLIGHT,
+    )
+    if _BATCHER is None or _BATCHER_KEY != key:
+        _BATCHER = MicroBatcher(
+            lambda texts: _embed_rows(engine, texts),
+            max_batch=settings.EMBED_MICROBATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_MICROBATCH_MAX_WAIT_MS,
+            max_in_flight=settings.EMBED_MICROBATCH_MAX_IN_FLIGHT,
+        )
+        _BATCHER_KEY = key
+    return _BATCHER
+
+
+_INDEXES: Optional[IndexRegistry] = None
+_INDEXES_KEY: Optional[Tuple[Any, ...]] = None
+
+
+def _get_indexes() -> IndexRegistry:
+    global _INDEXES, _INDEXES_KEY
+    settings = get_settings()
+    key = (
+        settings.ENGINE_DIM,
+        settings.ENGINE_VERSION,
+        settings.ANN_SNAPSHOT_DIR,
+        settings.VECTOR_SNAPSHOT_DIR,
+        settings.ANN_NLIST,
+        settings.ANN_NPROBE,
+        settings.ANN_MIN_TRAIN,
+    )
+    if _INDEXES is None or _INDEXES_KEY != key:
+        root = settings.VECTOR_SNAPSHOT_DIR
+        _INDEXES = IndexRegistry(
+            settings.ENGINE_DIM,
+            settings.ANN_SNAPSHOT_DIR,
+            vectors=SnapshotStore(root, settings.ENGINE_VERSION, settings.ENGINE_DIM) if root else None,
+            projections=(
+                ProjectionStore(root, settings.ENGINE_VERSION, settings.ENGINE_DIM) if root else None
+            ),
+            nlist=settings.ANN_NLIST,
+            nprobe=settings.ANN_NPROBE,
+            min_train=settings.ANN_MIN_TRAIN,
+        )
+        _INDEXES_KEY = key
+    return _INDEXES
+
+
+async def _embed_query(text: str) -> List[float]:
+    """Query vector via the LRU cache and, on a miss, the micro-batcher."""
+    settings = get_settings()
+    engine = get_engine()
+    cache = _get_query_cache()
+    key = (engine.model_name, engine.dim, text)
+
+    vec = cache.get(key)
+    if vec is None:
+        try:
+            if settings.EMBED_MICROBATCH_ENABLED:
+                vec = await _get_batcher(engine).submit(text)
+            else:
+                vec = (await run_in_threadpool(_embed_rows, engine, [text]))[0]
+        except Exception as e:  # pragma: no cover - unexpected
+            raise HTTPException(status_code=500, detail=f"embedding failed: {e}")
+        cache.put(key, vec)
+    return vec
+
 
 class EmbedRequest(BaseModel):
     text: str
+    # Project into this subject's PCA space when it has one (see app/core/reduction.py)
+    subjectId: Optional[str] = None
 
 
 class EmbedResponse(BaseModel):
@@ -21,23 +132,220 @@ class EmbedResponse(BaseModel):
 
 
 @app.post("/embed", response_model=EmbedResponse)
-def embed(req: EmbedRequest) -> Dict[str, Any]:
+async def embed(req: EmbedRequest) -> Dict[str, Any]:
     text = (req.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="text is required")
 
+    engine = get_engine()
+    vec = await _embed_query(text)
+    if req.subjectId:
+        try:
+            vec = _get_indexes().project(req.subjectId, np.asarray(vec))[0].astype(np.float64).tolist()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "model": engine.model_name,
+        "dim": len(vec),
+        "embedding": vec,
+    }
+
+
+class EmbedBatchRequest(BaseModel):
+    texts: List[str]
+
+
+class EmbedBatchResponse(BaseModel):
+    model: str
+    dim: int
+    count: int
+    embeddings: List[List[float]]
+
+
+OCTET_STREAM = "application/octet-stream"
+
+
+@app.post(
+    "/embed/batch",
+    response_model=EmbedBatchResponse,
+    responses={200: {"content": {OCTET_STREAM: {}}}},
+)
+def embed_batch(
+    req: EmbedBatchRequest,
+    request: Request,
+    format: Optional[str] = None,
+    dtype: str = "float32",
+) -> Any:
+    """Embed up to EMBED_BATCH_MAX texts in one engine call.
+
+    JSON by default. With `Accept: application/octet-stream` (or `?format=binary`)
+    the body is a row-major little-endian float32 matrix and the shape is in the
+    `X-Embedding-Shape: <rows>,<dim>` header. `?dtype=float16|int8|binary` returns
+    compact codes followed by per-row norms (and int8 scales) instead; see
+    app/core/quantize.py for the layout. Without `dtype` the encoding is always
+    float32 (core-service's EmbeddingService decodes rows*dim*4 bytes);
+    ENGINE_QUANTIZATION does not change it.
+    """
     settings = get_settings()
-    engine = ConceptualEngine(model_name=settings.ENGINE_MODEL_NAME, dim=settings.ENGINE_DIM)
+    wants_binary = format == "binary" or OCTET_STREAM in request.headers.get("accept", "")
+    if dtype not in MODES:
+        raise HTTPException(status_code=400, detail=f"dtype must be one of {', '.join(MODES)}")
+    texts = [(t or "").strip() for t in req.texts]
+    if not texts:
+        raise HTTPException(status_code=400, detail="texts must not be empty")
+    if len(texts) > settings.EMBED_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"at most {settings.EMBED_BATCH_MAX} texts per request",
+        )
+    blank = [i for i, t in enumerate(texts) if not t]
+    if blank:
+        raise HTTPException(status_code=400, detail=f"texts[{blank[0]}] is empty")
 
-    # Use engine's deterministic vector generator directly on text
+    engine = get_engine()
     try:
-        # Accessing the deterministic vector function for query text
-        vec = engine._deterministic_vec(text)  # type: ignore[attr-defined]
+        mat = engine.embed_texts(texts)
     except Exception as e:  # pragma: no cover - unexpected
         raise HTTPException(status_code=500, detail=f"embedding failed: {e}")
 
+    if wants_binary:
+        if dtype == "float32":
+            content = mat.astype("<f4", copy=False).tobytes(order="C")
+        else:
+            content = to_bytes(quantize(mat, dtype))
+        return Response(
+            content=content,
+            media_type=OCTET_STREAM,
+            headers={
+                "X-Embedding-Shape": f"{mat.shape[0]},{mat.shape[1]}",
+                "X-Embedding-Dtype": dtype,
+                "X-Embedding-Model": engine.model_name,
+            },
+        )
+    if dtype != "float32":
+        raise HTTPException(status_code=400, detail="quantized dtypes require the binary format")
+
     return {
         "model": engine.model_name,
         "dim": engine.dim,
-        "embedding": vec,
+        "count": int(mat.shape[0]),
+        "embeddings": mat.tolist(),
     }
+
+
+class SearchRequest(BaseModel):
+    subjectId: str
+    text: str
+    k: int = 10
+    nprobe: Optional[int] = None
+
+
+class SearchHit(BaseModel):
+    id: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    subjectId: str
+    results: List[SearchHit]
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search(req: SearchRequest) -> Dict[str, Any]:
+    """Top-k chunks of one subject by cosine similarity (in-process IVF index)."""
+    text = (req.text or "").strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="text is required")
+    k = max(1, min(req.k, get_settings().SEARCH_MAX_K))
+
+    indexes = _get_indexes()
+    try:
+        # A cold subject loads its snapshot or builds (and may train) an index
+        index = await run_in_threadpool(indexes.get, req.subjectId)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=404, detail="no index for subject")
+
+    vec = indexes.project(req.subjectId, np.asarray(await _embed_query(text), dtype=np.float32))[0]
+    if vec.shape[0] != index.dim:
+        raise HTTPException(status_code=409, detail="index and projection dims differ; reindex subject")
+    hits = await run_in_threadpool(index.search, vec, k, req.nprobe)
+    return {"subjectId": req.subjectId, "results": [{"id": i, "score": s} for i, s in hits]}
+
+
+class IndexChunk(BaseModel):
+    id: str
+    embedding: Optional[List[float]] = None
+    text: Optional[str] = None
+
+
+class IndexUpsertRequest(BaseModel):
+    chunks: List[IndexChunk]
+
+
+class IndexDeleteRequest(BaseModel):
+    ids: List[str]
+
+
+class _DimMismatch(Exception):
+    pass
+
+
+def _add_checked(index: IVFIndex, ids: List[str], mat: np.ndarray) -> None:
+    if mat.shape[1] != index.dim:
+        raise _DimMismatch()
+    index.add(ids, mat)
+
+
+@app.put("/index/{subject_id}/chunks")
+def index_upsert(subject_id: str, req: IndexUpsertRequest) -> Dict[str, Any]:
+    """Insert or replace chunk vectors; chunks without an embedding are embedded from text."""
+    engine = get_engine()
+    missing = [c for c in req.chunks if c.embedding is None]
+    if any(not (c.text or "").strip() for c in missing):
+        raise HTTPException(status_code=400, detail="each chunk needs an embedding or text")
+    mat = np.zeros((len(req.chunks), engine.dim), dtype=np.float32)
+    if missing:
+        embedded = iter(engine.embed_texts([(c.text or "").strip() for c in missing]))
+    for i, c in enumerate(req.chunks):
+        if c.embedding is not None:
+            if len(c.embedding) != engine.dim:
+                raise HTTPException(status_code=400, detail=f"chunks[{i}] has wrong dim")
+            mat[i] = c.embedding
+        else:
+            mat[i] = next(embedded)
+
+    indexes = _get_indexes()
+    ids = [c.id for c in req.chunks]
+    try:
+        mat = indexes.project(subject_id, mat)
+        index, _, persisted = indexes.update(
+            subject_id, lambda index: _add_checked(index, ids, mat), create=True, dim=mat.shape[1]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except _DimMismatch:
+        raise HTTPException(status_code=409, detail="index and projection dims differ; reindex subject")
+    assert index is not None
+    return {"subjectId": subject_id, "upserted": len(ids), "size": len(index), "persisted": persisted}
+
+
+@app.delete("/index/{subject_id}/chunks")
+def index_delete(subject_id: str, req: IndexDeleteRequest) -> Dict[str, Any]:
+    try:
+        index, removed, persisted = _get_indexes().update(subject_id, lambda index: index.remove(req.ids))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=404, detail="no index for subject")
+    return {"subjectId": subject_id, "removed": removed, "size": len(index), "persisted": persisted}
+
+
+@app.get("/embed/stats")
+def embed_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"queryCache": _get_query_cache().stats()}
+    if _BATCHER is not None:
+        stats["microBatching"] = _BATCHER.stats()
+    return stats
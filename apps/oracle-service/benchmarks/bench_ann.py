@@ -0,0 +1,82 @@
+"""Recall@k and QPS of the in-process IVF index against brute force.
+
+Builds a synthetic subject (clustered float32 vectors, default 100k x 256),
+then queries it with exact brute force and with IVF at several `nprobe`
+values, reporting recall@k against the exact top-k and single-query QPS.
+
+    python benchmarks/bench_ann.py [--n 100000] [--dim 256] [--k 10] [--nprobe 1 4 8 16 32]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.ann import IVFIndex
+
+
+def _synthetic(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def _run(fn, queries: np.ndarray) -> tuple[list[set[str]], float]:
+    started = time.perf_counter()
+    results = [{cid for cid, _ in fn(q)} for q in queries]
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--nlist", type=int, default=0, help="0 = ~sqrt(n)")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    data = _synthetic(args.n, args.dim, clusters=max(1, args.n // 500), seed=0)
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(args.n, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32)
+
+    started = time.perf_counter()
+    index = IVFIndex(args.dim, nlist=args.nlist, min_train=1)
+    index.add([f"c{i}" for i in range(args.n)], data)
+    build_s = time.perf_counter() - started
+
+    exact, exact_qps = _run(lambda q: index.brute_force(q, args.k), queries)
+    results = [{"method": "brute", "nprobe": None, "recall": 1.0, "qps": round(exact_qps, 1)}]
+    for nprobe in args.nprobe:
+        approx, qps = _run(lambda q, nprobe=nprobe: index.search(q, args.k, nprobe=nprobe), queries)
+        recall = float(np.mean([len(a & e) / args.k for a, e in zip(approx, exact)]))
+        results.append(
+            {"method": "ivf", "nprobe": nprobe, "recall": round(recall, 4), "qps": round(qps, 1)}
+        )
+
+    if args.json:
+        print(json.dumps({"buildSeconds": round(build_s, 2), "results": results}, indent=2))
+        return
+    nlist = index.centroids.shape[0] if index.centroids is not None else 0
+    print(f"n={args.n} dim={args.dim} nlist={nlist} k={args.k} build={build_s:.2f}s")
+    print(f"{'method':>6} {'nprobe':>6} {f'recall@{args.k}':>10} {'qps':>9} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['method']:>6} {str(r['nprobe'] or '-'):>6} {r['recall']:>10} "
+            f"{r['qps']:>9} {r['qps'] / exact_qps:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Memory of one document's chunks: list of dicts versus ChunkBatch.
+
+Builds the same N chunks (D-dim embeddings) both ways and reports, via
+tracemalloc:
+
+- retained: bytes held by the chunk representation itself (texts excluded,
+  they are shared by both)
+- serialize peak: peak extra bytes while building every PUT body of the
+  document in REINDEX_BATCH_SIZE batches. For dicts this is the old path,
+  which copies each chunk dict and then calls json.dumps. For ChunkBatch it
+  is `payload_json` on slice views.
+
+    python benchmarks/bench_chunk_memory.py [--chunks 2000] [--dim 1536] [--batch 250] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from app.core.chunk_batch import ChunkBatch
+from bench_hotpaths import _text
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def _peak(fn: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def _legacy_bodies(chunks: List[Dict[str, Any]], batch: int) -> None:
+    for i in range(0, len(chunks), batch):
+        payload = {
+            "documentId": "d",
+            "model": "stub-miniLM",
+            "dim": len(chunks[0]["embedding"]),
+            "chunks": [
+                {"index": c["index"], "text": c["text"], "tokens": c["tokens"], "embedding": c["embedding"]}
+                for c in chunks[i : i + batch]
+            ],
+        }
+        json.dumps(payload)
+
+
+def _batch_bodies(chunks: ChunkBatch, dim: int, batch: int) -> None:
+    for i in range(0, len(chunks), batch):
+        chunks[i : i + batch].payload_json("d", "stub-miniLM", dim)
+
+
+def run(n: int, dim: int, batch: int) -> Dict[str, Any]:
+    texts = [_text(600, seed=i % 50) for i in range(n)]
+    matrix = np.random.default_rng(0).standard_normal((n, dim)).astype(np.float32)
+
+    dicts, dict_bytes = _measure(
+        lambda: [
+            {"index": i, "text": t, "tokens": 120, "embedding": matrix[i].tolist()}
+            for i, t in enumerate(texts)
+        ]
+    )
+    columns, batch_bytes = _measure(lambda: ChunkBatch.build(texts, [120] * n, matrix.copy()))
+    rows = {
+        "dicts": {"retained": dict_bytes, "serializePeak": _peak(lambda: _legacy_bodies(dicts, batch))},
+        "chunkBatch": {
+            "retained": batch_bytes,
+            "serializePeak": _peak(lambda: _batch_bodies(columns, dim, batch)),
+        },
+    }
+    return {"chunks": n, "dim": dim, "batch": batch, "results": rows}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--batch", type=int, default=250, help="REINDEX_BATCH_SIZE")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    report = run(args.chunks, args.dim, args.batch)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.chunks} chunks x {args.dim} dims, batches of {args.batch}")
+    print(f"{'representation':<14} {'retained MiB':>13} {'KiB/chunk':>10} {'serialize peak MiB':>19}")
+    for name, r in report["results"].items():
+        print(
+            f"{name:<14} {r['retained'] / 2**20:>13.1f} {r['retained'] / 1024 / args.chunks:>10.1f} "
+            f"{r['serializePeak'] / 2**20:>19.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
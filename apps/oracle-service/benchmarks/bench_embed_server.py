@@ -0,0 +1,137 @@
+"""Load benchmark for POST /embed against a local uvicorn.
+
+Starts `uvicorn app.embed_server:app` once with micro-batching enabled and once
+disabled, drives it with 1/10/100 concurrent clients sending distinct texts
+(query cache disabled), and prints throughput and p50/p99 latency.
+
+    python benchmarks/bench_embed_server.py [--duration 5] [--concurrency 1 10 100]
+
+Requires httpx (already needed by FastAPI's TestClient).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def _start_server(port: int, batching: bool) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(SERVICE_ROOT),
+        "DO_NOT_LOAD_DOTENV": "1",
+        "EMBED_CACHE_SIZE": "0",
+        "EMBED_MICROBATCH_ENABLED": "true" if batching else "false",
+    }
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.embed_server:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        cwd=SERVICE_ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/embed/stats", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+
+async def _drive(url: str, concurrency: int, duration: float) -> dict:
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors = 0
+    stop_at = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                text = f"benchmark query {next(counter)} about photosynthesis"
+                t0 = time.perf_counter()
+                resp = await client.post(url, json={"text": text})
+                if resp.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(_pct(latencies, 0.99), 2) if latencies else None,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    for batching in (False, True):
+        port = _free_port()
+        proc = _start_server(port, batching)
+        try:
+            url = f"http://127.0.0.1:{port}/embed"
+            asyncio.run(_drive(url, 1, 0.5))  # warm-up
+            for c in args.concurrency:
+                row = asyncio.run(_drive(url, c, args.duration))
+                row["microbatching"] = batching
+                results.append(row)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'batching':>9} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for r in results:
+        print(
+            f"{str(r['microbatching']):>9} {r['concurrency']:>7} {r['rps']:>9} "
+            f"{r['p50_ms']:>8} {r['p99_ms']:>8} {r['errors']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Embedding throughput per engine backend.
+
+Embeds synthetic chunks (~`--chars` characters, like the engine's chunker
+produces) with each backend at several batch sizes on the calling thread and
+prints chunks per second.
+
+    python benchmarks/bench_engines.py [--dim 1536] [--chunks 4000] [--batch 1 32 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.conceptual_engine import ConceptualEngine
+from app.core.hashing_embedder import HASHING_MODEL_NAME
+
+BACKENDS = ["stub-miniLM", HASHING_MODEL_NAME]
+
+
+def _chunks(n: int, chars: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(20000)]
+    out = []
+    for _ in range(n):
+        words: list[str] = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(vocab))
+        out.append(" ".join(words))
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--chunks", type=int, default=4000)
+    ap.add_argument("--chars", type=int, default=600)
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 32, 256])
+    ap.add_argument("--backend", nargs="+", default=BACKENDS)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    texts = _chunks(args.chunks, args.chars)
+    results = []
+    for name in args.backend:
+        engine = ConceptualEngine(model_name=name, dim=args.dim)
+        engine.embed_texts(texts[:8])  # warm-up (lazy imports, caches)
+        for batch in args.batch:
+            started = time.perf_counter()
+            for i in range(0, len(texts), batch):
+                engine.embed_texts(texts[i : i + batch])
+            elapsed = time.perf_counter() - started
+            results.append(
+                {"backend": name, "batch": batch, "chunksPerSec": round(len(texts) / elapsed, 1)}
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':>20} {'batch':>6} {'chunks/s':>10}")
+    for r in results:
+        print(f"{r['backend']:>20} {r['batch']:>6} {r['chunksPerSec']:>10}")
+
+
+if __name__ == "__main__":
+    main()
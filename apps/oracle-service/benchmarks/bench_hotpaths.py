@@ -0,0 +1,252 @@
+"""Microbenchmarks for the engine, PDF, NLP, topic and JSON codec hot paths.
+
+Each case runs until it has `--repeats` timings or has used `--budget`
+seconds (at least once), after one untimed warm-up run for cases that take
+under a second. The script writes min/median seconds and items/s per case to
+a JSON file that `compare_bench.py` diffs between commits.
+
+    python benchmarks/bench_hotpaths.py [--out bench-results/<commit>.json]
+        [--quick] [--filter topics] [--repeats 5] [--budget 20]
+
+`--quick` skips the largest sizes (1000-page PDF, 100k-chunk topics).
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitz
+import numpy as np
+
+import config
+from app.core.chunk_batch import ChunkBatch
+from app.core.conceptual_engine import ConceptualEngine
+from app.core.hashing_embedder import HASHING_MODEL_NAME
+from app.core.topics import compute_subject_topics
+from utils.nlp import top_keywords
+from utils import codec
+from utils.pdf import extract_text
+from workers.v2_reindex_worker import _reindex_payload
+
+_VOCAB = [
+    "cell", "membrane", "protein", "enzyme", "energy", "respiration", "glucose", "mitochondria",
+    "force", "mass", "velocity", "momentum", "field", "charge", "circuit", "current",
+    "treaty", "empire", "revolution", "trade", "parliament", "republic", "reform", "war",
+    "matrix", "vector", "integral", "derivative", "function", "limit", "series", "proof",
+]
+
+
+@dataclass
+class Case:
+    name: str
+    params: Dict[str, Any]
+    items: int  # units of work per run (texts, pages, chars, chunks)
+    setup: Callable[[], Callable[[], Any]]  # builds inputs, returns the timed call
+    large: bool = False
+
+    @property
+    def key(self) -> str:
+        return self.name + "[" + ",".join(f"{k}={v}" for k, v in sorted(self.params.items())) + "]"
+
+
+def _sentences(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(_VOCAB) for _ in range(rng.randint(8, 20))]
+        out.append(" ".join(words).capitalize() + ".")
+    return out
+
+
+def _text(chars: int, seed: int = 0) -> str:
+    parts: List[str] = []
+    total = 0
+    for s in _sentences(chars // 40 + 1, seed):
+        parts.append(s)
+        total += len(s) + 1
+        if total >= chars:
+            break
+    return " ".join(parts)
+
+
+def _pdf(pages: int, seed: int = 0) -> bytes:
+    buf = io.BytesIO()
+    with fitz.open() as doc:
+        for p in range(pages):
+            page = doc.new_page(width=595, height=842)
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), _text(2500, seed + p), fontsize=9)
+        doc.save(buf)
+    return buf.getvalue()
+
+
+def _records(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    sentences = _sentences(2000, seed)
+    rng = random.Random(seed)
+    return [
+        {"text": " ".join(rng.sample(sentences, 3)), "documentId": f"doc{i % 50}"}
+        for i in range(n)
+    ]
+
+
+def build_cases() -> List[Case]:
+    def embed(backend: str) -> Callable[[], Any]:
+        engine = ConceptualEngine(model_name=backend, dim=1536)
+        chunks = [_text(600, seed=i) for i in range(256)]
+        return lambda: engine.embed_texts(chunks)
+
+    def split() -> Callable[[], Any]:
+        engine, text = ConceptualEngine(), _text(100_000)
+        return lambda: engine._split_text(text)
+
+    def chunk_and_embed(pages: int) -> Callable[[], Any]:
+        engine, pdf = ConceptualEngine(dim=1536), _pdf(pages)
+        return lambda: engine.chunk_and_embed(pdf, "d")
+
+    def extract(pages: int) -> Callable[[], Any]:
+        pdf = _pdf(pages)
+        return lambda: extract_text(pdf)
+
+    def keywords(chars: int) -> Callable[[], Any]:
+        text = _text(chars, seed=7)
+        return lambda: top_keywords(text)
+
+    def topics(n: int) -> Callable[[], Any]:
+        records = _records(n)
+        return lambda: compute_subject_topics(records)
+
+    def use_codec(name: str) -> None:
+        os.environ["JSON_CODEC"] = name
+        config._SETTINGS = None
+
+    def reindex_body(name: str) -> Callable[[], Any]:
+        use_codec(name)
+        rng = np.random.default_rng(0)
+        batch = ChunkBatch.build(
+            [_text(600, seed=i) for i in range(250)], [120] * 250, rng.standard_normal((250, 1536))
+        )
+        return lambda: _reindex_payload("d", "stub-miniLM", 1536, batch)
+
+    def chunk_listing(name: str) -> Callable[[], Any]:
+        use_codec(name)
+        body = json.dumps(_records(50_000)).encode("utf-8")
+        return lambda: codec.loads(body)
+
+    # engine.embed on stub-miniLM is the SHA-256 path formerly in ConceptualEngine._deterministic_vec
+    cases = [
+        Case("engine.embed", {"backend": b, "texts": 256}, 256, lambda b=b: embed(b))
+        for b in ("stub-miniLM", HASHING_MODEL_NAME)
+    ]
+    cases.append(Case("engine.split_text", {"chars": 100_000}, 100_000, split))
+    cases += [
+        Case("engine.chunk_and_embed", {"pages": p}, p, lambda p=p: chunk_and_embed(p))
+        for p in (10, 100)
+    ]
+    cases += [
+        Case("pdf.extract_text", {"pages": p}, p, lambda p=p: extract(p), large=p >= 1000)
+        for p in (10, 100, 1000)
+    ]
+    cases += [
+        Case("nlp.top_keywords", {"chars": c}, c, lambda c=c: keywords(c)) for c in (10_000, 100_000)
+    ]
+    cases += [
+        Case("topics.compute_subject_topics", {"chunks": n}, n, lambda n=n: topics(n), large=n >= 100_000)
+        for n in (1_000, 10_000, 100_000)
+    ]
+    cases += [
+        Case("codec.reindex_payload", {"codec": c, "chunks": 250}, 250, lambda c=c: reindex_body(c))
+        for c in codec.available()
+    ]
+    cases += [
+        Case("codec.loads_chunk_listing", {"codec": c, "chunks": 50_000}, 50_000, lambda c=c: chunk_listing(c))
+        for c in codec.available()
+    ]
+    return cases
+
+
+def run_case(case: Case, repeats: int, budget: float) -> Dict[str, Any]:
+    fn = case.setup()
+    timings: List[float] = []
+    first = time.perf_counter()
+    fn()
+    warm = time.perf_counter() - first
+    if warm >= 1.0:
+        timings.append(warm)  # too slow to spend a run on warm-up
+    started = time.perf_counter()
+    while len(timings) < repeats and (not timings or time.perf_counter() - started < budget):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    median = statistics.median(timings)
+    return {
+        "key": case.key,
+        "name": case.name,
+        "params": case.params,
+        "runs": len(timings),
+        "min": round(min(timings), 6),
+        "median": round(median, 6),
+        "itemsPerSec": round(case.items / median, 2),
+    }
+
+
+def _machine() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "createdAt": time.time(),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", help="write results JSON here (default: print)")
+    ap.add_argument("--quick", action="store_true", help="skip the largest sizes")
+    ap.add_argument("--filter", default="", help="only cases whose key contains this")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=20.0, help="seconds per case")
+    args = ap.parse_args()
+
+    results = []
+    for case in build_cases():
+        if (args.quick and case.large) or args.filter not in case.key:
+            continue
+        r = run_case(case, args.repeats, args.budget)
+        results.append(r)
+        print(
+            f"{case.key:<56} median {r['median'] * 1000:>10.2f} ms {r['itemsPerSec']:>12} items/s",
+            file=sys.stderr,
+        )
+
+    report = {"machine": _machine(), "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare two bench_hotpaths.py result files and flag regressions.
+
+A case regresses when its time in HEAD exceeds BASE by more than
+`--threshold` (relative, default 0.10). Medians are compared by default;
+`--metric min` is steadier on noisy machines. Exits 1 if any case regressed,
+so CI can run it after benchmarking both commits on the same runner.
+
+    python benchmarks/compare_bench.py BASE.json HEAD.json [--threshold 0.10] [--metric median]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def compare(
+    base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.10, metric: str = "median"
+) -> List[Dict[str, Any]]:
+    """One row per case present in either file; `status` is ok/regressed/improved/new/missing."""
+    before = {r["key"]: r for r in base.get("results", [])}
+    after = {r["key"]: r for r in head.get("results", [])}
+    rows = []
+    for key in sorted(set(before) | set(after)):
+        b, h = before.get(key), after.get(key)
+        if b is None or h is None:
+            status = "new" if b is None else "missing"
+            rows.append(
+                {
+                    "key": key,
+                    "base": b[metric] if b else None,
+                    "head": h[metric] if h else None,
+                    "change": None,
+                    "status": status,
+                }
+            )
+            continue
+        change = h[metric] / b[metric] - 1.0 if b[metric] > 0 else 0.0
+        if change > threshold:
+            status = "regressed"
+        elif change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append(
+            {"key": key, "base": b[metric], "head": h[metric], "change": change, "status": status}
+        )
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    ap.add_argument("--metric", choices=("median", "min"), default="median")
+    args = ap.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    rows = compare(base, head, args.threshold, args.metric)
+
+    print(f"base {base.get('machine', {}).get('commit')}  head {head.get('machine', {}).get('commit')}")
+    print(f"{'case':<56} {'base ms':>10} {'head ms':>10} {'change':>8}  status")
+    for r in rows:
+        fmt = lambda v: f"{v * 1000:10.2f}" if v is not None else f"{'-':>10}"
+        change = f"{r['change'] * 100:+7.1f}%" if r["change"] is not None else f"{'-':>8}"
+        print(f"{r['key']:<56} {fmt(r['base'])} {fmt(r['head'])} {change}  {r['status']}")
+    if any(r["status"] == "regressed" for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
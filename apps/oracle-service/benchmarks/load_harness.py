@@ -0,0 +1,410 @@
+"""Local load test of the real Celery tasks against stand-in services.
+
+Runs `oracle.v2_reindex_subject` or `oracle.process_document` with
+`Task.run` (no broker) in forked worker processes, as a prefork worker with
+`--concurrency N` would. The stand-ins:
+
+- S3: moto, seeded with synthetic PDFs before the workers fork, so every child
+  sees the same objects.
+- core-service: `FakeCoreService`, a threaded HTTP server in this process.
+  It serves `/internal/subjects/*`, `/internal/reindex/*` and
+  `/internal/documents/*/analysis`, adds `--latency-ms` +- `--jitter-ms` to
+  each request, and answers a `--error-rate` fraction of PUTs with 503.
+  The reindex and topics workers retry those up to `--retry-attempts` times
+  per request (utils/limiter.py), so `injectedErrors` can exceed `failed`.
+
+For each concurrency level it reports docs/s, chunks/s, request bytes
+received by the fake core-service, task latency percentiles and failures.
+Topic aggregation, which a reindex enqueues after every document, is counted
+but not run unless `--aggregate inline` is given.
+
+    python benchmarks/load_harness.py --task reindex --subjects 4 --docs 25 --pages 5 \\
+        --concurrency 1 2 4 8 [--latency-ms 20] [--error-rate 0.01] [--io-mode async] [--json]
+    python benchmarks/load_harness.py --task analysis --docs 200 --concurrency 4
+
+Linux only (fork start method).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+BUCKET = "oracle-load"
+
+
+class FakeCoreService:
+    """core-service internal API stand-in with injected latency and errors."""
+
+    def __init__(
+        self,
+        documents: Dict[str, List[Dict[str, str]]],
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.documents = documents
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chunks: Dict[str, List[Dict[str, Any]]] = {}
+        self.reset()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeCoreService":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.bytes_received = 0
+            self.chunks_received = 0
+            self.duplicates_received = 0
+            self.unlinked = 0
+            self.chunks = {}
+            self.stored: Set[Tuple[str, Any, Any]] = set()
+
+    def _delay_and_fail(self, method: str) -> bool:
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = method == "PUT" and self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000.0)
+        return fail
+
+    def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+        if self._delay_and_fail(method):
+            with self._lock:
+                self.errors += 1
+            return 503, {"error": "injected"}
+
+        m = re.fullmatch(r"/internal/subjects/([^/]+)/(documents|chunks|topics)", path)
+        if m and method == "GET" and m.group(2) == "documents":
+            docs = self.documents.get(m.group(1))
+            return (200, docs) if docs is not None else (404, {"error": "not found"})
+        if m and method == "GET" and m.group(2) == "chunks":
+            with self._lock:
+                return 200, list(self.chunks.get(m.group(1), []))
+        if m and method == "PUT" and m.group(2) == "topics":
+            return 200, {"status": "ok"}
+        m = re.fullmatch(r"/internal/reindex/([^/]+)/chunks", path)
+        if m and method == "PUT":
+            payload = json.loads(body or b"{}")
+            chunks = payload.get("chunks") or []
+            sid, doc_id = m.group(1), payload.get("documentId")
+            unlinked = []
+            with self._lock:
+                self.chunks_received += len(chunks)
+                self.chunks.setdefault(sid, []).extend({"text": c.get("text"), "documentId": doc_id} for c in chunks)
+                self.stored.update((sid, doc_id, c.get("index")) for c in chunks if "duplicateOf" not in c)
+                # Like core-service: a duplicate links only to a canonical it already holds
+                for c in chunks:
+                    dup = c.get("duplicateOf")
+                    if dup is None:
+                        continue
+                    self.duplicates_received += 1
+                    if (sid, dup.get("documentId"), dup.get("index")) not in self.stored:
+                        unlinked.append(c.get("index"))
+                self.unlinked += len(unlinked)
+            return 200, {"status": "ok", "upserted": len(chunks), "unlinkedDuplicates": unlinked}
+        if re.fullmatch(r"/internal/documents/[^/]+/analysis", path) and method == "PUT":
+            return 200, {"ok": True}
+        return 404, {"error": "no route"}
+
+    def _handler(self) -> type:
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = service.handle(method, self.path, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                self._serve("GET")
+
+            def do_PUT(self) -> None:
+                self._serve("PUT")
+
+            def log_message(self, *_: Any) -> None:
+                pass
+
+        return Handler
+
+
+@dataclass
+class LoadConfig:
+    task: str = "reindex"  # reindex | analysis
+    subjects: int = 4
+    docs: int = 25  # per subject for reindex, total for analysis
+    pages: int = 5
+    concurrency: List[int] = field(default_factory=lambda: [1, 2, 4])
+    latency_ms: float = 10.0
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0
+    aggregate: str = "skip"  # skip | inline
+    batch_size: int = 250
+    dim: int = 1536
+    io_mode: str = "sync"  # REINDEX_IO_MODE
+    io_concurrency: int = 8
+    retry_attempts: int = 4  # CORE_RETRY_ATTEMPTS
+    dedup: bool = True  # REINDEX_DEDUP_ENABLED
+    distinct_pdfs: int = 8  # documents reuse this many PDFs in turn
+
+
+def _seed_s3(cfg: LoadConfig) -> Dict[str, List[Dict[str, str]]]:
+    import boto3
+    from bench_hotpaths import _pdf
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    # A small pool of distinct PDFs, reused under many keys
+    pool = [_pdf(cfg.pages, seed=1000 * i) for i in range(max(1, min(cfg.distinct_pdfs, cfg.docs)))]
+    subjects = [f"sub{i}" for i in range(cfg.subjects if cfg.task == "reindex" else 1)]
+    documents: Dict[str, List[Dict[str, str]]] = {}
+    n = 0
+    for sid in subjects:
+        documents[sid] = []
+        for d in range(cfg.docs):
+            key = f"load/{sid}/doc{d}.pdf"
+            s3.put_object(Bucket=BUCKET, Key=key, Body=pool[n % len(pool)])
+            documents[sid].append({"id": f"{sid}-doc{d}", "s3Key": key})
+            n += 1
+    return documents
+
+
+def _configure_env(cfg: LoadConfig, core_url: str) -> None:
+    os.environ.update(
+        {
+            "DO_NOT_LOAD_DOTENV": "1",
+            "AWS_REGION": "us-east-1",
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_S3_ENDPOINT": "",
+            "S3_BUCKET": BUCKET,
+            "CORE_SERVICE_URL": core_url,
+            "INTERNAL_API_KEY": "load-test",
+            "ENGINE_DIM": str(cfg.dim),
+            "REINDEX_BATCH_SIZE": str(cfg.batch_size),
+            "REINDEX_IO_MODE": cfg.io_mode,
+            "REINDEX_IO_CONCURRENCY": str(cfg.io_concurrency),
+            "CORE_RETRY_ATTEMPTS": str(cfg.retry_attempts),
+            "REINDEX_DEDUP_ENABLED": str(cfg.dedup).lower(),
+            "VECTOR_SNAPSHOT_DIR": "",
+            "ANN_SNAPSHOT_DIR": "",
+        }
+    )
+    import config
+
+    config._SETTINGS = None
+
+
+_AGGREGATE = "skip"
+
+
+def _send_task(self: Any, name: str, args: Any = None, **_: Any) -> None:
+    """Replaces Celery.send_task in workers: no broker here."""
+    if name == "oracle.aggregate_subject_topics" and _AGGREGATE == "inline":
+        from workers.topics_worker import aggregate_subject_topics
+
+        aggregate_subject_topics.run(*(args or []))
+
+
+def _init_worker(aggregate: str) -> None:
+    global _AGGREGATE
+    from celery import Celery
+
+    _AGGREGATE = aggregate
+    Celery.send_task = _send_task  # type: ignore[method-assign]
+
+
+def _run_job(job: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    kind, payload = job
+    t0 = time.perf_counter()
+    try:
+        if kind == "reindex":
+            from workers.v2_reindex_worker import v2_reindex_subject
+
+            result = v2_reindex_subject.run(payload)
+            docs = int(result.get("docs", {}).get("ok", 0))
+        else:
+            from workers.analysis_worker import process_document
+
+            process_document.run(payload)
+            docs = 1
+        return {"ok": True, "docs": docs, "seconds": time.perf_counter() - t0}
+    except Exception as e:  # Retry/Ignore from the task count as failures here
+        return {"ok": False, "docs": 0, "seconds": time.perf_counter() - t0, "error": type(e).__name__}
+
+
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    return round(sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))], 3)
+
+
+def run_load(cfg: LoadConfig, processes: bool = True) -> List[Dict[str, Any]]:
+    """Run the configured load at each concurrency level; one result row per level."""
+    from moto import mock_aws
+
+    rows: List[Dict[str, Any]] = []
+    with mock_aws():
+        documents = _seed_s3(cfg)
+        core = FakeCoreService(documents, cfg.latency_ms, cfg.jitter_ms, cfg.error_rate).start()
+        try:
+            _configure_env(cfg, core.url)
+            import utils.s3
+
+            utils.s3._S3_CLIENT = None
+            if cfg.task == "reindex":
+                jobs = [("reindex", {"subjectId": sid}) for sid in documents]
+            else:
+                jobs = [
+                    ("analysis", {"documentId": d["id"], "s3Key": d["s3Key"], "userId": f"u{i % 5}"})
+                    for i, d in enumerate(documents["sub0"])
+                ]
+            for conc in cfg.concurrency:
+                core.reset()
+                started = time.perf_counter()
+                if processes:
+                    ctx = multiprocessing.get_context("fork")
+                    with ctx.Pool(conc, initializer=_init_worker, initargs=(cfg.aggregate,)) as pool:
+                        results = pool.map(_run_job, jobs, chunksize=1)
+                else:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    from celery import Celery
+
+                    # The workers' patch would outlive the run in this process (e.g. under pytest)
+                    send_task = Celery.send_task
+                    _init_worker(cfg.aggregate)
+                    try:
+                        with ThreadPoolExecutor(conc) as pool:
+                            results = list(pool.map(_run_job, jobs))
+                    finally:
+                        Celery.send_task = send_task  # type: ignore[method-assign]
+                elapsed = time.perf_counter() - started
+                latencies = sorted(r["seconds"] for r in results if r["ok"])
+                docs = sum(r["docs"] for r in results)
+                rows.append(
+                    {
+                        "task": cfg.task,
+                        "concurrency": conc,
+                        "jobs": len(jobs),
+                        "failed": sum(not r["ok"] for r in results),
+                        "seconds": round(elapsed, 3),
+                        "docsPerSec": round(docs / elapsed, 2),
+                        "chunksPerSec": round(core.chunks_received / elapsed, 1),
+                        "chunks": core.chunks_received,
+                        "bytesSent": core.bytes_received,
+                        "requests": core.requests,
+                        "duplicates": core.duplicates_received,
+                        "unlinkedDuplicates": core.unlinked,
+                        "injectedErrors": core.errors,
+                        "p50_s": _pct(latencies, 0.50),
+                        "p95_s": _pct(latencies, 0.95),
+                        "p99_s": _pct(latencies, 0.99),
+                    }
+                )
+        finally:
+            core.stop()
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--task", choices=("reindex", "analysis"), default="reindex")
+    ap.add_argument("--subjects", type=int, default=4, help="reindex jobs (one per subject)")
+    ap.add_argument("--docs", type=int, default=25, help="documents per subject / analysis jobs")
+    ap.add_argument("--pages", type=int, default=5, help="pages per synthetic PDF")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--latency-ms", type=float, default=10.0)
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of PUTs answered 503")
+    ap.add_argument("--aggregate", choices=("skip", "inline"), default="skip")
+    ap.add_argument("--batch-size", type=int, default=250, help="REINDEX_BATCH_SIZE")
+    ap.add_argument("--dim", type=int, default=1536, help="ENGINE_DIM")
+    ap.add_argument("--io-mode", choices=("sync", "async"), default="sync", help="REINDEX_IO_MODE")
+    ap.add_argument("--io-concurrency", type=int, default=8, help="REINDEX_IO_CONCURRENCY")
+    ap.add_argument("--retry-attempts", type=int, default=4, help="CORE_RETRY_ATTEMPTS")
+    ap.add_argument("--no-dedup", dest="dedup", action="store_false", help="REINDEX_DEDUP_ENABLED=false")
+    ap.add_argument("--distinct-pdfs", type=int, default=8, help="distinct PDFs the documents cycle through")
+    ap.add_argument("--threads", action="store_true", help="thread pool instead of forked processes")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    cfg = LoadConfig(
+        task=args.task,
+        subjects=args.subjects,
+        docs=args.docs,
+        pages=args.pages,
+        concurrency=args.concurrency,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        aggregate=args.aggregate,
+        batch_size=args.batch_size,
+        dim=args.dim,
+        io_mode=args.io_mode,
+        io_concurrency=args.io_concurrency,
+        retry_attempts=args.retry_attempts,
+        dedup=args.dedup,
+        distinct_pdfs=args.distinct_pdfs,
+    )
+    rows = run_load(cfg, processes=not args.threads)
+    if args.json:
+        print(json.dumps({"config": asdict(cfg), "results": rows}, indent=2))
+        return
+    print(
+        f"{'conc':>5} {'jobs':>5} {'fail':>5} {'docs/s':>8} {'chunks/s':>9} {'MB sent':>8} "
+        f"{'p50 s':>7} {'p95 s':>7} {'p99 s':>7}"
+    )
+    for r in rows:
+        print(
+            f"{r['concurrency']:>5} {r['jobs']:>5} {r['failed']:>5} {r['docsPerSec']:>8} "
+            f"{r['chunksPerSec']:>9} {r['bytesSent'] / 1e6:>8.2f} {r['p50_s']!s:>7} "
+            f"{r['p95_s']!s:>7} {r['p99_s']!s:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-import json
 import logging
+import time
+import uuid
 from typing import Any
 
 from celery import Celery, bootsteps
+from celery.signals import task_postrun, task_prerun, worker_process_init, worker_process_shutdown
 from config import get_settings, init_logging
-from kombu import Consumer, Queue
+from kombu import Consumer, Exchange, Queue
+
+from utils import codec, tracing
+from utils.fair_queue import DeficitRoundRobin
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,45 @@ init_logging(settings.LOG_LEVEL)
 # Celery application
 app = Celery("oracle")
 
+# Priority lanes. Each lane is its own RabbitMQ queue so that a long reindex
+# backlog never sits in front of a freshly uploaded document; within a lane,
+# messages carry an AMQP priority (higher is served first).
+PRIORITY_INTERACTIVE = 9
+PRIORITY_AGGREGATE = 5
+PRIORITY_REINDEX = 1
+
+_max_priority = max(1, settings.CELERY_MAX_PRIORITY)
+_exchange = Exchange("oracle", type="direct", durable=True)
+
+
+def _lane(name: str) -> Queue:
+    return Queue(
+        name,
+        _exchange,
+        routing_key=name,
+        durable=True,
+        queue_arguments={"x-max-priority": _max_priority},
+    )
+
+
+TASK_ROUTES: dict[str, dict[str, Any]] = {
+    "oracle.process_document": {
+        "queue": settings.CELERY_INTERACTIVE_QUEUE,
+        "routing_key": settings.CELERY_INTERACTIVE_QUEUE,
+        "priority": min(PRIORITY_INTERACTIVE, _max_priority),
+    },
+    "oracle.v2_reindex_subject": {
+        "queue": settings.CELERY_REINDEX_QUEUE,
+        "routing_key": settings.CELERY_REINDEX_QUEUE,
+        "priority": min(PRIORITY_REINDEX, _max_priority),
+    },
+    "oracle.aggregate_subject_topics": {
+        "queue": settings.CELERY_AGGREGATE_QUEUE,
+        "routing_key": settings.CELERY_AGGREGATE_QUEUE,
+        "priority": min(PRIORITY_AGGREGATE, _max_priority),
+    },
+}
+
 # Celery configuration
 app.conf.update(
     broker_url=settings.RABBITMQ_URL,
@@ -34,8 +78,22 @@ app.conf.update(
         "workers.v2_reindex_worker",
         "workers.topics_worker",
     ),
-    # Ensure Celery tasks go to Celery's default queue; our worker will consume both
-    task_default_queue="celery",
+    # Route each task family to its own lane; see README "Worker profiles" for
+    # which worker consumes which lane (`celery worker -Q ...`).
+    task_queues=(
+        _lane(settings.CELERY_INTERACTIVE_QUEUE),
+        _lane(settings.CELERY_REINDEX_QUEUE),
+        _lane(settings.CELERY_AGGREGATE_QUEUE),
+    ),
+    task_routes=TASK_ROUTES,
+    task_default_queue=settings.CELERY_INTERACTIVE_QUEUE,
+    task_default_exchange=_exchange.name,
+    task_default_routing_key=settings.CELERY_INTERACTIVE_QUEUE,
+    task_queue_max_priority=_max_priority,
+    task_default_priority=min(PRIORITY_INTERACTIVE, _max_priority),
+    # Recycle children periodically; each new child is warmed by `_warm_worker_process`
+    worker_max_tasks_per_child=settings.WORKER_MAX_TASKS_PER_CHILD or None,
+    worker_max_memory_per_child=settings.WORKER_MAX_MEMORY_PER_CHILD or None,
 )
 
 
@@ -45,6 +103,17 @@ class RawQueueBridge(bootsteps.ConsumerStep):
 
     The core-service publishes via amqplib `sendToQueue` without Celery's envelopes,
     so we must consume the queue directly and bridge messages to Celery.
+
+    Document jobs are not forwarded in arrival order: they are buffered (unacked,
+    bounded by BRIDGE_PREFETCH) in per-user sub-queues and released by deficit
+    round robin, with at most BRIDGE_MAX_INFLIGHT_PER_USER tasks per user in
+    Celery at a time. Workers report completion to this bridge's reply queue
+    (see `_report_bridge_completion`), which frees the user's slot. Messages
+    beyond the prefetch window stay in broker order, so a burst larger than
+    BRIDGE_PREFETCH still delays other users' jobs.
+
+    Each forwarded job gets a `bridge.forward` span and passes its trace
+    context on in the Celery message headers (utils/tracing.py).
     """
 
     def __init__(
@@ -54,12 +123,43 @@ class RawQueueBridge(bootsteps.ConsumerStep):
         self.app = consumer.app
         self.queue = Queue(settings.RABBITMQ_QUEUE_NAME, durable=True)
         self.reindex_queue = Queue(settings.RABBITMQ_REINDEX_QUEUE_NAME, durable=True)
+        self.done_queue = Queue(
+            f"{settings.BRIDGE_DONE_QUEUE_PREFIX}.{uuid.uuid4().hex[:12]}",
+            durable=False,
+            auto_delete=True,
+            queue_arguments={"x-message-ttl": int(settings.BRIDGE_LEASE_TTL * 1000)},
+        )
+        self.scheduler = self._new_scheduler()
+        self._tick = None
         logger.info(
             "RawQueueBridge initialized for queue=%s broker=%s",
             settings.RABBITMQ_QUEUE_NAME,
             settings.RABBITMQ_URL,
         )
 
+    @staticmethod
+    def _new_scheduler() -> DeficitRoundRobin:
+        return DeficitRoundRobin(
+            quantum=settings.BRIDGE_QUANTUM,
+            max_inflight_per_key=settings.BRIDGE_MAX_INFLIGHT_PER_USER,
+            max_inflight=settings.BRIDGE_MAX_INFLIGHT,
+            lease_ttl=settings.BRIDGE_LEASE_TTL,
+        )
+
+    def start(self, c: Any) -> None:
+        # Buffered messages belong to the previous channel; the broker redelivers them.
+        self.scheduler = self._new_scheduler()
+        super().start(c)
+        if getattr(c, "timer", None) is not None:
+            # Reclaims expired leases even when no new messages arrive
+            self._tick = c.timer.call_repeatedly(1.0, self.drain)
+
+    def stop(self, c: Any) -> None:
+        if self._tick is not None:
+            self._tick.cancel()
+            self._tick = None
+        super().stop(c)
+
     def get_consumers(self, channel: Any) -> list[Consumer]:
         return [
             Consumer(
@@ -67,6 +167,7 @@ class RawQueueBridge(bootsteps.ConsumerStep):
                 queues=[self.queue],
                 callbacks=[self.on_message],
                 accept=["json"],
+                prefetch_count=settings.BRIDGE_PREFETCH,
             ),
             Consumer(
                 channel,
@@ -74,15 +175,20 @@ class RawQueueBridge(bootsteps.ConsumerStep):
                 callbacks=[self.on_reindex_message],
                 accept=["json"],
             ),
+            Consumer(
+                channel,
+                queues=[self.done_queue],
+                callbacks=[self.on_done_message],
+                accept=["json"],
+                no_ack=True,
+            ),
         ]
 
     def on_message(self, body: Any, message: Any) -> None:
         try:
             payload: dict[str, Any]
-            if isinstance(body, (bytes, bytearray)):
-                body = body.decode("utf-8", errors="replace")
-            if isinstance(body, str):
-                payload = json.loads(body)
+            if isinstance(body, (bytes, bytearray, str)):
+                payload = codec.loads(body)
             elif isinstance(body, dict):
                 payload = body
             else:
@@ -92,32 +198,78 @@ class RawQueueBridge(bootsteps.ConsumerStep):
             for key in ("documentId", "s3Key", "userId"):
                 if key not in payload or not isinstance(payload[key], str) or not payload[key]:
                     raise ValueError(f"Invalid payload: missing or invalid '{key}'")
-
-            # Bridge into Celery task graph on the default Celery queue to avoid raw-consumer collisions
-            self.app.send_task(
-                "oracle.process_document",
-                args=[payload],
-                queue="celery",
-            )
-            message.ack()
-            logger.info(
-                "Bridged job to Celery task oracle.process_document (documentId=%s)",
-                payload.get("documentId"),
-            )
-        except json.JSONDecodeError as exc:
+        except codec.DecodeError as exc:
             logger.error("JSON decode error for raw message: %s", exc)
             message.ack()  # drop poison pill
+            return
         except Exception:
             logger.exception("Failed to bridge message; acknowledging to avoid poison pill")
             message.ack()
+            return
+
+        trace = self._start_forward_span(
+            message, documentId=payload["documentId"], userId=payload["userId"]
+        )
+        # Hold the raw message unacked until its user's turn comes up
+        self.scheduler.push(payload["userId"], (payload, message, trace))
+        self.drain()
+
+    @staticmethod
+    def _start_forward_span(message: Any, **attributes: Any) -> tracing.Span:
+        ctx = tracing.from_amqp(getattr(message, "headers", None), getattr(message, "properties", None))
+        raw_wait = None
+        if ctx.published_at_ms is not None:
+            raw_wait = max(0, int(time.time() * 1000) - ctx.published_at_ms)
+        return tracing.start_span("bridge.forward", ctx, rawQueueWaitMs=raw_wait, **attributes)
+
+    def drain(self) -> None:
+        """Forward every job the fair scheduler currently allows."""
+        while True:
+            nxt = self.scheduler.pop()
+            if nxt is None:
+                tracing.flush()
+                return
+            task_id, user_id, (payload, message, trace) = nxt
+            try:
+                # Bridge into the Celery task graph; TASK_ROUTES puts it on the interactive lane
+                self.app.send_task(
+                    "oracle.process_document",
+                    args=[payload],
+                    task_id=task_id,
+                    headers={
+                        "oracle_bridge_reply": self.done_queue.name,
+                        **tracing.celery_headers(trace.context),
+                    },
+                )
+                message.ack()
+                tracing.end_span(trace, taskId=task_id)
+                logger.info(
+                    "Bridged job to Celery task oracle.process_document (documentId=%s userId=%s)",
+                    payload.get("documentId"),
+                    user_id,
+                )
+            except Exception as e:
+                self.scheduler.release(task_id)
+                tracing.end_span(trace, error=f"{type(e).__name__}: {e}")
+                logger.exception("Failed to bridge message; acknowledging to avoid poison pill")
+                message.ack()
+
+    def on_done_message(self, body: Any, message: Any) -> None:
+        try:
+            if isinstance(body, (bytes, bytearray, str)):
+                body = codec.loads(body)
+            task_id = body.get("taskId") if isinstance(body, dict) else None
+            if task_id:
+                self.scheduler.release(str(task_id))
+        except Exception:
+            logger.exception("Invalid bridge completion message: %r", body)
+        self.drain()
 
     def on_reindex_message(self, body: Any, message: Any) -> None:
         try:
             payload: dict[str, Any]
-            if isinstance(body, (bytes, bytearray)):
-                body = body.decode("utf-8", errors="replace")
-            if isinstance(body, str):
-                payload = json.loads(body)
+            if isinstance(body, (bytes, bytearray, str)):
+                payload = codec.loads(body)
             elif isinstance(body, dict):
                 payload = body
             else:
@@ -128,17 +280,20 @@ class RawQueueBridge(bootsteps.ConsumerStep):
             if not isinstance(subject_id, str) or not subject_id:
                 raise ValueError("Invalid payload: missing or invalid 'subjectId'")
 
+            trace = self._start_forward_span(message, subjectId=subject_id)
             self.app.send_task(
                 "oracle.v2_reindex_subject",
                 args=[payload],
-                queue="celery",
+                headers=tracing.celery_headers(trace.context),
             )
             message.ack()
+            tracing.end_span(trace)
+            tracing.flush()
             logger.info(
                 "Bridged job to Celery task oracle.v2_reindex_subject (subjectId=%s)",
                 subject_id,
             )
-        except json.JSONDecodeError as exc:
+        except codec.DecodeError as exc:
             logger.error("JSON decode error for raw message (reindex): %s", exc)
             message.ack()
         except Exception:
@@ -146,5 +301,157 @@ class RawQueueBridge(bootsteps.ConsumerStep):
             message.ack()
 
 
-# Register bootstep with the worker consumer blueprint
-app.steps["consumer"].add(RawQueueBridge)
+@worker_process_init.connect
+def _warm_worker_process(**_: Any) -> None:
+    """Preload heavy modules, the S3 client and the engine in each prefork child."""
+    if not settings.WORKER_WARMUP_ENABLED:
+        return
+    from workers.warmup import warm_up
+
+    warm_up()
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(**_: Any) -> None:
+    """Children recycle every WORKER_MAX_TASKS_PER_CHILD tasks; keep their livesum gauges out of /metrics."""
+    from utils import metrics
+
+    metrics.mark_process_dead()
+
+
+_BRIDGE_FINAL_STATES = {"SUCCESS", "FAILURE", "IGNORED", "REJECTED", "REVOKED"}
+
+
+@task_postrun.connect
+def _report_bridge_completion(
+    sender: Any = None, task_id: str | None = None, task: Any = None, state: str | None = None, **_: Any
+) -> None:
+    """Tell the bridge that forwarded this task that its user's slot is free.
+
+    Runs in the worker child. Retries keep the slot; only final states release it.
+    """
+    reply_to = getattr(getattr(task, "request", None), "oracle_bridge_reply", None)
+    if not reply_to or not task_id or state not in _BRIDGE_FINAL_STATES:
+        return
+    try:
+        with app.producer_or_acquire() as producer:
+            producer.publish(
+                {"taskId": task_id, "state": state},
+                exchange="",
+                routing_key=reply_to,
+                serializer="json",
+                retry=False,
+            )
+    except Exception:
+        # The bridge reclaims the slot after BRIDGE_LEASE_TTL anyway
+        logger.warning("Failed to report completion of task %s to bridge", task_id, exc_info=True)
+
+
+_TASK_STARTED: dict[str, float] = {}
+
+
+@task_prerun.connect
+def _start_task_timer(task_id: str | None = None, **_: Any) -> None:
+    if task_id:
+        _TASK_STARTED[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _observe_task_duration(
+    sender: Any = None, task_id: str | None = None, state: str | None = None, **_: Any
+) -> None:
+    """Record the run in oracle_task_seconds (utils/metrics.py); retries count as RETRY."""
+    started = _TASK_STARTED.pop(task_id or "", None)
+    if started is None or sender is None:
+        return
+    from utils import metrics
+
+    metrics.TASK_SECONDS.labels(sender.name, state or "UNKNOWN").observe(
+        time.perf_counter() - started
+    )
+
+
+_TASK_SPANS: dict[str, tuple[tracing.Span, Any]] = {}
+
+
+@task_prerun.connect
+def _start_task_span(
+    sender: Any = None, task_id: str | None = None, task: Any = None, **_: Any
+) -> None:
+    """Open the task's span under the context from its message headers and make it current."""
+    if sender is None or not task_id:
+        return
+    request = getattr(task, "request", None)
+    parent = tracing.from_celery_request(request)
+    now_ms = int(time.time() * 1000)
+    sent_at = getattr(request, "oracle_sent_at", None)
+    span = tracing.start_span(
+        sender.name,
+        parent,
+        taskId=task_id,
+        laneWaitMs=max(0, now_ms - int(sent_at)) if isinstance(sent_at, (int, float)) else None,
+        queueWaitMs=(
+            max(0, now_ms - parent.published_at_ms) if parent.published_at_ms is not None else None
+        ),
+    )
+    _TASK_SPANS[task_id] = (span, tracing.activate(span.context))
+
+
+@task_postrun.connect
+def _finish_task_span(
+    sender: Any = None, task_id: str | None = None, state: str | None = None, **_: Any
+) -> None:
+    entry = _TASK_SPANS.pop(task_id or "", None)
+    if entry is None:
+        return
+    span, token = entry
+    tracing.deactivate(token)
+    tracing.end_span(span, state=state, serviceMs=round(span.duration_ms, 3))
+    queue_wait = span.attributes.get("queueWaitMs")
+    if queue_wait is not None and sender is not None:
+        from utils import metrics
+
+        metrics.QUEUE_WAIT_SECONDS.labels(sender.name).observe(queue_wait / 1000.0)
+    logger.info(
+        "[Trace] %s traceId=%s taskId=%s state=%s queue_wait_ms=%s service_ms=%.1f",
+        span.name,
+        span.context.trace_id,
+        task_id,
+        state,
+        queue_wait,
+        span.attributes["serviceMs"],
+    )
+    tracing.flush()
+
+
+_TASK_PROFILES: dict[str, Any] = {}
+
+
+@task_prerun.connect
+def _start_task_profile(
+    sender: Any = None, task_id: str | None = None, args: Any = None, **_: Any
+) -> None:
+    """Profile flagged or sampled runs (utils/profiling.py); a no-op otherwise."""
+    if sender is None or not task_id:
+        return
+    from utils import profiling
+
+    profile = profiling.maybe_start(sender.name, task_id, args[0] if args else None)
+    if profile is not None:
+        _TASK_PROFILES[task_id] = profile
+
+
+@task_postrun.connect
+def _finish_task_profile(task_id: str | None = None, state: str | None = None, **_: Any) -> None:
+    profile = _TASK_PROFILES.pop(task_id or "", None)
+    if profile is None:
+        return
+    from utils import profiling
+
+    profiling.finish(profile, state)
+
+
+# Register bootstep with the worker consumer blueprint. Bulk-only worker profiles
+# disable it so raw jobs are bridged by the interactive workers alone.
+if settings.RAW_BRIDGE_ENABLED:
+    app.steps["consumer"].add(RawQueueBridge)
@@ -1,14 +1,177 @@
 from __future__ import annotations
 
+"""Oracle liveness/readiness probes.
+
+Readiness results are cached: a background task re-checks RabbitMQ and S3
+every HEALTH_REFRESH_INTERVAL seconds, running the checks concurrently in a
+small thread pool with a per-dependency timeout. `/health/ready` only reads
+the cache, so frequent Kubernetes probes neither block the event loop nor
+open broker/S3 connections themselves. If the cache is older than
+HEALTH_MAX_STALENESS (e.g. the refresher is not running), the request
+refreshes it inline.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
 from fastapi import FastAPI, Response, status
-from typing import Any, Dict
-from botocore.exceptions import ClientError
-import boto3
-from kombu import Connection
 
 from config import get_settings
 
-app = FastAPI(title="Oracle Service Health")
+# boto3 and kombu are imported on first use so the probe server starts fast;
+# /health/live never needs them.
+
+_S3_CLIENT: Any = None
+_S3_CLIENT_KEY: Optional[Tuple[Any, ...]] = None
+
+
+def _get_s3_client() -> Any:
+    """Cached S3 client for readiness probes (short timeouts, no retries)."""
+    global _S3_CLIENT, _S3_CLIENT_KEY
+    settings = get_settings()
+    key = (
+        settings.AWS_REGION,
+        settings.AWS_S3_ENDPOINT,
+        settings.AWS_S3_FORCE_PATH_STYLE,
+        settings.HEALTH_S3_TIMEOUT,
+    )
+    if _S3_CLIENT is not None and _S3_CLIENT_KEY == key:
+        return _S3_CLIENT
+
+    import boto3
+    from botocore.config import Config as BotoConfig
+
+    s3_addressing = {"addressing_style": "path"} if settings.AWS_S3_FORCE_PATH_STYLE else {}
+    _S3_CLIENT = boto3.client(
+        "s3",
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.AWS_S3_ENDPOINT or None,
+        config=BotoConfig(
+            retries={"max_attempts": 1, "mode": "standard"},
+            connect_timeout=settings.HEALTH_S3_TIMEOUT,
+            read_timeout=settings.HEALTH_S3_TIMEOUT,
+            s3=s3_addressing or None,
+        ),
+    )
+    _S3_CLIENT_KEY = key
+    return _S3_CLIENT
+
+
+def _check_queue() -> Dict[str, Any]:
+    from kombu import Connection
+
+    settings = get_settings()
+    with Connection(settings.RABBITMQ_URL, connect_timeout=settings.HEALTH_QUEUE_TIMEOUT) as conn:  # type: ignore[call-arg]
+        conn.ensure_connection(max_retries=1)
+    return {}
+
+
+def _check_s3() -> Dict[str, Any]:
+    bucket = get_settings().S3_BUCKET
+    if not bucket:
+        return {"optional": True, "reason": "not configured"}
+    _get_s3_client().head_bucket(Bucket=bucket)
+    return {}
+
+
+class ReadinessCache:
+    """Last result per dependency, refreshed concurrently with timeouts."""
+
+    def __init__(self, checks: Dict[str, Tuple[Callable[[], Dict[str, Any]], Callable[[], float]]]):
+        # name -> (blocking check, timeout getter); checks raise on failure
+        self.checks = checks
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.refreshed_at: Optional[float] = None
+        # Headroom for checks still hung past their timeout
+        self._executor = ThreadPoolExecutor(max_workers=2 * max(1, len(checks)), thread_name_prefix="health")
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        self.results = {}
+        self.refreshed_at = None
+
+    def age(self) -> Optional[float]:
+        return None if self.refreshed_at is None else time.monotonic() - self.refreshed_at
+
+    async def _run(self, name: str) -> Dict[str, Any]:
+        fn, timeout = self.checks[name]
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            extra = await asyncio.wait_for(loop.run_in_executor(self._executor, fn), timeout())
+            result = {"status": "up", **(extra or {})}
+        except asyncio.TimeoutError:
+            result = {"status": "down", "error": f"timed out after {timeout():g}s"}
+        except Exception as e:
+            result = {"status": "down", "error": str(e)}
+        result["latencyMs"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        return result
+
+    async def refresh(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        started = time.monotonic()
+        async with self._lock:
+            # Another caller refreshed while we waited for the lock
+            if self.refreshed_at is not None and self.refreshed_at >= started:
+                return
+            names = list(self.checks)
+            results = await asyncio.gather(*(self._run(n) for n in names))
+            self.results = dict(zip(names, results))
+            self.refreshed_at = time.monotonic()
+
+    async def get(self, max_staleness: float) -> Dict[str, Dict[str, Any]]:
+        age = self.age()
+        if age is None or age > max_staleness:
+            await self.refresh()
+        return self.results
+
+    async def _loop(self, interval: Callable[[], float]) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:  # pragma: no cover - checks already trap their errors
+                pass
+            await asyncio.sleep(interval())
+
+    def start(self, interval: Callable[[], float]) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+readiness = ReadinessCache(
+    {
+        "queue": (_check_queue, lambda: get_settings().HEALTH_QUEUE_TIMEOUT),
+        "s3": (_check_s3, lambda: get_settings().HEALTH_S3_TIMEOUT),
+    }
+)
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    readiness.start(lambda: get_settings().HEALTH_REFRESH_INTERVAL)
+    try:
+        yield
+    finally:
+        await readiness.stop()
+
+
+app = FastAPI(title="Oracle Service Health", lifespan=_lifespan)
 
 
 @app.get("/health/live")
@@ -21,38 +184,27 @@ def health_live() -> Dict[str, Any]:
 
 
 @app.get("/health/ready")
-def health_ready(response: Response) -> Dict[str, Any]:
+async def health_ready(response: Response) -> Dict[str, Any]:
     settings = get_settings()
+    results = await readiness.get(settings.HEALTH_MAX_STALENESS)
 
-    info: Dict[str, Any] = {}
-    errors: Dict[str, Any] = {}
-
-    # RabbitMQ broker check
-    try:
-        with Connection(settings.RABBITMQ_URL) as conn:  # type: ignore[call-arg]
-            conn.ensure_connection(max_retries=1)
-        info["queue"] = {"status": "up"}
-    except Exception as e:  # pragma: no cover - actual broker failure
-        errors["queue"] = {"status": "down", "error": str(e)}
-
-    # S3 bucket check (optional)
-    bucket = settings.S3_BUCKET
-    if bucket:
-        try:
-            s3 = boto3.client(
-                "s3",
-                region_name=settings.AWS_REGION,
-                endpoint_url=settings.AWS_S3_ENDPOINT or None,
-            )
-            s3.head_bucket(Bucket=bucket)
-            info["s3"] = {"status": "up"}
-        except ClientError as e:  # pragma: no cover - depends on env
-            errors["s3"] = {"status": "down", "error": str(e)}
-    else:
-        info["s3"] = {"status": "up", "optional": True, "reason": "not configured"}
+    info = {k: v for k, v in results.items() if v.get("status") == "up"}
+    errors = {k: v for k, v in results.items() if v.get("status") != "up"}
+    age = readiness.age() or 0.0
+    body: Dict[str, Any] = {"info": info, "ageMs": round(age * 1000.0, 2)}
 
     if errors:
         response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-        return {"status": "error", "info": info, "errors": errors}
+        return {"status": "error", **body, "errors": errors}
+
+    return {"status": "ok", **body}
+
+
+@app.get("/metrics")
+def metrics_endpoint() -> Response:
+    """Prometheus exposition of task metrics, summed over all worker processes
+    that share PROMETHEUS_MULTIPROC_DIR (see utils/metrics.py)."""
+    from utils import metrics
 
-    return {"status": "ok", "info": info}
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
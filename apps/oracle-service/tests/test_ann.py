@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+
+import config as cfg
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import embed_server
+from app.core.ann import IVFIndex, IndexRegistry, snapshot_path
+
+
+def _clustered(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(50, dim))
+    return (centers[rng.integers(0, 50, n)] + 0.5 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_ivf_recall_against_brute_force():
+    data = _clustered(5000, 32)
+    index = IVFIndex(32, nprobe=8, min_train=1000)
+    index.add([f"c{i}" for i in range(len(data))], data)
+    assert index.trained
+
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(len(data), 50)] + 0.1 * rng.normal(size=(50, 32))
+    recall = np.mean(
+        [
+            len({i for i, _ in index.search(q, 10)} & {i for i, _ in index.brute_force(q, 10)}) / 10
+            for q in queries
+        ]
+    )
+    assert recall >= 0.9
+
+
+def test_incremental_insert_replace_and_delete():
+    data = _clustered(2000, 16)
+    index = IVFIndex(16, min_train=500)
+    index.add([f"c{i}" for i in range(1000)], data[:1000])
+    index.add([f"c{i}" for i in range(1000, 2000)], data[1000:])
+    assert len(index) == 2000
+
+    top_id, score = index.search(data[1500], 1, nprobe=index.centroids.shape[0])[0]
+    assert top_id == "c1500" and score == pytest.approx(1.0, abs=1e-5)
+
+    index.add(["c1500"], -data[1500:1501])  # replace
+    assert index.search(data[1500], 1)[0][0] != "c1500"
+    assert len(index) == 2000
+
+    assert index.remove([f"c{i}" for i in range(0, 1200)]) == 1200
+    assert len(index) == 800
+    assert all(int(i[1:]) >= 1200 for i, _ in index.search(data[10], 20))
+
+
+def test_repeated_ids_in_one_add_keep_the_last_vector():
+    data = _clustered(4, 16)
+    index = IVFIndex(16)
+    index.add(["a", "b", "a"], data[:3])
+    assert len(index) == 2
+    assert index.remove(["a"]) == 1
+    assert [i for i, _ in index.search(data[0], 5)] == ["b"]  # no ghost row left for "a"
+
+    index.add(["c", "c"], data[2:4])
+    assert index.search(data[3], 1)[0][0] == "c" and len(index) == 2
+
+
+def test_snapshot_roundtrip(tmp_path):
+    data = _clustered(1500, 16)
+    index = IVFIndex(16, min_train=1000)
+    index.add([f"c{i}" for i in range(1500)], data)
+    path = snapshot_path(str(tmp_path), "sub-1")
+    index.save(path)
+
+    loaded = IndexRegistry(16, str(tmp_path)).get("sub-1")
+    assert loaded is not None and len(loaded) == 1500 and loaded.trained
+    assert loaded.search(data[7], 3) == index.search(data[7], 3)
+    with pytest.raises(ValueError):
+        snapshot_path(str(tmp_path), "../etc")
+
+
+def test_registry_reloads_a_rewritten_snapshot(tmp_path):
+    data = _clustered(20, 16)
+    path = snapshot_path(str(tmp_path), "s1")
+    first = IVFIndex(16)
+    first.add([f"doc1:{i}" for i in range(10)], data[:10])
+    first.save(path)
+    registry = IndexRegistry(16, str(tmp_path))
+    assert registry.get("s1").search(data[15], 1)[0][0].startswith("doc1:")
+
+    second = IVFIndex(16)
+    second.add([f"doc2:{i}" for i in range(10)], data[10:])
+    second.save(path)
+    assert registry.get("s1").search(data[15], 1)[0][0] == "doc2:5"
+
+    os.unlink(path)
+    assert registry.get("s1") is None
+
+
+def test_registry_updates_are_shared_across_processes_and_restarts(tmp_path):
+    data = _clustered(30, 16)
+    worker_a = IndexRegistry(16, str(tmp_path))
+    worker_b = IndexRegistry(16, str(tmp_path))
+
+    _, _, persisted = worker_a.update("s1", lambda i: i.add([f"d1:{n}" for n in range(20)], data[:20]), create=True)
+    assert persisted and len(worker_b.get("s1")) == 20
+    # B changes the snapshot A has cached; A's next change starts from B's
+    _, removed, _ = worker_b.update("s1", lambda i: i.remove(["d1:0", "d1:1"]))
+    assert removed == 2
+    worker_a.update("s1", lambda i: i.add(["d2:0"], data[25:26]))
+    assert len(worker_b.get("s1")) == 19
+
+    restarted = IndexRegistry(16, str(tmp_path))
+    assert restarted.get("s1").search(data[25], 1)[0][0] == "d2:0"
+    assert "d1:0" not in [cid for cid, _ in restarted.get("s1").search(data[0], 30)]
+
+
+def test_registry_without_a_snapshot_dir_keeps_updates_in_process():
+    registry = IndexRegistry(16)
+    index, _, persisted = registry.update("s1", lambda i: i.add(["d1:0"], np.ones((1, 16))), create=True)
+    assert not persisted and len(index) == 1
+    assert IndexRegistry(16).get("s1") is None
+
+
+def test_search_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENGINE_DIM", "32")
+    monkeypatch.setenv("ANN_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    client = TestClient(embed_server.app)
+
+    assert client.post("/search", json={"subjectId": "s1", "text": "x"}).status_code == 404
+
+    texts = ["cell membrane", "mitochondria", "photosynthesis", "osmosis"]
+    chunks = [{"id": f"d1:{i}", "text": t} for i, t in enumerate(texts)]
+    resp = client.put("/index/s1/chunks", json={"chunks": chunks})
+    assert resp.status_code == 200 and resp.json()["size"] == 4 and resp.json()["persisted"]
+
+    hits = client.post("/search", json={"subjectId": "s1", "text": "mitochondria", "k": 2}).json()
+    assert hits["results"][0]["id"] == "d1:1"
+    assert hits["results"][0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+    resp = client.request("DELETE", "/index/s1/chunks", json={"ids": ["d1:1"]})
+    assert resp.json()["removed"] == 1 and resp.json()["persisted"]
+    hits = client.post("/search", json={"subjectId": "s1", "text": "mitochondria"}).json()
+    assert "d1:1" not in [h["id"] for h in hits["results"]]
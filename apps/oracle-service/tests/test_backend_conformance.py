@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from app.core import backends
+from app.core.backends import available_backends, create_backend, load_plugins, register_backend
+from app.core.conceptual_engine import ConceptualEngine
+
+TEXTS = [
+    "Mitochondria produce most of the cell's chemical energy.",
+    "The treaty of Westphalia ended the Thirty Years' War in 1648.",
+    "Photosynthesis converts light energy into glucose in chloroplasts.",
+    "Newton's second law relates force, mass and acceleration.",
+]
+DIM = 128
+
+
+@pytest.fixture(params=available_backends())
+def name(request):
+    return request.param
+
+
+def test_shape_dtype_and_unit_rows(name):
+    backend = create_backend(name, DIM)
+    assert backend.dim == DIM and backend.max_batch_size > 0
+    mat = backend.embed_batch(TEXTS)
+    assert mat.shape == (len(TEXTS), DIM)
+    assert mat.dtype in (np.float32, np.float64)
+    np.testing.assert_allclose(np.linalg.norm(mat, axis=1), 1.0, atol=1e-5)
+    assert backend.embed_batch([]).shape == (0, DIM)
+
+
+def test_deterministic_and_batch_independent(name):
+    a = create_backend(name, DIM).embed_batch(TEXTS)
+    b = create_backend(name, DIM)
+    np.testing.assert_allclose(b.embed_batch(TEXTS), a, rtol=1e-6)
+    singles = np.vstack([b.embed_batch([t]) for t in TEXTS])
+    np.testing.assert_allclose(singles, a, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_pooled_batches_match_serial(name, pool, monkeypatch):
+    texts = [f"{TEXTS[i % len(TEXTS)]} variant {i}" for i in range(50)]
+    serial = ConceptualEngine(model_name=name, dim=DIM).embed_texts(texts)
+    # Force several batches so the pool is actually used
+    monkeypatch.setattr(type(create_backend(name, DIM)), "max_batch_size", 8)
+    engine = ConceptualEngine(model_name=name, dim=DIM, pool=pool, pool_workers=2)
+    try:
+        np.testing.assert_allclose(engine.embed_texts(texts), serial, rtol=1e-6)
+    finally:
+        engine.close()
+
+
+def test_throughput_floor(name):
+    backend = create_backend(name, DIM)
+    texts = [f"{TEXTS[i % len(TEXTS)]} {i}" for i in range(backend.max_batch_size)]
+    backend.embed_batch(texts[:4])  # warm caches
+    t0 = time.perf_counter()
+    backend.embed_batch(texts)
+    rate = len(texts) / (time.perf_counter() - t0)
+    # Generous floor: catches accidental per-text Python loops over dim, not regressions of a few %
+    assert rate > 200, f"{name}: {rate:.0f} texts/s"
+
+
+def test_unknown_backend_and_pool_are_rejected():
+    with pytest.raises(ValueError, match="unknown embedding backend"):
+        create_backend("no-such-model", DIM)
+    with pytest.raises(ValueError, match="pool"):
+        ConceptualEngine(pool="fibers")
+
+
+def test_plugins_register_backends(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "_REGISTRY", dict(backends._REGISTRY))
+    monkeypatch.setattr(backends, "_LOADED_PLUGINS", set())
+    (tmp_path / "fake_backend_plugin.py").write_text(
+        "import numpy as np\n"
+        "from app.core.backends import register_backend\n"
+        "class Ones:\n"
+        "    name = 'ones'\n"
+        "    max_batch_size = 2\n"
+        "    thread_safe = False\n"
+        "    def __init__(self, dim):\n"
+        "        self.dim = dim\n"
+        "    def embed_batch(self, texts):\n"
+        "        return np.full((len(texts), self.dim), self.dim ** -0.5, dtype=np.float32)\n"
+        "register_backend('ones', Ones)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "fake_backend_plugin", raising=False)
+    load_plugins(" fake_backend_plugin , ")
+    assert "ones" in available_backends()
+    engine = ConceptualEngine(model_name="ones", dim=16, plugins="fake_backend_plugin", pool="thread")
+    try:
+        mat = engine.embed_texts(["a", "b", "c", "d", "e"])
+    finally:
+        engine.close()
+    assert mat.shape == (5, 16)
+    np.testing.assert_allclose(np.linalg.norm(mat, axis=1), 1.0, atol=1e-6)
+
+
+def test_register_backend_replaces_existing(monkeypatch):
+    monkeypatch.setattr(backends, "_REGISTRY", dict(backends._REGISTRY))
+    marker = object()
+    register_backend("stub-miniLM", lambda dim: marker)  # type: ignore[arg-type,return-value]
+    assert create_backend("stub-miniLM", DIM) is marker
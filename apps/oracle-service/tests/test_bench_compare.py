@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from benchmarks.compare_bench import compare
+
+
+def _report(**medians: float) -> dict:
+    return {"results": [{"key": k, "median": v, "min": v * 0.9} for k, v in medians.items()]}
+
+
+def test_flags_regressions_beyond_threshold_only():
+    base = _report(embed=0.100, split=0.010, topics=2.0, gone=1.0)
+    head = _report(embed=0.108, split=0.013, topics=1.5, fresh=0.2)
+    rows = {r["key"]: r for r in compare(base, head, threshold=0.10)}
+
+    assert rows["embed"]["status"] == "ok"  # +8% is noise
+    assert rows["split"]["status"] == "regressed" and round(rows["split"]["change"], 2) == 0.30
+    assert rows["topics"]["status"] == "improved"
+    assert rows["gone"]["status"] == "missing" and rows["fresh"]["status"] == "new"
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from celery_app import (
+    PRIORITY_AGGREGATE,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_REINDEX,
+    app,
+    settings,
+)
+
+
+def _route(task_name: str) -> dict:
+    return app.amqp.router.route({}, task_name, args=[{}], kwargs={})
+
+
+def test_tasks_are_routed_to_separate_lanes():
+    interactive = _route("oracle.process_document")
+    reindex = _route("oracle.v2_reindex_subject")
+    aggregate = _route("oracle.aggregate_subject_topics")
+
+    assert interactive["queue"].name == settings.CELERY_INTERACTIVE_QUEUE
+    assert reindex["queue"].name == settings.CELERY_REINDEX_QUEUE
+    assert aggregate["queue"].name == settings.CELERY_AGGREGATE_QUEUE
+    assert len({interactive["queue"].name, reindex["queue"].name, aggregate["queue"].name}) == 3
+
+
+def test_lanes_carry_rabbitmq_priorities():
+    assert _route("oracle.process_document")["priority"] == PRIORITY_INTERACTIVE
+    assert _route("oracle.aggregate_subject_topics")["priority"] == PRIORITY_AGGREGATE
+    assert _route("oracle.v2_reindex_subject")["priority"] == PRIORITY_REINDEX
+    assert PRIORITY_INTERACTIVE > PRIORITY_AGGREGATE > PRIORITY_REINDEX
+
+    for q in app.conf.task_queues:
+        assert q.queue_arguments.get("x-max-priority") == settings.CELERY_MAX_PRIORITY
+
+
+class _FakeMessage:
+    def __init__(self) -> None:
+        self.acked = False
+
+    def ack(self) -> None:
+        self.acked = True
+
+
+class _FakeApp:
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, dict, dict]] = []
+
+    def send_task(self, name, args=None, **options):
+        self.sent.append((name, args[0], options))
+
+
+def _bridge(monkeypatch, per_user: int, total: int):
+    from types import SimpleNamespace
+
+    import celery_app
+
+    overrides = {"BRIDGE_MAX_INFLIGHT_PER_USER": per_user, "BRIDGE_MAX_INFLIGHT": total}
+    monkeypatch.setattr(celery_app, "settings", SimpleNamespace(**{**vars(settings), **overrides}))
+    fake = _FakeApp()
+    return celery_app.RawQueueBridge(SimpleNamespace(app=fake)), fake
+
+
+def test_bridge_holds_bulk_jobs_and_serves_other_users_first(monkeypatch):
+    bridge, fake = _bridge(monkeypatch, per_user=1, total=2)
+    bulk = [_FakeMessage() for _ in range(3)]
+    for i, m in enumerate(bulk):
+        bridge.on_message({"documentId": f"b{i}", "s3Key": "k", "userId": "bulk"}, m)
+    light = _FakeMessage()
+    bridge.on_message({"documentId": "l0", "s3Key": "k", "userId": "light"}, light)
+
+    # bulk borrows the idle slots; the rest stay unacked in the bridge
+    assert [p["documentId"] for _, p, _ in fake.sent] == ["b0", "b1"]
+    assert [m.acked for m in bulk] == [True, True, False]
+    assert not light.acked
+
+    _, _, opts = fake.sent[0]
+    assert opts["headers"]["oracle_bridge_reply"] == bridge.done_queue.name
+    bridge.on_done_message({"taskId": opts["task_id"]}, None)
+
+    # The freed slot goes to the user under its cap, not to the next bulk job
+    assert fake.sent[-1][1]["documentId"] == "l0"
+    assert light.acked and not bulk[2].acked
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+import config as cfg
+from app.core.chunk_batch import ChunkBatch
+from utils import codec
+from workers.v2_reindex_worker import _chunkify
+
+
+def _batch() -> ChunkBatch:
+    rng = np.random.default_rng(0)
+    texts = ["alpha beta", 'quote " and é', "gamma", "delta epsilon zeta"]
+    dups = [None, None, ("doc-a", 3), None]
+    return ChunkBatch.build(texts, [2, 3, 1, 3], rng.standard_normal((3, 8)), dups)
+
+
+@pytest.mark.parametrize("name", codec.available())
+def test_payload_json_matches_legacy_dicts(monkeypatch, name):
+    monkeypatch.setenv("JSON_CODEC", name)
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    batch = _batch()
+    body = json.loads(batch.payload_json("d", "m", 8))
+    assert {k: body[k] for k in ("documentId", "model", "dim")} == {"documentId": "d", "model": "m", "dim": 8}
+
+    legacy = list(batch)
+    for got, want in zip(body["chunks"], legacy):
+        if "duplicateOf" in want:
+            doc, index = want.pop("duplicateOf")
+            want["duplicateOf"] = {"documentId": doc, "index": index}
+        else:
+            # float32 values survive the round trip exactly
+            assert np.array_equal(np.asarray(got.pop("embedding"), dtype=np.float32), want.pop("embedding"))
+        assert got == want
+
+
+def test_slices_share_columns_and_embeddings():
+    batch = _batch()
+    assert batch.embeddings.dtype == np.float32 and batch.embeddings.flags.c_contiguous
+    parts = _chunkify(batch, 3)
+    assert [len(p) for p in parts] == [3, 1]
+    assert all(p.embeddings is batch.embeddings for p in parts)
+    assert np.shares_memory(parts[1].rows, batch.rows)
+    assert parts[1][0]["index"] == 3 and parts[1][0]["embedding"] == batch.embeddings[2].tolist()
+
+    indices, mat = parts[0].embedded()
+    assert indices.tolist() == [0, 1] and np.shares_memory(mat, batch.embeddings)
+
+
+def test_from_dicts_round_trip_and_row_check():
+    batch = _batch()
+    again = ChunkBatch.coerce(list(batch), 8)
+    assert list(again) == list(batch)
+    assert ChunkBatch.coerce(batch, 8) is batch
+    with pytest.raises(ValueError):
+        ChunkBatch.build(["a", "b"], [1, 1], np.zeros((1, 8)))
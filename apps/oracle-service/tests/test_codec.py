@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+
+import config as cfg
+from utils import codec
+
+
+@pytest.fixture
+def use_codec(monkeypatch):
+    def _use(name: str) -> None:
+        monkeypatch.setenv("JSON_CODEC", name)
+        monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+    return _use
+
+
+@pytest.mark.parametrize("name", codec.available())
+def test_round_trip_with_numpy_values(use_codec, name):
+    use_codec(name)
+    assert codec.backend() == name
+    vec = np.arange(4, dtype=np.float32) / 4
+    doc = {"text": 'é "quoted"', "embedding": vec, "n": np.int32(3), "mat": vec.reshape(2, 2).T}
+    body = codec.dumps(doc)
+    assert isinstance(body, bytes)
+    assert json.loads(body) == {
+        "text": 'é "quoted"',
+        "embedding": [0.0, 0.25, 0.5, 0.75],
+        "n": 3,
+        "mat": [[0.0, 0.5], [0.25, 0.75]],  # non-contiguous view
+    }
+    assert codec.loads(body) == codec.loads(body.decode("utf-8")) == json.loads(body)
+    assert codec.loads(bytearray(b'{"a": [1, 2]}')) == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize("name", codec.available())
+@pytest.mark.parametrize("data", [b"{not json", b'"\xff"', ""])
+def test_malformed_input_raises_decode_error(use_codec, name, data):
+    use_codec(name)
+    with pytest.raises(codec.DecodeError):
+        codec.loads(data)
+
+
+def test_falls_back_to_stdlib_without_orjson(use_codec, monkeypatch):
+    monkeypatch.setitem(codec._CODECS, "orjson", None)
+    monkeypatch.setattr(codec, "_ACTIVE", None)
+    use_codec("orjson")
+    assert codec.backend() == "json"
+    assert codec.dumps({"a": [1, 2]}) == b'{"a":[1,2]}'
+    with pytest.raises(ValueError):
+        codec.get_codec("orjson")
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import random
+
+from app.core.conceptual_engine import ConceptualEngine
+from utils.dedup import NearDuplicateIndex, hamming, simhash
+from workers.v2_reindex_worker import _reindex_payload
+
+LECTURE = (
+    "The mitochondria is the membrane bound organelle that produces most of the "
+    "chemical energy needed to power the biochemical reactions of the cell"
+)
+
+
+def test_simhash_is_close_for_small_edits_and_far_for_unrelated_text():
+    words = LECTURE.lower().split()
+    edited = words[:5] + ["organelle"] + words[6:]
+    unrelated = "photosynthesis converts light energy into glucose in the chloroplasts of plants".split()
+    assert hamming(simhash(words), simhash(edited)) <= 12
+    assert hamming(simhash(words), simhash(unrelated)) > 12
+
+
+def test_index_links_exact_and_near_duplicates_to_first_occurrence():
+    index = NearDuplicateIndex(max_distance=3, min_tokens=8)
+    assert index.add(("a", 0), LECTURE) is None
+    # Re-export: different whitespace/case/punctuation
+    assert index.add(("b", 0), "  " + LECTURE.upper() + ".") == ("a", 0)
+    # Short chunks only match exactly
+    assert index.add(("a", 1), "Lecture 3") is None
+    assert index.add(("b", 1), "lecture 3") == ("a", 1)
+    assert index.add(("b", 2), "Lecture 4") is None
+
+    stats = index.stats()
+    assert stats["chunks"] == 5 and stats["exactDuplicates"] == 2 and stats["canonical"] == 3
+
+
+def test_banding_finds_every_pair_within_distance():
+    rng = random.Random(0)
+    vocab = [f"w{i}" for i in range(5000)]
+    bases = [rng.choices(vocab, k=60) for _ in range(300)]
+    variants = []
+    for words in bases:
+        edited = list(words)
+        edited[rng.randrange(len(edited))] = rng.choice(vocab)
+        variants.append(edited)
+
+    index = NearDuplicateIndex(max_distance=3, min_tokens=1)
+    for i, words in enumerate(bases):
+        assert index.add(("base", i), " ".join(words)) is None
+    found = [index.add(("variant", i), " ".join(w)) for i, w in enumerate(variants)]
+
+    # Banded lookup agrees with a brute-force Hamming check
+    expected = [hamming(simhash(b), simhash(v)) <= 3 for b, v in zip(bases, variants)]
+    assert [f == ("base", i) for i, f in enumerate(found)] == expected
+    assert 0 < sum(expected) < len(expected)
+
+
+def test_add_many_matches_add_one_at_a_time_and_normalizes_punctuation():
+    rng = random.Random(1)
+    vocab = [f"w{i}" for i in range(500)]
+    texts = [" ".join(rng.choices(vocab, k=rng.randint(0, 40))) for _ in range(200)]
+    texts += [t.upper() + "!" for t in texts[:50]]
+    one_by_one = NearDuplicateIndex(min_tokens=4)
+    batched = NearDuplicateIndex(min_tokens=4)
+    assert batched.add_many(range(len(texts)), texts) == [one_by_one.add(i, t) for i, t in enumerate(texts)]
+    assert batched.stats() == one_by_one.stats()
+
+    index = NearDuplicateIndex()
+    index.add("a", "\u201cDon\u2019t panic\u201d \u2014 the guide\u00a0says")
+    assert index.add("b", "don t panic, the guide says.") == "a"
+    assert index.add("c", "Ünïcode wörds stay wörds") is None
+    assert index.add("d", "ünïcode WÖRDS stay wörds") == "c"
+
+
+def test_chunk_and_embed_skips_embedding_duplicates(monkeypatch):
+    import utils.pdf
+
+    monkeypatch.setattr(utils.pdf, "extract_text", lambda _b: (f"{LECTURE}. Summary of lecture three", 1))
+    engine = ConceptualEngine(dim=16)
+    dedup = NearDuplicateIndex()
+
+    first = engine.chunk_and_embed(b"", "doc-a", dedup=dedup)["chunks"]
+    second = engine.chunk_and_embed(b"", "doc-b", dedup=dedup)["chunks"]
+    assert all("embedding" in c for c in first)
+    assert [c.get("duplicateOf") for c in second] == [("doc-a", 0)]
+    assert "embedding" not in second[0]
+
+    body = json.loads(_reindex_payload("doc-b", "stub-miniLM", 16, second))
+    assert body["chunks"] == [
+        {
+            "index": 0,
+            "text": second[0]["text"],
+            "tokens": second[0]["tokens"],
+            "duplicateOf": {"documentId": "doc-a", "index": 0},
+        }
+    ]
+    assert "embedding" in json.loads(_reindex_payload("doc-a", "stub-miniLM", 16, first))["chunks"][0]
+
+
+def test_worker_embeds_duplicates_core_service_could_not_link(monkeypatch):
+    import utils.pdf
+    from types import SimpleNamespace
+
+    from app.core.chunk_batch import ChunkBatch
+    from workers.v2_reindex_worker import _Run
+
+    monkeypatch.setattr(utils.pdf, "extract_text", lambda _b: (f"{LECTURE}. Summary of lecture three", 1))
+    engine = ConceptualEngine(dim=16)
+    dedup = NearDuplicateIndex()
+    engine.chunk_and_embed(b"", "doc-a", dedup=dedup)
+    batch = ChunkBatch.coerce(engine.chunk_and_embed(b"", "doc-b", dedup=dedup)["chunks"], 16)
+    run = _Run(None, "s1", 2, engine, dedup, keep_vectors=False)
+
+    # The canonical's batch was rejected, so core-service reports the duplicate as unlinked
+    resp = SimpleNamespace(status_code=200, content=b'{"unlinkedDuplicates": [0]}', raise_for_status=lambda: None)
+    unlinked = run.count_put(resp, "doc-b", len(batch))
+    assert unlinked == [0]
+    promoted = run.promote("doc-b", batch, unlinked)
+    assert promoted is not None and run.promoted == 1
+    (chunk,) = json.loads(_reindex_payload("doc-b", "stub-miniLM", 16, promoted))["chunks"]
+    assert chunk["index"] == 0 and chunk["text"] == batch.texts[0] and len(chunk["embedding"]) == 16
+
+    ok = SimpleNamespace(status_code=200, content=b'{"status": "ok"}', raise_for_status=lambda: None)
+    assert run.count_put(ok, "doc-b", len(batch)) == []
+    assert run.promote("doc-b", batch, []) is None
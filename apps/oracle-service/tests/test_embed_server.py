@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import config as cfg
+import pytest
+from fastapi.testclient import TestClient
+
+from app import embed_server
+from app.embed_server import app
+from utils.cache import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def _small_engine(monkeypatch):
+    monkeypatch.setenv("ENGINE_DIM", "32")
+    monkeypatch.setenv("EMBED_CACHE_SIZE", "2")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    monkeypatch.setattr(embed_server, "_QUERY_CACHE", None, raising=False)
+
+
+def test_embed_returns_normalized_vector():
+    client = TestClient(app)
+    resp = client.post("/embed", json={"text": "mitochondria"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["dim"] == 32 and len(body["embedding"]) == 32
+    assert abs(sum(v * v for v in body["embedding"]) - 1.0) < 1e-6
+
+
+def test_embed_rejects_blank_text():
+    client = TestClient(app)
+    assert client.post("/embed", json={"text": "  "}).status_code == 400
+
+
+def test_repeated_queries_hit_the_cache(monkeypatch):
+    from app.core import conceptual_engine as engine_mod
+
+    calls = []
+    real = engine_mod.ConceptualEngine.embed_texts
+
+    def _counting(self, texts, **kw):
+        calls.extend(texts)
+        return real(self, texts, **kw)
+
+    monkeypatch.setattr(engine_mod.ConceptualEngine, "embed_texts", _counting)
+    client = TestClient(app)
+    first = client.post("/embed", json={"text": "krebs cycle"}).json()
+    second = client.post("/embed", json={"text": " krebs cycle "}).json()
+    assert first == second
+    assert calls == ["krebs cycle"]
+
+    stats = client.get("/embed/stats").json()["queryCache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hitRate"] == 0.5 and stats["maxsize"] == 2
+
+
+def test_ttl_cache_evicts_lru_and_expires():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10.0, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.evictions == 1
+
+    now[0] = 11.0
+    assert cache.get("a") is None and cache.expirations == 1
+
+    # A full cache popping an expired LRU entry counts it as expired, not evicted
+    cache.put("d", 4)
+    cache.put("e", 5)
+    assert cache.get("c") is None and cache.evictions == 1 and cache.expirations == 2
+
+
+def test_batch_json_matches_single_embed():
+    client = TestClient(app)
+    texts = ["alpha", "beta", "gamma"]
+    resp = client.post("/embed/batch", json={"texts": texts})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["count"] == 3 and body["dim"] == 32
+    single = client.post("/embed", json={"text": "beta"}).json()["embedding"]
+    assert max(abs(a - b) for a, b in zip(body["embeddings"][1], single)) < 1e-6
+
+
+def test_batch_binary_float32_matrix():
+    import numpy as np
+
+    client = TestClient(app)
+    resp = client.post(
+        "/embed/batch",
+        json={"texts": ["alpha", "beta"]},
+        headers={"Accept": "application/octet-stream"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/octet-stream"
+    rows, dim = (int(x) for x in resp.headers["X-Embedding-Shape"].split(","))
+    mat = np.frombuffer(resp.content, dtype="<f4").reshape(rows, dim)
+    assert (rows, dim) == (2, 32)
+    assert np.allclose(np.linalg.norm(mat, axis=1), 1.0, atol=1e-5)
+
+
+def test_batch_limits(monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_MAX", "2")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    client = TestClient(app)
+    assert client.post("/embed/batch", json={"texts": ["a", "b", "c"]}).status_code == 413
+    assert client.post("/embed/batch", json={"texts": ["a", " "]}).status_code == 400
+    assert client.post("/embed/batch", json={"texts": []}).status_code == 400
+
+
+def test_concurrent_embeds_are_coalesced_into_one_batch(monkeypatch):
+    import asyncio
+
+    from app.core import conceptual_engine as engine_mod
+
+    monkeypatch.setenv("EMBED_MICROBATCH_ENABLED", "true")
+    monkeypatch.setenv("EMBED_MICROBATCH_MAX_WAIT_MS", "50")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    batches = []
+    real = engine_mod.ConceptualEngine.embed_texts
+
+    def _recording(self, texts, **kw):
+        batches.append(list(texts))
+        return real(self, texts, **kw)
+
+    monkeypatch.setattr(engine_mod.ConceptualEngine, "embed_texts", _recording)
+
+    async def _run():
+        reqs = [embed_server.EmbedRequest(text=t) for t in ("a", "b", "a", "c")]
+        return await asyncio.gather(*(embed_server.embed(r) for r in reqs))
+
+    results = asyncio.run(_run())
+    assert batches == [["a", "b", "c"]]  # one engine call, duplicates computed once
+    assert results[0]["embedding"] == results[2]["embedding"]
+    single = TestClient(app).post("/embed", json={"text": "b"}).json()
+    assert single["embedding"] == results[1]["embedding"]
+
+
+def test_micro_batcher_respects_max_batch_and_propagates_errors():
+    import asyncio
+
+    from utils.batching import MicroBatcher
+
+    async def _run():
+        sizes = []
+
+        def fn(items):
+            sizes.append(len(items))
+            if "boom" in items:
+                raise RuntimeError("boom")
+            return [i * 2 for i in items]
+
+        b = MicroBatcher(fn, max_batch=2, max_wait_ms=20)
+        out = await asyncio.gather(*(b.submit(i) for i in (1, 2, 3)))
+        err = await asyncio.gather(b.submit("boom"), return_exceptions=True)
+        await b.close()
+        return sizes, out, err
+
+    sizes, out, err = asyncio.run(_run())
+    assert out == [2, 4, 6]
+    assert sizes[:2] == [2, 1]
+    assert isinstance(err[0], RuntimeError)
+
+
+def test_micro_batcher_sends_lone_items_at_once_and_pipelines():
+    import asyncio
+    import threading
+    import time
+
+    from utils.batching import MicroBatcher
+
+    async def _run():
+        release = threading.Event()
+        sizes = []
+
+        def fn(items):
+            sizes.append(len(items))
+            if items[0] == "slow":
+                release.wait(5)
+            return list(items)
+
+        b = MicroBatcher(fn, max_batch=8, max_wait_ms=1000, max_in_flight=2)
+        t0 = time.monotonic()
+        assert await b.submit("solo") == "solo"
+        lone = time.monotonic() - t0
+        slow = asyncio.ensure_future(b.submit("slow"))
+        await asyncio.sleep(0.05)
+        # A second batch runs while the first is still in the executor
+        assert await b.submit("fast") == "fast"
+        release.set()
+        assert await slow == "slow"
+        await b.close()
+        return lone, sizes
+
+    lone, sizes = asyncio.run(_run())
+    assert lone < 0.5  # not held for max_wait_ms
+    assert sizes == [1, 1, 1]
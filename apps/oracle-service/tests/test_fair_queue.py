@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict, deque
+from types import SimpleNamespace
+
+from utils.fair_queue import DeficitRoundRobin
+
+
+def test_round_robin_interleaves_keys():
+    s = DeficitRoundRobin()
+    for i in range(3):
+        s.push("heavy", f"h{i}")
+    s.push("light", "l0")
+
+    order = []
+    while (nxt := s.pop()) is not None:
+        token, key, item = nxt
+        order.append(item)
+        s.release(token)
+    assert order == ["h0", "l0", "h1", "h2"]
+
+
+def test_inflight_cap_blocks_key_until_release():
+    s = DeficitRoundRobin(max_inflight_per_key=1)
+    s.push("u1", "a")
+    s.push("u1", "b")
+    s.push("u2", "c")
+
+    t1, _, first = s.pop()
+    _, _, second = s.pop()
+    assert (first, second) == ("a", "c")
+    assert s.pop() is None  # u1 is at its cap, u2 is busy and empty
+
+    assert s.release(t1)
+    assert s.pop()[2] == "b"
+
+
+def test_costs_are_charged_against_deficit():
+    s = DeficitRoundRobin(quantum=1.0)
+    s.push("big", "B", cost=3.0)
+    for i in range(3):
+        s.push("small", f"s{i}")
+    order = [s.pop()[2] for _ in range(4)]
+    # "big" accrues credit on each visit and fits on its third turn
+    assert order == ["s0", "s1", "B", "s2"]
+
+
+def test_work_conserving_borrows_idle_capacity_only():
+    s = DeficitRoundRobin(max_inflight_per_key=1, max_inflight=3)
+    for i in range(4):
+        s.push("bulk", f"b{i}")
+    # Alone, the bulk user may use all three global slots despite its cap of 1
+    tokens = [s.pop()[0] for _ in range(3)]
+    assert s.pop() is None  # global bound reached
+    s.push("light", "l0")
+    s.release(tokens[0])
+    # The freed slot goes to the user under its cap
+    assert s.pop()[2] == "l0"
+
+
+def test_expired_leases_are_reclaimed():
+    now = [0.0]
+    s = DeficitRoundRobin(max_inflight_per_key=1, lease_ttl=10.0, clock=lambda: now[0])
+    s.push("u1", "a")
+    s.push("u1", "b")
+    s.pop()
+    assert s.pop() is None
+    now[0] = 11.0
+    assert s.pop()[2] == "b"
+    assert s.inflight("u1") == 1
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+def _simulate(
+    arrivals, workers: int, service: float, scheduler: DeficitRoundRobin | None, prefetch: int = 0
+):
+    """Discrete-event model: raw queue -> bridge -> Celery FIFO queue -> `workers` slots.
+
+    Without a scheduler the bridge forwards in arrival order (old behaviour).
+    With one, the bridge only sees the first `prefetch` unacked messages of the
+    raw queue (BRIDGE_PREFETCH; 0 = unlimited): a message enters the scheduler
+    when a forward (ack) frees a slot in that window, so anything further back
+    waits in broker order. Returns {user: [latency, ...]} measured from publish
+    to task completion.
+    """
+    events: list = []
+    seq = 0
+    for t, user, job in arrivals:
+        heapq.heappush(events, (t, seq, "arrive", (user, job, t)))
+        seq += 1
+
+    broker: deque = deque()
+    unacked = 0
+    celery: deque = deque()
+    free = workers
+    latencies: dict[str, list[float]] = defaultdict(list)
+
+    def dispatch(now: float) -> None:
+        nonlocal free, seq, unacked
+        if scheduler is not None:
+            while True:
+                while broker and (not prefetch or unacked < prefetch):
+                    user, job, t0 = broker.popleft()
+                    scheduler.push(user, (job, t0))
+                    unacked += 1
+                nxt = scheduler.pop()
+                if nxt is None:
+                    break
+                token, user, (job, t0) = nxt
+                unacked -= 1
+                celery.append((token, user, job, t0))
+        while free and celery:
+            free -= 1
+            token, user, job, t0 = celery.popleft()
+            heapq.heappush(events, (now + service, seq, "done", (token, user, t0)))
+            seq += 1
+
+    while events:
+        now, _, kind, data = heapq.heappop(events)
+        if kind == "arrive":
+            user, job, t0 = data
+            if scheduler is None:
+                celery.append((None, user, job, t0))
+            else:
+                broker.append((user, job, t0))
+        else:
+            token, user, t0 = data
+            free += 1
+            latencies[user].append(now - t0)
+            if scheduler is not None:
+                scheduler.release(token)
+        dispatch(now)
+    return latencies
+
+
+def _skewed_arrivals() -> list:
+    # One user bulk-uploads 500 PDFs at t=0; ten others upload 3 each while it drains.
+    arrivals = [(0.0, "bulk", f"bulk-{i}") for i in range(500)]
+    for u in range(10):
+        for j in range(3):
+            arrivals.append((5.0 + u * 7.0 + j * 2.0, f"user-{u}", f"u{u}-{j}"))
+    arrivals.sort(key=lambda a: a[0])
+    return arrivals
+
+
+def test_fair_bridge_bounds_tail_latency_under_skewed_load():
+    arrivals = _skewed_arrivals()
+    workers, service = 4, 1.0
+
+    fifo = _simulate(arrivals, workers, service, None)
+    # The prefetch window holds the whole backlog
+    fair = _simulate(
+        arrivals,
+        workers,
+        service,
+        DeficitRoundRobin(max_inflight_per_key=2, max_inflight=workers),
+        prefetch=len(arrivals),
+    )
+
+    report = SimpleNamespace(
+        fifo={u: round(_p95(v), 1) for u, v in sorted(fifo.items())},
+        fair={u: round(_p95(v), 1) for u, v in sorted(fair.items())},
+    )
+    print("\np95 latency per user (FIFO):", report.fifo)
+    print("p95 latency per user (DRR): ", report.fair)
+
+    assert sum(len(v) for v in fair.values()) == len(arrivals)
+    light = [u for u in fair if u != "bulk"]
+    for u in light:
+        # FIFO: stuck behind the bulk backlog (~125 service times)
+        assert report.fifo[u] > 50 * service
+        # Fair: bounded by a couple of service times regardless of backlog size
+        assert report.fair[u] <= 3 * service
+    # The bulk user gives up very little: total work is unchanged
+    assert report.fair["bulk"] <= report.fifo["bulk"] * 1.1
+
+
+def test_fairness_only_covers_the_prefetch_window():
+    # With the default BRIDGE_PREFETCH=200, 300 bulk messages stay in the broker
+    # ahead of the light users' jobs; the bridge cannot reorder what it has not received.
+    arrivals = _skewed_arrivals()
+    workers, service = 4, 1.0
+    light = {
+        prefetch: {
+            u: round(_p95(v), 1)
+            for u, v in sorted(
+                _simulate(
+                    arrivals,
+                    workers,
+                    service,
+                    DeficitRoundRobin(max_inflight_per_key=2, max_inflight=workers),
+                    prefetch=prefetch,
+                ).items()
+            )
+            if u != "bulk"
+        }
+        for prefetch in (200, 600)
+    }
+    fifo = {u: _p95(v) for u, v in _simulate(arrivals, workers, service, None).items()}
+    print("\np95 latency per light user (prefetch 200):", light[200])
+    print("p95 latency per light user (prefetch 600):", light[600])
+
+    for u, p95 in light[200].items():
+        # Still queued behind the bulk backlog outside the window; the window only
+        # saves about BRIDGE_PREFETCH / workers service times over FIFO
+        assert p95 > 10 * service
+        assert fifo[u] - p95 <= 200 / workers + 2 * service
+    # A window that holds the whole backlog restores the bound
+    assert max(light[600].values()) <= 3 * service
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import config as cfg
+import numpy as np
+
+from app.core.conceptual_engine import ConceptualEngine, get_engine
+from app.core.hashing_embedder import HASHING_MODEL_NAME, HashingEmbedder
+
+
+def test_vectors_are_normalized_and_deterministic_across_instances():
+    texts = ["Krebs cycle enzymes", "Photosynthesis in chloroplasts", ""]
+    a = HashingEmbedder(256).embed(texts)
+    b = HashingEmbedder(256).embed(texts)
+    assert a.shape == (3, 256) and a.dtype == np.float32
+    np.testing.assert_array_equal(a, b)
+    np.testing.assert_allclose(np.linalg.norm(a[:2], axis=1), 1.0, atol=1e-6)
+    assert not a[2].any()  # no tokens -> zero vector
+
+
+def test_shared_vocabulary_scores_higher_than_unrelated_text():
+    emb = HashingEmbedder(1536)
+    query, para, other = emb.embed(
+        [
+            "how do mitochondria produce energy",
+            "Mitochondria produce most of the cell's chemical energy through respiration.",
+            "The treaty of Westphalia ended the Thirty Years' War in 1648.",
+        ]
+    )
+    assert float(query @ para) > 0.3
+    assert abs(float(query @ other)) < 0.1
+
+
+def test_engine_selects_backend_from_model_name(monkeypatch):
+    monkeypatch.setenv("ENGINE_MODEL_NAME", HASHING_MODEL_NAME)
+    monkeypatch.setenv("ENGINE_DIM", "128")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    engine = get_engine()
+    assert engine.model_name == HASHING_MODEL_NAME
+    texts = ["cell membrane transport", "membrane transport across the cell"]
+    np.testing.assert_allclose(engine.embed_texts(texts), HashingEmbedder(128).embed(texts), rtol=1e-6)
+    # Default stub has no lexical signal
+    stub = ConceptualEngine(dim=128).embed_texts(texts)
+    assert float(engine.embed_texts(texts)[0] @ engine.embed_texts(texts)[1]) > float(stub[0] @ stub[1]) + 0.3
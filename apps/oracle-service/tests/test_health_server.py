@@ -1,11 +1,22 @@
 from __future__ import annotations
 
 from fastapi.testclient import TestClient
-import types
+import threading
+import time
 
+import pytest
+
+import health_server
 from health_server import app
 
 
+@pytest.fixture(autouse=True)
+def _fresh_readiness_cache():
+    health_server.readiness.reset()
+    yield
+    health_server.readiness.reset()
+
+
 def test_live_ok():
     client = TestClient(app)
     resp = client.get("/health/live")
@@ -42,3 +53,52 @@ def test_ready_queue_failure(monkeypatch):
     assert resp.status_code == 503
     body = resp.json()
     assert body.get("errors", {}).get("queue")
+
+
+def test_ready_serves_cached_results_with_latency(monkeypatch):
+    import kombu
+
+    calls = []
+
+    def _ok(self, max_retries=1):
+        calls.append(1)
+
+    monkeypatch.setattr(kombu.Connection, "ensure_connection", _ok, raising=True)
+
+    client = TestClient(app)
+    first = client.get("/health/ready").json()
+    second = client.get("/health/ready").json()
+    assert len(calls) == 1  # second probe is answered from the cache
+    queue = first.get("info", {}).get("queue")
+    assert queue["status"] == "up" and queue["latencyMs"] >= 0.0
+    assert second["info"]["queue"]["latencyMs"] == queue["latencyMs"]
+    assert "ageMs" in second
+
+
+def test_ready_checks_run_concurrently_with_timeout(monkeypatch):
+    import kombu
+
+    monkeypatch.setattr(
+        kombu.Connection, "ensure_connection", lambda self, max_retries=1: time.sleep(0.5)
+    )
+    s3_started = threading.Event()
+
+    def _s3_check():
+        s3_started.set()
+        return {}
+
+    monkeypatch.setitem(
+        health_server.readiness.checks, "queue", (health_server._check_queue, lambda: 0.2)
+    )
+    monkeypatch.setitem(health_server.readiness.checks, "s3", (_s3_check, lambda: 1.0))
+
+    client = TestClient(app)
+    t0 = time.perf_counter()
+    resp = client.get("/health/ready")
+    elapsed = time.perf_counter() - t0
+
+    assert resp.status_code == 503
+    body = resp.json()
+    assert "timed out" in body["errors"]["queue"]["error"]
+    assert body["info"]["s3"]["status"] == "up" and s3_started.is_set()
+    assert elapsed < 0.45  # bounded by the queue timeout, not the hung check
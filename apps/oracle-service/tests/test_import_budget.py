@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+"""Cold-start guard for the HTTP entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+checks that heavy dependencies stay deferred and that the module's cumulative
+import time stays within budget. IMPORT_BUDGET_MS overrides the budget on slow
+runners.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+DEFERRED = ("boto3", "botocore", "kombu", "fitz", "sklearn", "celery")
+
+
+def _importtime(module: str) -> dict[str, int]:
+    """Return {module name: cumulative microseconds} for every import."""
+    env = {**os.environ, "PYTHONPATH": str(SERVICE_ROOT), "DO_NOT_LOAD_DOTENV": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVICE_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    out: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        if cumulative.strip().isdigit():
+            out[name.strip()] = int(cumulative.strip())
+    return out
+
+
+@pytest.mark.parametrize("module", ["health_server", "app.embed_server"])
+def test_entry_point_import_budget(module):
+    times = _importtime(module)
+    assert module in times
+
+    loaded_heavy = sorted(m for m in times if m.split(".")[0] in DEFERRED)
+    assert not loaded_heavy, f"{module} eagerly imports {loaded_heavy[:5]}"
+
+    total_ms = times[module] / 1000.0
+    assert total_ms <= BUDGET_MS, f"import {module} took {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
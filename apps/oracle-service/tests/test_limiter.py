@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import config as cfg
+from utils import limiter
+from utils.limiter import AIMDLimiter, CoreGate, TokenBucket
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _resp(status: int, **headers: str) -> SimpleNamespace:
+    return SimpleNamespace(status_code=status, headers=headers)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(limiter.time, "sleep", lambda s: slept.append(s))
+    return slept
+
+
+def test_token_bucket_spends_burst_then_paces():
+    clock = Clock()
+    bucket = TokenBucket(rate=2.0, burst=2, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.now += 2.0
+    assert bucket.reserve() == 0.0
+    assert TokenBucket(rate=0, burst=1).reserve() == 0.0
+
+
+def test_aimd_halves_once_per_round_trip_and_grows_additively():
+    clock = Clock()
+    lim = AIMDLimiter(initial=8, min_limit=1, max_limit=10, clock=clock)
+    starts = []
+    for _ in range(3):
+        assert lim.acquire(timeout=0)
+        starts.append(clock())
+    clock.now += 1.0
+    lim.release(starts[0], 1.0, overloaded=True)
+    # Same window: the other requests started before the decrease
+    lim.release(starts[1], 1.0, overloaded=True)
+    assert lim.limit == 4
+
+    lim.release(starts[2], 1.0, overloaded=False)
+    assert lim.limit == pytest.approx(4.25)
+    for _ in range(60):
+        lim.acquire()
+        lim.release(clock(), 0.1, overloaded=False)
+    assert lim.limit == 10 and lim.in_flight == 0
+
+    lim.acquire()
+    lim.release(clock(), 0.1, overloaded=None)  # no signal
+    assert lim.limit == 10
+
+
+def test_aimd_blocks_at_limit_and_paces_below_one():
+    clock = Clock()
+    lim = AIMDLimiter(initial=1, min_limit=0.25, clock=clock)
+    assert lim.acquire(timeout=0)
+    assert not lim.acquire(timeout=0)
+
+    lim.release(clock(), latency=1.0, overloaded=True)
+    assert lim.limit == 0.5
+    # One slot, free again after latency * (1/limit - 1)
+    assert lim.try_acquire() == (False, 1.0)
+    clock.now += 1.0
+    assert lim.try_acquire() == (True, None)
+
+
+def test_slow_compares_against_route_average():
+    lim = AIMDLimiter(tolerance=2.0)
+    assert not lim.slow("PUT chunks", 0.2)
+    assert not lim.slow("PUT chunks", 0.3)
+    assert lim.slow("PUT chunks", 1.0)
+    assert not lim.slow("GET documents", 1.0)
+    # 10x a fast route, but under the absolute floor
+    assert not lim.slow("GET health", 0.001)
+    assert not lim.slow("GET health", 0.01)
+
+
+def test_gate_retries_overload_then_returns(sleeps):
+    lim = AIMDLimiter(initial=4)
+    gate = CoreGate(lim, None, attempts=4)
+    replies = iter([_resp(503), _resp(429, **{"Retry-After": "2"}), _resp(200)])
+    assert gate.call("t", "PUT chunks", lambda: next(replies)).status_code == 200
+    assert len(sleeps) == 2 and 0.25 <= sleeps[0] <= 0.5 and sleeps[1] == 2.0
+    assert lim.limit < 4 and lim.in_flight == 0
+
+
+def test_gate_returns_last_response_when_retries_run_out(sleeps):
+    gate = CoreGate(AIMDLimiter(), None, attempts=3)
+    calls = []
+    resp = gate.call("t", "PUT chunks", lambda: calls.append(1) or _resp(503, **{"Retry-After": "900"}))
+    assert resp.status_code == 503 and len(calls) == 3
+    assert sleeps == [limiter.MAX_RETRY_DELAY] * 2
+
+
+def test_gate_retries_500_without_lowering_the_limit(sleeps):
+    lim = AIMDLimiter(initial=2)
+    gate = CoreGate(lim, None, attempts=3)
+    replies = iter([_resp(500), _resp(500), _resp(200)])
+    assert gate.call("t", "PUT chunks", lambda: next(replies)).status_code == 200
+    assert len(sleeps) == 2 and lim.limit >= 2
+
+    calls = []
+    assert gate.call("t", "PUT chunks", lambda: calls.append(1) or _resp(500)).status_code == 500
+    assert len(calls) == 3 and lim.in_flight == 0
+
+
+def test_gate_does_not_retry_other_errors_and_releases_on_exception(sleeps):
+    lim = AIMDLimiter(initial=2)
+    gate = CoreGate(lim, None, attempts=4)
+    assert gate.call("t", "PUT chunks", lambda: _resp(501)).status_code == 501
+    assert lim.limit == 2
+    assert gate.call("t", "PUT chunks", lambda: _resp(400)).status_code == 400
+
+    def boom():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        gate.call("t", "PUT chunks", boom)
+    assert lim.in_flight == 0 and sleeps == []
+
+
+def test_async_gate_waits_for_a_slot():
+    lim = AIMDLimiter(initial=1, max_limit=1)
+    gate = CoreGate(lim, None, attempts=1)
+    peak = []
+
+    async def send():
+        peak.append(lim.in_flight)
+        await asyncio.sleep(0.01)
+        return _resp(200)
+
+    async def main():
+        return await asyncio.gather(*(gate.call_async("t", "PUT chunks", send) for _ in range(3)))
+
+    assert [r.status_code for r in asyncio.run(main())] == [200] * 3
+    assert peak == [1, 1, 1] and lim.in_flight == 0
+
+
+def test_gate_follows_settings(monkeypatch):
+    monkeypatch.setattr(limiter, "_GATE", None)
+    monkeypatch.setenv("CORE_LIMIT_ENABLED", "false")
+    monkeypatch.setenv("CORE_RATE_LIMIT", "5")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    g = limiter.gate()
+    assert g.limiter is None and g.bucket is not None and g.bucket.rate == 5
+    assert limiter.gate() is g
+
+    monkeypatch.setenv("CORE_LIMIT_ENABLED", "true")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    assert limiter.gate().limiter is not None
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+
+def test_route_ignores_ids():
+    assert limiter.route_of("PUT", "/internal/reindex/s1/chunks") == limiter.route_of("PUT", "/internal/reindex/s2/chunks/")
+    assert limiter.route_of("GET", "/internal/subjects/s1/documents?x=1") == "GET documents"
@@ -0,0 +1,81 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import load_harness
+
+
+@pytest.fixture(autouse=True)
+def _restore_settings(monkeypatch):
+    import config as cfg
+
+    saved = dict(os.environ)
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    yield
+    os.environ.clear()
+    os.environ.update(saved)
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+
+def test_reindex_load_reports_throughput_and_bytes():
+    cfg = load_harness.LoadConfig(
+        subjects=2, docs=2, pages=1, concurrency=[2], latency_ms=0, jitter_ms=0, dim=64
+    )
+    (row,) = load_harness.run_load(cfg, processes=False)
+    assert row["jobs"] == 2 and row["failed"] == 0
+    assert row["chunks"] > 0 and row["bytesSent"] > 0
+    assert row["docsPerSec"] > 0 and row["p50_s"] <= row["p99_s"]
+
+
+def test_fake_core_injects_errors_on_puts_only():
+    core = load_harness.FakeCoreService({"s": []}, error_rate=1.0)
+    assert core.handle("GET", "/internal/subjects/s/documents", b"")[0] == 200
+    assert core.handle("PUT", "/internal/documents/d/analysis", b"{}")[0] == 503
+    assert core.errors == 1 and core.requests == 2
+    core._server.server_close()
+
+
+def test_async_io_mode_matches_sync_and_fails_on_5xx():
+    base = dict(subjects=2, docs=3, pages=1, concurrency=[1], latency_ms=0, jitter_ms=0, dim=64, batch_size=2)
+    (sync,) = load_harness.run_load(load_harness.LoadConfig(**base), processes=False)
+    (aio,) = load_harness.run_load(
+        load_harness.LoadConfig(**base, io_mode="async", io_concurrency=4), processes=False
+    )
+    assert aio["failed"] == sync["failed"] == 0
+    assert (aio["chunks"], aio["bytesSent"], aio["requests"]) == (sync["chunks"], sync["bytesSent"], sync["requests"])
+
+    (broken,) = load_harness.run_load(
+        load_harness.LoadConfig(**base, io_mode="async", error_rate=1.0, retry_attempts=1), processes=False
+    )
+    assert broken["failed"] == broken["jobs"] == 2
+
+
+def test_in_process_run_restores_celery_send_task():
+    from celery import Celery
+
+    send_task = Celery.send_task
+    load_harness.run_load(
+        load_harness.LoadConfig(subjects=1, docs=1, pages=1, concurrency=[1], latency_ms=0, jitter_ms=0, dim=64),
+        processes=False,
+    )
+    assert Celery.send_task is send_task
+
+
+def test_async_io_mode_links_every_duplicate_on_an_empty_subject():
+    # Each document repeats the one before it, whose PUT is usually still in flight;
+    # with jittered latency, unordered PUTs let some duplicate overtake its canonical
+    base = dict(
+        subjects=1, docs=8, distinct_pdfs=1, pages=3, concurrency=[1], latency_ms=30, jitter_ms=25, dim=64,
+        batch_size=16, dedup=True,
+    )
+    (sync,) = load_harness.run_load(load_harness.LoadConfig(**base), processes=False)
+    (aio,) = load_harness.run_load(load_harness.LoadConfig(**base, io_mode="async", io_concurrency=8), processes=False)
+    assert aio["failed"] == sync["failed"] == 0
+    assert aio["duplicates"] == sync["duplicates"] > 0
+    # Each duplicate reached core-service after its canonical, so none had to be re-embedded
+    assert aio["unlinkedDuplicates"] == sync["unlinkedDuplicates"] == 0
+    assert (aio["chunks"], aio["bytesSent"], aio["requests"]) == (sync["chunks"], sync["bytesSent"], sync["requests"])
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+"""Memory budgets for the hot paths on large synthetic inputs.
+
+Each case runs in a fresh interpreter: the input is built first, then the call
+runs once untraced for the peak-RSS delta (VmHWM growth over the post-setup
+RSS) and once under tracemalloc for the peak of Python
+allocations. Both are divided by the case's unit count (pages, chunks or kchars
+of text) and must stay within the per-unit budget below.
+
+The tier takes about a minute, so pytest.ini deselects it by default; run it
+with `pytest -m memory`.
+MEMORY_BUDGET_SCALE multiplies every budget (e.g. 1.5 on an unusual
+allocator), MEMORY_TEST_SIZE multiplies the input sizes.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.memory
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+SCALE = float(os.getenv("MEMORY_BUDGET_SCALE", "1.0"))
+SIZE = float(os.getenv("MEMORY_TEST_SIZE", "1.0"))
+MB = 1024 * 1024
+
+# name: (unit, units, tracemalloc bytes/unit, RSS bytes/unit)
+CASES = {
+    "extract_text": ("page", 300, 16 * 1024, 48 * 1024),
+    "chunk_and_embed": ("chunk", 600, 48 * 1024, 64 * 1024),
+    "top_keywords": ("kchar", 1000, 40 * 1024, 48 * 1024),
+    "compute_subject_topics": ("chunk", 20_000, 2560, 3 * 1024),
+    "reindex_payload": ("chunk", 2_000, 12 * 1024, 16 * 1024),
+}
+
+# Builds the input for the case, then measures `call`; `units` maps its result to a unit count
+_CHILD = r"""
+import gc, json, resource, sys, tracemalloc
+sys.path[:0] = [sys.argv[3], sys.argv[3] + "/benchmarks"]
+from bench_hotpaths import _pdf, _records, _text
+
+case, n = sys.argv[1], int(sys.argv[2])
+
+if case == "extract_text":
+    from utils.pdf import extract_text
+    pdf = _pdf(n)
+    call, units = (lambda: extract_text(pdf)), (lambda _: n)
+elif case == "chunk_and_embed":
+    from app.core.conceptual_engine import ConceptualEngine
+    engine = ConceptualEngine(dim=1536)
+    # ~5 chunks per synthetic page at the default chunk size
+    pdf = _pdf(max(1, n // 5))
+    call, units = (lambda: engine.chunk_and_embed(pdf, "d")), (lambda r: len(r["chunks"]))
+elif case == "top_keywords":
+    from utils.nlp import top_keywords
+    text = _text(n * 1000, seed=7)
+    call, units = (lambda: top_keywords(text)), (lambda _: n)
+elif case == "compute_subject_topics":
+    from app.core.topics import compute_subject_topics
+    records = _records(n)
+    call, units = (lambda: compute_subject_topics(records)), (lambda _: n)
+elif case == "reindex_payload":
+    import numpy as np
+    from app.core.chunk_batch import ChunkBatch
+    from workers.v2_reindex_worker import _chunkify, _reindex_payload
+    rng = np.random.default_rng(0)
+    chunks = ChunkBatch.build(
+        [_text(600, seed=i % 50) for i in range(n)], [120] * n, rng.standard_normal((n, 1536))
+    )
+    def call():
+        # Per-batch serialize, as the worker does before each PUT
+        for batch in _chunkify(chunks, 250):
+            _reindex_payload("d", "stub-miniLM", 1536, batch)
+    units = lambda _: n
+else:
+    raise SystemExit(f"unknown case {case}")
+
+def status(field):
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) * 1024 for l in f if l.startswith(field + ":"))
+
+gc.collect()
+try:
+    # Reset the high-water mark to the current RSS (Linux >= 4.0)
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    rss0 = status("VmRSS")
+except OSError:
+    # ru_maxrss: peak since fork, which starts at the parent's size
+    rss0 = max(status("VmHWM"), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+result = call()
+rss = status("VmHWM") - rss0
+gc.collect()
+tracemalloc.start()
+call()
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+print(json.dumps({"units": units(result), "tracemallocPeak": peak, "rssDelta": rss}))
+"""
+
+
+def _measure(case: str, units: int) -> dict:
+    env = {**os.environ, "DO_NOT_LOAD_DOTENV": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, case, str(units), str(SERVICE_ROOT)],
+        cwd=SERVICE_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=600,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_memory_within_budget(case):
+    unit, units, traced_budget, rss_budget = CASES[case]
+    m = _measure(case, max(1, int(units * SIZE)))
+    n = m["units"]
+    traced, rss = m["tracemallocPeak"] / n, m["rssDelta"] / n
+    summary = (
+        f"{case}: {n} {unit}s, tracemalloc peak {m['tracemallocPeak'] / MB:.1f} MiB "
+        f"({traced / 1024:.1f} KiB/{unit}), RSS +{m['rssDelta'] / MB:.1f} MiB ({rss / 1024:.1f} KiB/{unit})"
+    )
+    print(summary)
+    assert traced <= traced_budget * SCALE, f"{summary}; budget {traced_budget * SCALE / 1024:.0f} KiB/{unit}"
+    assert rss <= rss_budget * SCALE, f"{summary}; RSS budget {rss_budget * SCALE / 1024:.0f} KiB/{unit}"
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import boto3
+import config as cfg
+import fitz  # PyMuPDF
+import pytest
+import requests_mock
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from prometheus_client import REGISTRY
+
+from app.core.conceptual_engine import ConceptualEngine
+from app.core.topics import compute_subject_topics
+from health_server import app
+from utils import metrics
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+TASK = "oracle.process_document"
+
+
+def _count(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _pdf(text: str, pages: int = 1) -> bytes:
+    buf = io.BytesIO()
+    with fitz.open() as doc:
+        for _ in range(pages):
+            doc.new_page(width=595, height=842).insert_text((72, 72), text)
+        doc.save(buf)
+    return buf.getvalue()
+
+
+def test_process_document_records_stages_bytes_and_put_status(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("S3_BUCKET", "metrics-bucket")
+    monkeypatch.setenv("CORE_SERVICE_URL", "http://core.local:3000")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    from workers.analysis_worker import process_document
+
+    before = {
+        stage: _count("oracle_stage_seconds_count", task=TASK, stage=stage)
+        for stage in ("download", "extract", "tfidf", "serialize")
+    }
+    pages_before = _count("oracle_stage_items_total", task=TASK, stage="extract")
+    put_before = _count("oracle_core_request_seconds_count", task=TASK, method="PUT", status="201")
+    pdf = _pdf("gradient descent minimizes the loss function", pages=2)
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="metrics-bucket")
+        s3.put_object(Bucket="metrics-bucket", Key="k.pdf", Body=pdf)
+        with requests_mock.Mocker() as m:
+            m.put("http://core.local:3000/internal/documents/doc-m/analysis", status_code=201)
+            process_document.run({"documentId": "doc-m", "s3Key": "k.pdf", "userId": "u"})
+
+    for stage, n in before.items():
+        assert _count("oracle_stage_seconds_count", task=TASK, stage=stage) == n + 1, stage
+    assert _count("oracle_stage_items_total", task=TASK, stage="extract") == pages_before + 2
+    assert _count("oracle_core_request_seconds_count", task=TASK, method="PUT", status="201") == put_before + 1
+    assert _count("oracle_payload_bytes_sum", task=TASK, kind="s3_object") >= len(pdf)
+
+
+def test_timed_request_labels_failures_as_error():
+    before = _count("oracle_core_request_seconds_count", task="t", method="GET", status="error")
+
+    def _fail():
+        raise ConnectionError("refused")
+
+    with pytest.raises(ConnectionError):
+        metrics.timed_request("t", "GET", _fail)
+    assert _count("oracle_core_request_seconds_count", task="t", method="GET", status="error") == before + 1
+
+
+def test_engine_and_topics_report_stage_timings():
+    timings: dict = {}
+    text = "Enzymes speed up reactions. Cells divide by mitosis. " * 20
+    result = ConceptualEngine(dim=32).chunk_and_embed(_pdf(text[:400]), "d", timings=timings)
+    assert timings["pages"] == 1 and timings["chunks"] == len(result["chunks"]) == timings["embedded"]
+    assert all(timings[k] >= 0.0 for k in ("extract", "chunk", "embed"))
+
+    topic_timings: dict = {}
+    records = [{"text": f"topic {i % 3} words sample {i}", "documentId": "d"} for i in range(12)]
+    compute_subject_topics(records, timings=topic_timings)
+    assert set(topic_timings) == {"tfidf", "kmeans"}
+
+
+def test_metrics_endpoint_serves_exposition():
+    metrics.observe_stage("oracle.test", "embed", 0.01, items=5)
+    resp = TestClient(app).get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'oracle_stage_items_total{stage="embed",task="oracle.test"}' in resp.text
+
+
+def test_multiprocess_samples_are_summed_across_processes(tmp_path, monkeypatch):
+    env = {**os.environ, "PYTHONPATH": str(SERVICE_ROOT), "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    script = "from utils import metrics; metrics.observe_stage('oracle.mp', 'embed', 0.2, items=3)"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", script], cwd=SERVICE_ROOT, env=env, check=True)
+
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    reg = metrics.registry()
+    assert reg is not REGISTRY
+    labels = {"task": "oracle.mp", "stage": "embed"}
+    assert reg.get_sample_value("oracle_stage_seconds_count", labels) == 2
+    assert reg.get_sample_value("oracle_stage_items_total", labels) == 6
+    assert b"oracle_stage_items_total" in metrics.render(reg)[0]
+
+
+def test_exited_worker_children_leave_the_live_gauge_sum(tmp_path, monkeypatch):
+    env = {**os.environ, "PYTHONPATH": str(SERVICE_ROOT), "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    live = "from utils import metrics; metrics.CORE_LIMIT.set(4)"
+    # A recycled child: worker_process_shutdown runs the celery_app handler before exit
+    recycled = live + "; import celery_app; celery_app._mark_metrics_process_dead()"
+    for script in (live, recycled, recycled):
+        subprocess.run([sys.executable, "-c", script], cwd=SERVICE_ROOT, env=env, check=True)
+
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    assert metrics.registry().get_sample_value("oracle_core_limit") == 4
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import pstats
+
+import boto3
+import config as cfg
+import pytest
+from moto import mock_aws
+
+from utils import profiling
+
+
+@pytest.fixture
+def settings_env(monkeypatch, tmp_path):
+    def _apply(**env: str) -> None:
+        monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+    return _apply
+
+
+def _busy_work() -> int:
+    blob = [bytes(1 << 20) for _ in range(8)]  # ~8 MiB live at once
+    total = 0
+    for i in range(300_000):
+        total += i * i % 7
+    return total + len(blob)
+
+
+def test_disabled_by_default(settings_env):
+    settings_env(PROFILE_SAMPLE_RATE="0")
+    assert profiling.maybe_start("oracle.v2_reindex_subject", "t1", {"subjectId": "s"}) is None
+    assert profiling.maybe_start("oracle.v2_reindex_subject", "t1", None) is None
+
+
+def test_sample_rate_respects_task_filter(settings_env):
+    settings_env(PROFILE_SAMPLE_RATE="1", PROFILE_TASKS="oracle.v2_reindex_subject")
+    assert profiling.maybe_start("oracle.process_document", "t2", {}) is None
+    profile = profiling.maybe_start("oracle.v2_reindex_subject", "t3", {})
+    assert profile is not None
+    profiling.finish(profile)
+
+
+def test_payload_flag_writes_collapsed_stacks_and_memory_peak(settings_env, tmp_path):
+    settings_env(PROFILE_INTERVAL_MS="1")
+    profile = profiling.maybe_start("oracle.process_document", "task/42", {"profile": True})
+    assert profile is not None
+    _busy_work()
+    paths = profiling.finish(profile, "SUCCESS")
+
+    assert sorted(p.rsplit("/", 1)[-1] for p in paths) == ["task_42.collapsed", "task_42.json"]
+    meta = json.loads((tmp_path / "task_42.json").read_text())
+    assert meta["state"] == "SUCCESS" and meta["samples"] > 0
+    assert meta["tracemallocPeakBytes"] >= 8 << 20
+    lines = (tmp_path / "task_42.collapsed").read_text().splitlines()
+    assert any("_busy_work (test_profiling.py" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1 and ";" in stack
+
+
+def test_cprofile_mode_adds_loadable_pstats(settings_env, tmp_path):
+    settings_env(PROFILE_MODE="cprofile", PROFILE_TRACEMALLOC="false")
+    profile = profiling.maybe_start("oracle.process_document", "t4", {"profile": True})
+    assert profile is not None
+    _busy_work()
+    profiling.finish(profile)
+
+    stats = pstats.Stats(str(tmp_path / "t4.pstats"))
+    assert any(func[2] == "_busy_work" for func in stats.stats)  # type: ignore[attr-defined]
+    assert json.loads((tmp_path / "t4.json").read_text())["tracemallocPeakBytes"] is None
+
+
+def test_profiles_upload_to_s3_prefix(settings_env):
+    settings_env(
+        AWS_REGION="us-east-1", S3_BUCKET="profiles", PROFILE_S3_PREFIX="oracle/profiles/"
+    )
+    import utils.s3
+
+    with mock_aws():
+        utils.s3._S3_CLIENT = None
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="profiles")
+        profile = profiling.maybe_start("oracle.v2_reindex_subject", "t5", {"profile": True})
+        assert profile is not None
+        uris = profiling.finish(profile)
+        keys = {
+            o["Key"]
+            for o in boto3.client("s3", region_name="us-east-1")
+            .list_objects_v2(Bucket="profiles")["Contents"]
+        }
+        utils.s3._S3_CLIENT = None
+    assert keys == {"oracle/profiles/t5.collapsed", "oracle/profiles/t5.json"}
+    assert "s3://profiles/oracle/profiles/t5.json" in uris
+
+
+def test_celery_signals_profile_flagged_runs(settings_env, tmp_path):
+    settings_env()
+    import celery_app
+
+    class _Task:
+        name = "oracle.aggregate_subject_topics"
+
+    celery_app._start_task_profile(sender=_Task(), task_id="t6", args=[{"profile": True}])
+    celery_app._start_task_profile(sender=_Task(), task_id="t7", args=[{"subjectId": "s"}])
+    assert set(celery_app._TASK_PROFILES) == {"t6"}
+    celery_app._finish_task_profile(task_id="t6", state="SUCCESS")
+    celery_app._finish_task_profile(task_id="t7", state="SUCCESS")
+    assert not celery_app._TASK_PROFILES
+    assert (tmp_path / "t6.collapsed").exists() and not (tmp_path / "t7.json").exists()
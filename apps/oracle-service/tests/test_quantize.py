@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import config as cfg
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import embed_server
+from app.core.conceptual_engine import ConceptualEngine, get_engine
+from app.core.quantize import dequantize, from_bytes, hamming_distances, quantize, to_bytes
+
+DIM = 1536
+
+
+def _corpus(n: int = 3000, topics: int = 60, seed: int = 0):
+    """Unit vectors clustered around topic directions, plus held-out queries."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, DIM))
+    docs = centers[rng.integers(0, topics, n)] + 0.8 * rng.normal(size=(n, DIM))
+    queries = docs[rng.choice(n, 100, replace=False)] + 0.5 * rng.normal(size=(100, DIM))
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _agreement(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean([len(set(x) & set(y)) / a.shape[1] for x, y in zip(a, b)]))
+
+
+# mode -> (max |cosine error|, min top-10 agreement with float32)
+BOUNDS = {"float16": (1e-4, 0.99), "int8": (5e-3, 0.95)}
+
+
+@pytest.mark.parametrize("mode", list(BOUNDS))
+def test_cosine_error_and_topk_agreement(mode):
+    docs, queries = _corpus()
+    exact = queries @ docs.T
+    q = quantize(docs, mode)
+    approx = queries @ dequantize(q).T
+
+    max_err, min_agreement = BOUNDS[mode]
+    err = float(np.abs(approx - exact).max())
+    agreement = _agreement(_topk(approx, 10), _topk(exact, 10))
+    print(f"\n{mode}: {q.nbytes / docs.nbytes:.3f}x bytes, max cosine error {err:.2e}, top-10 agreement {agreement:.3f}")
+    assert err <= max_err
+    assert agreement >= min_agreement
+
+
+def test_binary_codes_shortlist_then_rescore():
+    docs, queries = _corpus()
+    exact_top = _topk(queries @ docs.T, 10)
+    codes = quantize(docs, "binary").codes
+    qcodes = quantize(queries, "binary").codes
+    hamming = np.stack([hamming_distances(c, codes) for c in qcodes])
+
+    # 1 bit per dimension alone is a coarse ranking...
+    alone = _agreement(np.argsort(hamming, axis=1, kind="stable")[:, :10], exact_top)
+    # ...but a 40-candidate shortlist (4x k) rescored with int8 codes recovers the float32 top-k
+    int8_docs = dequantize(quantize(docs, "int8"))
+    shortlist = np.argsort(hamming, axis=1, kind="stable")[:, :40]
+    rescored = np.stack(
+        [c[np.argsort(-(int8_docs[c] @ qv))[:10]] for c, qv in zip(shortlist, queries)]
+    )
+    rescored_agreement = _agreement(rescored, exact_top)
+    print(f"\nbinary: top-10 agreement {alone:.3f} alone, {rescored_agreement:.3f} with int8 rescoring")
+    assert alone >= 0.35
+    assert rescored_agreement >= 0.9
+
+
+def test_codes_are_compact_and_keep_norms():
+    mat = np.random.default_rng(1).normal(size=(4, DIM)).astype(np.float32)
+    sizes = {m: quantize(mat, m).codes.nbytes for m in ("float32", "float16", "int8", "binary")}
+    assert sizes == {"float32": 4 * DIM * 4, "float16": 4 * DIM * 2, "int8": 4 * DIM, "binary": 4 * DIM // 8}
+    for mode in ("float16", "int8", "binary"):
+        q = quantize(mat, mode)
+        np.testing.assert_allclose(q.norms, np.linalg.norm(mat, axis=1), rtol=1e-6)
+        np.testing.assert_allclose(np.linalg.norm(dequantize(q), axis=1), q.norms, rtol=2e-2)
+    with pytest.raises(ValueError):
+        quantize(mat, "int4")
+
+
+@pytest.mark.parametrize("mode", ["float32", "float16", "int8", "binary"])
+def test_wire_roundtrip(mode):
+    mat = np.random.default_rng(2).normal(size=(3, 100)).astype(np.float32)
+    q = quantize(mat, mode)
+    back = from_bytes(to_bytes(q), mode, 3, 100)
+    np.testing.assert_array_equal(dequantize(back), dequantize(q))
+    with pytest.raises(ValueError):
+        from_bytes(to_bytes(q)[:-1], mode, 3, 100)
+
+
+def test_engine_default_mode_and_batch_endpoint(monkeypatch):
+    engine = ConceptualEngine(dim=64, quantization="int8")
+    assert engine.embed_quantized(["a", "b"]).mode == "int8"
+    assert engine.embed_quantized(["a"], mode="binary").codes.shape == (1, 8)
+
+    monkeypatch.setenv("ENGINE_DIM", "64")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    client = TestClient(embed_server.app)
+    texts = ["alpha", "beta", "gamma"]
+    ref = client.post("/embed/batch?format=binary", json={"texts": texts})
+    resp = client.post("/embed/batch?format=binary&dtype=int8", json={"texts": texts})
+    assert resp.headers["x-embedding-dtype"] == "int8"
+    assert len(resp.content) == 3 * 64 + 3 * 8
+
+    decoded = dequantize(from_bytes(resp.content, "int8", 3, 64))
+    exact = np.frombuffer(ref.content, dtype="<f4").reshape(3, 64)
+    np.testing.assert_allclose(decoded, exact, atol=1e-2)
+
+    assert client.post("/embed/batch?dtype=int4&format=binary", json={"texts": texts}).status_code == 400
+    assert client.post("/embed/batch?dtype=int8", json={"texts": texts}).status_code == 400
+
+
+def test_engine_quantization_does_not_change_the_wire_default_and_is_validated(monkeypatch):
+    from app.core.quantize import MODES
+
+    assert cfg.QUANTIZATION_MODES == MODES
+    monkeypatch.setenv("ENGINE_DIM", "64")
+    monkeypatch.setenv("ENGINE_QUANTIZATION", "binary")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    client = TestClient(embed_server.app)
+    # core-service's EmbeddingService.embedTexts request: octet-stream, dtype pinned to float32
+    # (src/subjects/embedding.service.spec.ts covers its side)
+    headers = {"Accept": "application/octet-stream"}
+    for query in ("", "?dtype=float32"):
+        resp = client.post(f"/embed/batch{query}", json={"texts": ["alpha", "beta"]}, headers=headers)
+        assert resp.headers["x-embedding-dtype"] == "float32" and len(resp.content) == 2 * 64 * 4
+    assert get_engine().embed_quantized(["alpha"]).mode == "binary"
+
+    monkeypatch.setenv("ENGINE_QUANTIZATION", "int4")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    with pytest.raises(ValueError, match="ENGINE_QUANTIZATION"):
+        cfg.get_settings()
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import config as cfg
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import embed_server
+from app.core.conceptual_engine import get_engine
+from app.core.reduction import ProjectionStore, fit_projection, load_projection, save_projection
+from workers.v2_reindex_worker import _write_snapshots
+
+
+def _narrow_subject(n: int = 2000, dim: int = 1536, rank: int = 40, seed: int = 0) -> np.ndarray:
+    """Unit vectors that mostly live in a `rank`-dim subspace, like one course's chunks."""
+    rng = np.random.default_rng(seed)
+    basis = np.linalg.qr(rng.normal(size=(dim, rank)))[0].T
+    mat = rng.normal(size=(n, rank)) @ basis + 0.02 * rng.normal(size=(n, dim))
+    return (mat / np.linalg.norm(mat, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_pca_keeps_variance_and_neighbours():
+    mat = _narrow_subject()
+    proj = fit_projection(mat, 64, "v1", sample_size=1000)
+    assert proj is not None
+    assert proj.n_samples == 1000 and proj.components.shape == (64, 1536)
+    assert proj.explained_variance > 0.9
+
+    reduced = proj.transform(mat)
+    assert reduced.shape == (2000, 64)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+
+    queries = mat[:50]
+    exact = np.argsort(-(queries @ mat.T), axis=1)[:, :10]
+    approx = np.argsort(-(reduced[:50] @ reduced.T), axis=1)[:, :10]
+    agreement = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+    assert agreement >= 0.8
+
+
+def test_projection_roundtrip_and_invalidation(tmp_path):
+    mat = _narrow_subject(n=300, dim=64, rank=8)
+    assert fit_projection(mat[:16], 16, "v1") is None  # fewer rows than target dims
+    proj = fit_projection(mat, 16, "v1")
+    save_projection(str(tmp_path), "s1", proj)
+
+    store = ProjectionStore(str(tmp_path), "v1", 64)
+    loaded = store.get("s1")
+    assert loaded is not None and store.get("s1") is loaded
+    np.testing.assert_allclose(loaded.transform(mat[:3]), proj.transform(mat[:3]), rtol=1e-6)
+    assert load_projection(str(tmp_path), "s1", "v2", 64) is None
+    assert load_projection(str(tmp_path), "s1", "v1", 32) is None
+    assert store.get("missing") is None
+
+
+def test_reindex_fits_projection_and_serves_reduced_search(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENGINE_DIM", "64")
+    monkeypatch.setenv("VECTOR_SNAPSHOT_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setenv("ANN_SNAPSHOT_DIR", str(tmp_path / "ann"))
+    monkeypatch.setenv("PCA_TARGET_DIM", "16")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+    texts = [f"lecture {i} on cellular respiration and enzymes" for i in range(120)]
+    vecs = get_engine().embed_texts(texts)
+    docs = [("d1", [f"d1:{i}" for i in range(60)], vecs[:60]), ("d2", [f"d2:{i}" for i in range(60)], vecs[60:])]
+    summary = _write_snapshots("s1", docs, 64, "stub-miniLM")
+    assert summary is not None and summary["dim"] == 16 and summary["sourceDim"] == 64
+    assert 0 < summary["explainedVariance"] <= 1
+
+    client = TestClient(embed_server.app)
+    hits = client.post("/search", json={"subjectId": "s1", "text": texts[70], "k": 3}).json()
+    assert hits["results"][0]["id"] == "d2:10"
+    assert hits["results"][0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+    reduced = client.post("/embed", json={"text": texts[0], "subjectId": "s1"}).json()
+    assert reduced["dim"] == 16 and len(reduced["embedding"]) == 16
+    assert client.post("/embed", json={"text": texts[0], "subjectId": "other"}).json()["dim"] == 64
+
+    # Incremental upserts are projected into the same space
+    resp = client.put("/index/s1/chunks", json={"chunks": [{"id": "d3:0", "text": "brand new chunk"}]})
+    assert resp.status_code == 200
+    hits = client.post("/search", json={"subjectId": "s1", "text": "brand new chunk", "k": 1}).json()
+    assert hits["results"][0]["id"] == "d3:0"
+
+
+def test_second_reindex_with_a_new_basis_replaces_the_cached_index(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENGINE_DIM", "64")
+    monkeypatch.setenv("VECTOR_SNAPSHOT_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setenv("ANN_SNAPSHOT_DIR", str(tmp_path / "ann"))
+    monkeypatch.setenv("PCA_TARGET_DIM", "16")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    client = TestClient(embed_server.app)
+
+    for topic in ("cellular respiration", "plate tectonics"):
+        texts = [f"lecture {i} on {topic} and its history" for i in range(80)]
+        vecs = get_engine().embed_texts(texts)
+        assert _write_snapshots("s1", [("d1", [f"d1:{i}" for i in range(80)], vecs)], 64, "stub-miniLM") is not None
+        hits = client.post("/search", json={"subjectId": "s1", "text": texts[42], "k": 1}).json()
+        assert hits["results"][0]["id"] == "d1:42"
+        assert hits["results"][0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_registry_rebuilds_when_only_the_projection_changes(tmp_path):
+    from app.core.ann import IndexRegistry
+    from app.core.vector_snapshot import SnapshotStore, write_snapshot
+
+    mat = _narrow_subject(n=300, dim=64, rank=8)
+    write_snapshot(str(tmp_path), "s1", [("d1", [f"d1:{i}" for i in range(300)], mat)], engine_version="v1", dim=64)
+    save_projection(str(tmp_path), "s1", fit_projection(mat, 16, "v1"))
+    registry = IndexRegistry(
+        16, "", vectors=SnapshotStore(str(tmp_path), "v1", 64), projections=ProjectionStore(str(tmp_path), "v1", 64)
+    )
+    first = registry.get("s1")
+    assert first is not None and registry.get("s1") is first
+
+    # Same vectors, different basis (e.g. a refit on another sample): same dims, no 409
+    save_projection(str(tmp_path), "s1", fit_projection(mat[::-1][:150], 16, "v1"))
+    second = registry.get("s1")
+    assert second is not first
+    query = registry.project("s1", mat[7])[0]
+    assert second.search(query, 1)[0][0] == "d1:7"
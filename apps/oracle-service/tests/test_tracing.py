@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import time
+from types import SimpleNamespace
+
+import config as cfg
+import pytest
+import requests_mock
+
+from utils import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def jsonl(monkeypatch, tmp_path):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("TRACE_EXPORTER", "jsonl")
+    monkeypatch.setenv("TRACE_JSONL_PATH", str(path))
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+
+    def _read() -> list[dict]:
+        tracing.flush(wait=True)
+        return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+    return _read
+
+
+class _Message:
+    def __init__(self, headers=None, properties=None) -> None:
+        self.headers = headers or {}
+        self.properties = properties or {}
+        self.acked = False
+
+    def ack(self) -> None:
+        self.acked = True
+
+
+class _App:
+    def __init__(self) -> None:
+        self.sent: list[tuple[str, dict]] = []
+
+    def send_task(self, name, args=None, **options):
+        self.sent.append((name, options))
+
+
+def test_traceparent_parsing_and_amqp_fallbacks():
+    ctx = tracing.parse_traceparent(PARENT)
+    assert ctx is not None and ctx.trace_id == TRACE_ID and ctx.traceparent == PARENT
+    assert tracing.parse_traceparent("00-xyz-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent(None) is None
+
+    from_headers = tracing.from_amqp({"traceparent": PARENT, "x-published-at": "1700000000123"})
+    assert from_headers.trace_id == TRACE_ID and from_headers.published_at_ms == 1700000000123
+    from_props = tracing.from_amqp({}, {"timestamp": 1700000000})
+    assert from_props.published_at_ms == 1700000000000 and len(from_props.trace_id) == 32
+
+
+def test_bridge_forwards_context_and_records_raw_queue_wait(jsonl):
+    import celery_app
+
+    app = _App()
+    bridge = celery_app.RawQueueBridge(SimpleNamespace(app=app))
+    published = int(time.time() * 1000) - 250
+    msg = _Message({"traceparent": PARENT, "x-published-at": published})
+    bridge.on_message({"documentId": "d1", "s3Key": "k", "userId": "u1"}, msg)
+
+    headers = app.sent[0][1]["headers"]
+    forwarded = tracing.parse_traceparent(headers["traceparent"])
+    assert forwarded is not None and forwarded.trace_id == TRACE_ID
+    assert headers["oracle_published_at"] == published and headers["oracle_sent_at"] >= published
+    (span,) = jsonl()
+    assert span["name"] == "bridge.forward" and span["parentSpanId"] == "00f067aa0ba902b7"
+    assert span["spanId"] == forwarded.span_id
+    assert span["attributes"]["rawQueueWaitMs"] >= 250
+
+
+def test_task_span_splits_queue_wait_from_service_time(jsonl):
+    import celery_app
+    from workers.topics_worker import _Http
+
+    now = int(time.time() * 1000)
+    request = SimpleNamespace(
+        traceparent=PARENT, oracle_published_at=now - 1000, oracle_sent_at=now - 400
+    )
+    sender = SimpleNamespace(name="oracle.aggregate_subject_topics")
+    celery_app._start_task_span(sender=sender, task_id="t1", task=SimpleNamespace(request=request))
+    with requests_mock.Mocker() as m:
+        m.get("http://core.local/internal/subjects/s1/chunks", json=[])
+        _Http("http://core.local", "key", (1.0, 1.0)).get("/internal/subjects/s1/chunks")
+        sent = m.request_history[0].headers
+    celery_app._finish_task_span(sender=sender, task_id="t1", state="SUCCESS")
+    assert tracing.current() is None
+
+    spans = {s["name"]: s for s in jsonl()}
+    task, http = spans["oracle.aggregate_subject_topics"], spans["core.GET"]
+    assert task["traceId"] == http["traceId"] == TRACE_ID
+    assert http["parentSpanId"] == task["spanId"]
+    assert sent["X-Trace-Id"] == TRACE_ID and sent["traceparent"] == f"00-{TRACE_ID}-{http['spanId']}-01"
+    attrs = task["attributes"]
+    assert attrs["queueWaitMs"] >= 1000 and 400 <= attrs["laneWaitMs"] < attrs["queueWaitMs"]
+    assert attrs["serviceMs"] >= 0 and attrs["state"] == "SUCCESS"
+
+
+def test_spans_are_dropped_but_context_propagates_when_disabled(monkeypatch):
+    monkeypatch.setenv("TRACE_EXPORTER", "none")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    token = tracing.activate(tracing.new_context())
+    try:
+        with tracing.span("s3.download") as s:
+            assert s is not None and tracing.http_headers()["X-Trace-Id"] == s.context.trace_id
+    finally:
+        tracing.deactivate(token)
+    assert tracing.flush() == 0
+    with tracing.span("outside") as none:
+        assert none is None and tracing.http_headers() == {}
+
+
+def test_otlp_exporter_posts_json_spans(monkeypatch):
+    monkeypatch.setenv("TRACE_EXPORTER", "otlp")
+    monkeypatch.setenv("TRACE_OTLP_ENDPOINT", "http://collector:4318/v1/traces")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    root = tracing.start_span("oracle.process_document", tracing.parse_traceparent(PARENT), pages=3)
+    tracing.end_span(root, error="RuntimeError: boom")
+    with requests_mock.Mocker() as m:
+        m.post("http://collector:4318/v1/traces", status_code=200)
+        assert tracing.flush(wait=True) == 1
+        body = m.request_history[0].json()
+    resource = body["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "oracle-service"
+    (span,) = resource["scopeSpans"][0]["spans"]
+    assert span["traceId"] == TRACE_ID and span["parentSpanId"] == "00f067aa0ba902b7"
+    assert {"key": "pages", "value": {"intValue": "3"}} in span["attributes"]
+    assert span["status"]["code"] == 2
+
+
+def test_follow_up_tasks_are_stamped_with_their_own_publish_time():
+    from app.core.chunk_batch import ChunkBatch
+    from workers.v2_reindex_worker import _Run
+
+    app = _App()
+    hour_ago = int(time.time() * 1000) - 3_600_000
+    token = tracing.activate(tracing.TraceContext(TRACE_ID, "00f067aa0ba902b7", hour_ago))
+    try:
+        before = int(time.time() * 1000)
+        _Run(app, "s1", 1, None, None, keep_vectors=False).finish_document(0, "d1", "m", 8, ChunkBatch.empty(8))
+    finally:
+        tracing.deactivate(token)
+
+    name, options = app.sent[0]
+    assert name == "oracle.aggregate_subject_topics"
+    headers = options["headers"]
+    assert tracing.parse_traceparent(headers["traceparent"]).trace_id == TRACE_ID
+    # Queue wait of the aggregate counts from its enqueue, not from the reindex's publish
+    assert headers["oracle_published_at"] >= before
+    # A bridged message keeps core-service's publish time
+    bridged = tracing.celery_headers(tracing.TraceContext(TRACE_ID, "00f067aa0ba902b7", hour_ago))
+    assert bridged["oracle_published_at"] == hour_ago
+
+
+def test_bridge_does_not_wait_for_the_exporter(monkeypatch):
+    import threading
+
+    import celery_app
+    import requests
+
+    monkeypatch.setenv("TRACE_EXPORTER", "otlp")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    release, posted = threading.Event(), []
+
+    def slow_post(url, json=None, timeout=None):
+        release.wait(5)
+        posted.append(json)
+        return SimpleNamespace(raise_for_status=lambda: None)
+
+    monkeypatch.setattr(requests, "post", slow_post)
+    app = _App()
+    bridge = celery_app.RawQueueBridge(SimpleNamespace(app=app))
+    started = time.monotonic()
+    bridge.on_message({"documentId": "d1", "s3Key": "k", "userId": "u1"}, _Message({"traceparent": PARENT}))
+    assert time.monotonic() - started < 1.0 and len(app.sent) == 1 and posted == []
+
+    release.set()
+    tracing.flush(wait=True)
+    (body,) = posted
+    assert body["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "bridge.forward"
+
+
+def _dropped(reason: str) -> float:
+    from prometheus_client import REGISTRY
+
+    return REGISTRY.get_sample_value("oracle_trace_spans_dropped_total", {"reason": reason}) or 0.0
+
+
+def test_buffer_is_bounded_and_counts_dropped_spans(jsonl, monkeypatch):
+    monkeypatch.setenv("TRACE_MAX_BUFFERED_SPANS", "3")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    before = _dropped("buffer")
+    for i in range(5):
+        tracing.end_span(tracing.start_span(f"s{i}", None))
+
+    assert [s["name"] for s in jsonl()] == ["s0", "s1", "s2"]
+    assert _dropped("buffer") - before == 2
+
+
+def test_slow_collector_drops_overflow_and_exit_flush_has_a_deadline(monkeypatch):
+    import threading
+
+    import requests
+
+    monkeypatch.setenv("TRACE_EXPORTER", "otlp")
+    monkeypatch.setenv("TRACE_MAX_QUEUED_BATCHES", "1")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    entered, release, posted = threading.Event(), threading.Event(), []
+
+    def blackhole(url, json=None, timeout=None):
+        entered.set()
+        release.wait(10)
+        posted.append(json)
+        return SimpleNamespace(raise_for_status=lambda: None)
+
+    monkeypatch.setattr(requests, "post", blackhole)
+    queued, exited = _dropped("queue"), _dropped("exit")
+    try:
+        tracing.end_span(tracing.start_span("exporting", None))
+        assert tracing.flush() == 1 and entered.wait(5)
+        tracing.end_span(tracing.start_span("queued", None))
+        assert tracing.flush() == 1
+        tracing.end_span(tracing.start_span("overflow", None))
+        assert tracing.flush() == 0
+        assert _dropped("queue") - queued == 1
+
+        tracing.end_span(tracing.start_span("at-exit", None))
+        started = time.monotonic()
+        assert tracing.flush(wait=True, timeout=0.2) == 0
+        assert time.monotonic() - started < 1.0
+        # The queued batch and the final buffer are given up on
+        assert _dropped("exit") - exited == 2
+    finally:
+        release.set()
+        tracing.flush(wait=True)
+    assert len(posted) == 2
@@ -2,14 +2,16 @@ import json
 from typing import Any
 
 import boto3
+import numpy as np
 import config as cfg
 import requests_mock
 from moto import mock_aws
 
+from app.core.vector_snapshot import open_snapshot
 from workers.v2_reindex_worker import v2_reindex_subject
 
 
-def test_v2_reindex_end_to_end_with_mocks(monkeypatch):
+def test_v2_reindex_end_to_end_with_mocks(monkeypatch, tmp_path):
     # --- Arrange environment ---
     bucket = "test-bucket"
     region = "us-east-1"
@@ -25,12 +27,16 @@ def test_v2_reindex_end_to_end_with_mocks(monkeypatch):
     monkeypatch.setenv("ENGINE_MODEL_NAME", "stub-miniLM")
     monkeypatch.setenv("ENGINE_DIM", "1536")
     monkeypatch.setenv("REINDEX_BATCH_SIZE", "250")
+    monkeypatch.setenv("ENGINE_VERSION", "oracle-v1")
+    monkeypatch.setenv("VECTOR_SNAPSHOT_DIR", str(tmp_path))
 
     # Reset cached settings to pick up env vars
     monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
 
     # Monkeypatch engine to return deterministic chunks
-    def fake_chunk_and_embed(_self: Any, _pdf_bytes: bytes, _doc_id: str):
+    def fake_chunk_and_embed(
+        _self: Any, _pdf_bytes: bytes, _doc_id: str, dedup: Any = None, timings: Any = None
+    ):
         return {
             "model": "stub-miniLM",
             "dim": 1536,
@@ -90,3 +96,10 @@ def test_v2_reindex_end_to_end_with_mocks(monkeypatch):
             assert body["documentId"] == doc_id
             assert body["dim"] == 1536
             assert isinstance(body["chunks"], list) and len(body["chunks"]) == 3
+
+    # Vectors were published as a shared snapshot for in-process readers
+    snap = open_snapshot(str(tmp_path), subject_id, "oracle-v1", 1536)
+    assert snap is not None
+    assert snap.ids == [f"{doc_id}:0", f"{doc_id}:1", f"{doc_id}:2"]
+    assert snap.docs == {doc_id: (0, 3)}
+    assert snap.vectors[2, 0] == np.float32(0.2)
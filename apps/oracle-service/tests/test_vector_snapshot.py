@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.core.ann import IndexRegistry
+from app.core.vector_snapshot import SnapshotStore, open_snapshot, remove_snapshot, write_snapshot
+
+
+def _docs(seed: int = 0, dim: int = 8):
+    rng = np.random.default_rng(seed)
+    return [
+        ("d1", ["d1:0", "d1:1"], rng.normal(size=(2, dim)).astype(np.float32)),
+        ("d2", ["d2:0", "d2:1", "d2:2"], rng.normal(size=(3, dim)).astype(np.float32)),
+    ]
+
+
+def test_roundtrip_is_read_only_mmap(tmp_path):
+    docs = _docs()
+    write_snapshot(str(tmp_path), "s1", docs, engine_version="v1", dim=8, model="m")
+
+    snap = open_snapshot(str(tmp_path), "s1", "v1", 8)
+    assert snap is not None and len(snap) == 5
+    assert isinstance(snap.vectors, np.memmap) and snap.vectors.dtype == np.float32
+    assert not snap.vectors.flags.writeable
+    assert snap.ids == ["d1:0", "d1:1", "d2:0", "d2:1", "d2:2"]
+    np.testing.assert_array_equal(snap.doc_vectors("d2"), docs[1][2])
+    assert snap.doc_vectors("missing").shape == (0, 8)
+
+
+def test_engine_version_or_dim_change_invalidates(tmp_path):
+    write_snapshot(str(tmp_path), "s1", _docs(), engine_version="v1", dim=8)
+    assert open_snapshot(str(tmp_path), "s1", "v2", 8) is None
+    assert open_snapshot(str(tmp_path), "s1", "v1", 16) is None
+    assert open_snapshot(str(tmp_path), "other", "v1", 8) is None
+    with pytest.raises(ValueError):
+        open_snapshot(str(tmp_path), "../s1", "v1", 8)
+
+
+def test_rewrite_replaces_matrix_and_store_reopens(tmp_path):
+    root = str(tmp_path)
+    write_snapshot(root, "s1", _docs(0), engine_version="v1", dim=8)
+    store = SnapshotStore(root, "v1", 8)
+    first = store.get("s1")
+    assert store.get("s1") is first
+
+    new_docs = _docs(1)[:1]
+    write_snapshot(root, "s1", new_docs, engine_version="v1", dim=8)
+    os.utime(os.path.join(root, "s1.json"), ns=(1, 1))  # mtime granularity on some filesystems
+    second = store.get("s1")
+    assert second is not first and len(second) == 2
+    np.testing.assert_array_equal(second.vectors, new_docs[0][2])
+    # Old mapping still readable after its file was unlinked
+    assert first.vectors.shape == (5, 8) and float(np.abs(first.vectors).sum()) > 0
+    assert len([n for n in os.listdir(root) if n.endswith(".npy")]) == 1
+
+    remove_snapshot(root, "s1")
+    assert store.get("s1") is None and os.listdir(root) == []
+
+
+def test_other_processes_map_the_same_file(tmp_path):
+    docs = _docs()
+    write_snapshot(str(tmp_path), "s1", docs, engine_version="v1", dim=8)
+    code = (
+        "import sys; from app.core.vector_snapshot import open_snapshot;"
+        "s = open_snapshot(sys.argv[1], 's1', 'v1', 8);"
+        "print(type(s.vectors).__name__, float(s.vectors.sum()))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code, str(tmp_path)],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert out[0] == "memmap"
+    assert float(out[1]) == pytest.approx(float(sum(d[2].sum() for d in docs)), rel=1e-5)
+
+
+def test_ann_registry_builds_from_vector_snapshot(tmp_path):
+    docs = _docs()
+    write_snapshot(str(tmp_path), "s1", docs, engine_version="v1", dim=8)
+    registry = IndexRegistry(8, "", vectors=SnapshotStore(str(tmp_path), "v1", 8))
+    index = registry.get("s1")
+    assert index is not None and len(index) == 5
+    assert index.search(docs[1][2][2], 1)[0][0] == "d2:2"
+
+
+def test_ann_registry_index_shares_the_mapped_matrix(tmp_path):
+    docs = [(d, ids, m / np.linalg.norm(m, axis=1, keepdims=True)) for d, ids, m in _docs()]
+    write_snapshot(str(tmp_path), "s1", docs, engine_version="v1", dim=8)
+    store = SnapshotStore(str(tmp_path), "v1", 8)
+    index = IndexRegistry(8, "", vectors=store).get("s1")
+    assert index is not None and np.shares_memory(index._vecs, store.get("s1").vectors)
+
+    # The first insert copies into process memory instead of writing the mapping
+    index.add(["d9:0"], np.ones((1, 8), dtype=np.float32))
+    assert not np.shares_memory(index._vecs, store.get("s1").vectors)
+    assert len(index) == 6
+
+
+def test_ann_registry_reloads_rewritten_snapshots(tmp_path):
+    docs = _docs()
+    write_snapshot(str(tmp_path), "s1", docs[:1], engine_version="v1", dim=8)
+    registry = IndexRegistry(8, "", vectors=SnapshotStore(str(tmp_path), "v1", 8))
+    query = docs[1][2][0]
+    assert registry.get("s1").search(query, 1)[0][0].startswith("d1:")
+
+    write_snapshot(str(tmp_path), "s1", docs[1:], engine_version="v1", dim=8)
+    assert registry.get("s1").search(query, 1)[0][0] == "d2:0"
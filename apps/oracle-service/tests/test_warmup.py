@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import config as cfg
+
+from app.core import conceptual_engine as engine_mod
+from workers.warmup import warm_up
+
+
+def test_warm_up_runs_every_step(monkeypatch):
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    timings = warm_up()
+    for step in ("imports", "s3", "engine", "pdf", "tfidf"):
+        assert step in timings and timings[step] >= 0.0
+    assert timings["total"] >= max(v for k, v in timings.items() if k != "total")
+
+
+def test_engine_singleton_is_shared_and_follows_settings(monkeypatch):
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    monkeypatch.setenv("ENGINE_DIM", "64")
+    first = engine_mod.get_engine()
+    assert engine_mod.get_engine() is first
+    assert first.dim == 64
+
+    monkeypatch.setenv("ENGINE_DIM", "32")
+    monkeypatch.setattr(cfg, "_SETTINGS", None, raising=False)
+    assert engine_mod.get_engine().dim == 32
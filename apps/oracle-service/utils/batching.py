@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+"""Request coalescing for vectorized work.
+
+`MicroBatcher` gathers items submitted concurrently on one event loop, runs a
+single batched call in an executor, and resolves each caller's future with its
+row. Identical items within a batch are computed once.
+
+An item that arrives alone is dispatched at once. When others are queued with
+it, the batcher keeps collecting for up to `max_wait_ms` (or until `max_batch`
+items are waiting). Up to `max_in_flight` batches run at the same time; while
+all of them are busy, new items queue up and go out together in the next batch.
+"""
+
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+        executor: Optional[Executor] = None,
+        max_in_flight: int = 4,
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+        self.fn = fn
+        self.max_batch = int(max_batch)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_in_flight = int(max_in_flight)
+        self.loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Tuple[Hashable, asyncio.Future]]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._batches: "set[asyncio.Task[None]]" = set()
+        self._task = self.loop.create_task(self._run())
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Hashable) -> Any:
+        fut: asyncio.Future = self.loop.create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "meanBatchSize": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "maxBatch": self.max_batch,
+            "maxWaitMs": self.max_wait * 1000.0,
+            "maxInFlight": self.max_in_flight,
+        }
+
+    async def close(self) -> None:
+        self._task.cancel()
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(self._task, *self._batches, return_exceptions=True)
+
+    async def _collect(self) -> List[Tuple[Hashable, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        # Let submitters scheduled in the same loop iteration enqueue first
+        await asyncio.sleep(0)
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            if self._queue.empty():
+                if len(batch) == 1:
+                    break  # alone: waiting would only add latency
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Take whatever is already queued without waiting
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Items keep queueing while every slot is busy and form the next batch
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = self.loop.create_task(self._dispatch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Hashable, asyncio.Future]]) -> None:
+        try:
+            live = [(item, fut) for item, fut in batch if not fut.cancelled()]
+            if not live:
+                return
+            unique: Dict[Hashable, int] = {}
+            for item, _fut in live:
+                unique.setdefault(item, len(unique))
+            try:
+                rows = await self.loop.run_in_executor(self.executor, self.fn, list(unique))
+            except Exception as e:
+                for _item, fut in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            self.batches += 1
+            self.items += len(live)
+            for item, fut in live:
+                if not fut.done():
+                    fut.set_result(rows[unique[item]])
+        finally:
+            self._slots.release()
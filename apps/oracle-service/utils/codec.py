@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+"""JSON encoding for bridge messages and core-service bodies.
+
+`dumps` returns compact UTF-8 bytes and `loads` accepts bytes or str. With
+orjson installed and JSON_CODEC=auto (the default) or orjson, both go through
+orjson. NumPy arrays and scalars are then written natively, so embedding rows
+can be passed as array views without first being turned into Python floats.
+Otherwise, or with JSON_CODEC=json, the stdlib is used: arrays go through
+`.tolist()` and the output has the same compact shape.
+
+Both backends raise `DecodeError` (json.JSONDecodeError; orjson's error type
+subclasses it) on malformed input, including invalid UTF-8.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CODECS = ("auto", "orjson", "json")
+DecodeError = json.JSONDecodeError
+
+Data = Union[bytes, bytearray, memoryview, str]
+
+
+class Codec(NamedTuple):
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[Data], Any]
+
+
+def _json_default(obj: Any) -> Any:
+    # NumPy arrays and scalars; checked by attribute so numpy is not imported here
+    tolist = getattr(obj, "tolist", None)
+    if tolist is not None:
+        return tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+_ENCODER = json.JSONEncoder(default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return _ENCODER.encode(obj).encode("utf-8")
+
+
+def _json_loads(data: Data) -> Any:
+    if not isinstance(data, str):
+        try:
+            data = bytes(data).decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise DecodeError(f"invalid UTF-8: {e}", "", 0) from None
+    return json.loads(data)
+
+
+def _orjson_codec() -> Optional[Codec]:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_json_default, option=option)
+
+    return Codec("orjson", dumps, orjson.loads)
+
+
+_CODECS: Dict[str, Optional[Codec]] = {"json": Codec("json", _json_dumps, _json_loads)}
+_ACTIVE: Optional[Tuple[str, Codec]] = None
+
+
+def available() -> List[str]:
+    if "orjson" not in _CODECS:
+        _CODECS["orjson"] = _orjson_codec()
+    return [name for name, codec in _CODECS.items() if codec is not None]
+
+
+def get_codec(name: str) -> Codec:
+    """The codec called `name` (orjson or json); ValueError if unknown or not installed."""
+    if name not in available():
+        raise ValueError(f"JSON codec {name!r} is not available; have {available()}")
+    codec = _CODECS[name]
+    assert codec is not None
+    return codec
+
+
+def _active() -> Codec:
+    global _ACTIVE
+    wanted = get_settings().JSON_CODEC
+    active = _ACTIVE
+    if active is not None and active[0] == wanted:
+        return active[1]
+    if wanted == "json":
+        codec = get_codec("json")
+    elif "orjson" in available():
+        codec = get_codec("orjson")
+    else:
+        codec = get_codec("json")
+        if wanted == "orjson":
+            logger.warning("[Codec] JSON_CODEC=orjson but orjson is not installed; using json")
+    if wanted not in CODECS:
+        logger.warning("[Codec] Unknown JSON_CODEC=%r; using %s", wanted, codec.name)
+    _ACTIVE = (wanted, codec)
+    return codec
+
+
+def backend() -> str:
+    """Name of the codec `dumps`/`loads` currently use."""
+    return _active().name
+
+
+def dumps(obj: Any) -> bytes:
+    return _active().dumps(obj)
+
+
+def loads(data: Data) -> Any:
+    return _active().loads(data)
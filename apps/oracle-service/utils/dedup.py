@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+"""Near-duplicate text detection with 64-bit SimHash and LSH banding.
+
+`NearDuplicateIndex` remembers the chunks seen so far in a subject. For a new
+chunk it returns the key of an earlier chunk whose normalized text is identical
+or whose SimHash is within `max_distance` bits, otherwise registers the chunk
+as a new canonical one. Candidates are found by splitting the fingerprint into
+`max_distance + 1` bands: two fingerprints within that distance agree exactly
+on at least one band (pigeonhole), so lookups stay sub-linear.
+
+Texts are tokenized and hashed in NumPy over their lowercased UTF-8 bytes, a
+whole document's chunks at a time (`add_many`): a word is a run of ASCII
+letters, digits and `_` or of non-ASCII characters, except Latin-1 and
+General Punctuation symbols (no-break space, quotes, dashes, bullets).
+"""
+
+import hashlib
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+
+_WORD_BYTE = np.zeros(256, dtype=bool)
+for _lo, _hi in ((ord("0"), ord("9")), (ord("a"), ord("z")), (ord("A"), ord("Z")), (0x80, 0xFF)):
+    _WORD_BYTE[_lo : _hi + 1] = True
+_WORD_BYTE[ord("_")] = True
+
+# Polynomial word hash over bytes, mod 2**64 (uint64 arithmetic wraps); the base is
+# odd, so a word's prefix-sum difference can be shifted back by its inverse powers
+_BASE = 0x100000001B3
+_BASE_INV = pow(_BASE, -1, 1 << 64)
+_POW = np.ones(1, dtype=np.uint64)
+_POW_INV = np.ones(1, dtype=np.uint64)
+
+# Odd multipliers for the word positions in a shingle, then the splitmix64 finalizer
+_POSITION_KEYS = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93], dtype=np.uint64
+)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _powers(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """BASE**i and BASE**-i mod 2**64 for i in [0, n)."""
+    global _POW, _POW_INV
+    if len(_POW) < n:
+        size = max(n, 2 * len(_POW))
+        pw = np.empty(size, dtype=np.uint64)
+        inv = np.empty(size, dtype=np.uint64)
+        pw[0] = inv[0] = 1
+        np.cumprod(np.full(size - 1, _BASE, dtype=np.uint64), out=pw[1:])
+        np.cumprod(np.full(size - 1, _BASE_INV, dtype=np.uint64), out=inv[1:])
+        _POW, _POW_INV = pw, inv
+    return _POW[:n], _POW_INV[:n]
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    x ^= x >> np.uint64(30)
+    x *= _MIX1
+    x ^= x >> np.uint64(27)
+    x *= _MIX2
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def _tokenize(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash of every word of `texts` in order, and each text's offsets into them (len + 1)."""
+    parts = [t.lower().encode("utf-8") for t in texts]
+    starts = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(b) + 1 for b in parts], out=starts[1:])
+    buf = np.frombuffer(b"\n".join(parts) + b"\n", dtype=np.uint8)
+    word = _WORD_BYTE[buf]
+    # U+00A0-U+00BF (C2 A0..BF) and U+2000-U+206F (E2 80..81 xx) separate words
+    lead = np.flatnonzero(buf[:-1] == 0xC2)
+    lead = lead[buf[lead + 1] >= 0xA0]
+    word[lead] = word[lead + 1] = False
+    lead = np.flatnonzero(buf[:-2] == 0xE2)
+    lead = lead[(buf[lead + 1] == 0x80) | (buf[lead + 1] == 0x81)]
+    word[lead] = word[lead + 1] = word[lead + 2] = False
+
+    edges = np.diff(word.astype(np.int8), prepend=np.int8(0))
+    begin = np.flatnonzero(edges == 1)
+    end = np.flatnonzero(edges == -1)  # the "\n" after each text closes its last word
+    pw, inv = _powers(len(buf))
+    prefix = np.zeros(len(buf) + 1, dtype=np.uint64)
+    np.cumsum((buf.astype(np.uint64) + np.uint64(1)) * pw, out=prefix[1:])
+    hashes = _mix((prefix[end] - prefix[begin]) * inv[begin])
+    return hashes, np.searchsorted(begin, starts)
+
+
+def _shingle_hashes(h: np.ndarray, shingle: int) -> np.ndarray:
+    """64-bit hash of every run of `shingle` consecutive word hashes in `h`."""
+    n = len(h) - shingle + 1
+    x = np.zeros(max(n, 0), dtype=np.uint64)
+    for pos in range(shingle):
+        x += h[pos : pos + n] * _POSITION_KEYS[pos % len(_POSITION_KEYS)]
+    return _mix(x)
+
+
+def _bit_columns(hashes: np.ndarray) -> np.ndarray:
+    # Column b of the unpacked little-endian bytes is bit b of each hash
+    return np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+
+
+def _majority(counts: np.ndarray, n: np.ndarray) -> np.ndarray:
+    # Per row, a bit is set where more of its n features have it set than not
+    majority = 2 * counts > n[:, None]
+    return np.packbits(majority, axis=1, bitorder="little").view("<u8").ravel()
+
+
+def _simhashes(
+    hashes: np.ndarray, offsets: np.ndarray, which: Sequence[int], shingle: int
+) -> List[int]:
+    """SimHash of texts `which` over word shingles (single words for very short texts)."""
+    which = np.asarray(which, dtype=np.int64)
+    lo, hi = offsets[which], offsets[which + 1]
+    out = np.zeros(len(which), dtype=np.uint64)
+    # Shingles of the concatenation; a text uses the ones that start and end inside it.
+    # Reducing at interleaved [start, stop) bounds sums each text's rows at even positions
+    long_ = hi - lo >= shingle
+    if long_.any():
+        bits = _bit_columns(_shingle_hashes(hashes, shingle))
+        start, stop = lo[long_], hi[long_] - shingle + 1
+        bounds = np.stack([start, stop], axis=1).ravel()
+        if bounds[-1] == len(bits):
+            bounds = bounds[:-1]
+        counts = np.add.reduceat(bits, bounds, axis=0, dtype=np.int32)[::2]
+        out[long_] = _majority(counts, stop - start)
+    for j in np.flatnonzero(~long_ & (hi > lo)):
+        words = _bit_columns(hashes[lo[j] : hi[j]])
+        out[j] = _majority(words.sum(axis=0, dtype=np.int32)[None, :], np.array([len(words)]))[0]
+    return out.tolist()
+
+
+def simhash(words: List[str], shingle: int = 3) -> int:
+    """64-bit SimHash of the text `words` spell (as `NearDuplicateIndex` computes it)."""
+    hashes, offsets = _tokenize([" ".join(words)])
+    return _simhashes(hashes, offsets, [0], shingle)[0]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    def __init__(self, max_distance: int = 3, min_tokens: int = 8) -> None:
+        if not 0 <= max_distance < FINGERPRINT_BITS:
+            raise ValueError("max_distance must be in [0, 64)")
+        self.max_distance = int(max_distance)
+        self.min_tokens = int(min_tokens)
+        n_bands = self.max_distance + 1
+        # Band widths differ by at most one bit and cover all 64 bits
+        base, extra = divmod(FINGERPRINT_BITS, n_bands)
+        self._bands: List[Tuple[int, int]] = []
+        shift = 0
+        for i in range(n_bands):
+            width = base + (1 if i < extra else 0)
+            self._bands.append((shift, (1 << width) - 1))
+            shift += width
+        self._exact: Dict[bytes, Hashable] = {}
+        self._buckets: List[Dict[int, List[Tuple[int, Hashable]]]] = [{} for _ in self._bands]
+        self.seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    def add(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """Return the canonical key `text` duplicates, or register it and return None."""
+        return self.add_many([key], [text])[0]
+
+    def add_many(self, keys: Sequence[Hashable], texts: Sequence[str]) -> List[Optional[Hashable]]:
+        """`add` each text in order (later texts may duplicate earlier ones in the batch)."""
+        hashes, offsets = _tokenize(texts)
+        counts = np.diff(offsets)
+        # Short chunks (headings, page numbers) collide too easily; exact match only
+        fingerprinted = np.flatnonzero(counts >= max(self.min_tokens, 1)).tolist()
+        fps: List[Optional[int]] = [None] * len(texts)
+        for i, fp in zip(fingerprinted, _simhashes(hashes, offsets, fingerprinted, 3)):
+            fps[i] = fp
+        out = []
+        for i, key in enumerate(keys):
+            # Same normalized text <=> same word hashes
+            digest = hashlib.blake2b(hashes[offsets[i] : offsets[i + 1]].tobytes(), digest_size=16).digest()
+            out.append(self._add(key, digest, fps[i]))
+        return out
+
+    def _add(self, key: Hashable, digest: bytes, fp: Optional[int]) -> Optional[Hashable]:
+        self.seen += 1
+        canonical = self._exact.get(digest)
+        if canonical is not None:
+            self.exact_duplicates += 1
+            return canonical
+
+        if fp is not None:
+            for (shift, mask), buckets in zip(self._bands, self._buckets):
+                for other_fp, other_key in buckets.get((fp >> shift) & mask, ()):
+                    if hamming(fp, other_fp) <= self.max_distance:
+                        self.near_duplicates += 1
+                        return other_key
+
+        self._exact[digest] = key
+        if fp is not None:
+            for (shift, mask), buckets in zip(self._bands, self._buckets):
+                buckets.setdefault((fp >> shift) & mask, []).append((fp, key))
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks": self.seen,
+            "canonical": self.seen - self.duplicates,
+            "exactDuplicates": self.exact_duplicates,
+            "nearDuplicates": self.near_duplicates,
+            "ratio": round(self.duplicates / self.seen, 4) if self.seen else 0.0,
+        }
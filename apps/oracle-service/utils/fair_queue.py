@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+"""Per-key fair scheduling (deficit round robin).
+
+Used by the raw-queue bridge to interleave document jobs by userId so that one
+user's bulk upload cannot starve everyone else. Each key owns a FIFO
+sub-queue; keys are visited round robin and credited `quantum` per turn, and a
+job is released once its key's deficit covers the job cost. A key with
+`max_inflight_per_key` outstanding jobs is skipped until one is released.
+
+With `work_conserving` (the default) and a global `max_inflight` bound, keys at
+their cap may still borrow idle capacity when no other key is eligible, so a
+lone bulk uploader keeps every worker busy; the cap only bites once someone
+else is waiting. Without a global bound the per-key cap is always hard.
+
+Released jobs are tracked as leases (token -> key). Callers report completion
+with `release(token)`; leases older than `lease_ttl` are reclaimed so a lost
+completion signal cannot block a key forever.
+"""
+
+
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+
+class DeficitRoundRobin:
+    def __init__(
+        self,
+        quantum: float = 1.0,
+        max_inflight_per_key: int = 0,
+        max_inflight: int = 0,
+        lease_ttl: Optional[float] = None,
+        work_conserving: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if quantum <= 0:
+            raise ValueError("quantum must be > 0")
+        self.quantum = float(quantum)
+        self.max_inflight_per_key = int(max_inflight_per_key)  # 0 = unlimited
+        self.max_inflight = int(max_inflight)  # 0 = unlimited
+        self.lease_ttl = lease_ttl
+        self.work_conserving = work_conserving
+        self._clock = clock
+
+        self._queues: Dict[Hashable, Deque[Tuple[float, Any]]] = {}
+        self._deficit: Dict[Hashable, float] = {}
+        self._active: Deque[Hashable] = deque()
+        self._turn_open = False
+
+        self._inflight: Dict[Hashable, int] = {}
+        self._leases: Dict[str, Tuple[Hashable, float]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @property
+    def inflight_total(self) -> int:
+        return len(self._leases)
+
+    def inflight(self, key: Hashable) -> int:
+        return self._inflight.get(key, 0)
+
+    def pending(self, key: Hashable) -> int:
+        q = self._queues.get(key)
+        return len(q) if q else 0
+
+    def push(self, key: Hashable, item: Any, cost: float = 1.0) -> None:
+        q = self._queues.get(key)
+        if q is None:
+            q = self._queues[key] = deque()
+            self._deficit[key] = 0.0
+            self._active.append(key)
+        q.append((float(cost), item))
+
+    def pop(self, token: Optional[str] = None) -> Optional[Tuple[str, Hashable, Any]]:
+        """Release the next job, or None if nothing is eligible right now.
+
+        Returns (token, key, item); `token` identifies the lease to release.
+        """
+        self.expire()
+        if self.max_inflight and len(self._leases) >= self.max_inflight:
+            return None
+
+        nxt = self._next(respect_caps=True)
+        if nxt is None and self.work_conserving and self.max_inflight:
+            nxt = self._next(respect_caps=False)
+        if nxt is None:
+            return None
+        key, item = nxt
+        token = token or uuid.uuid4().hex
+        self._leases[token] = (key, self._clock())
+        self._inflight[key] = self.inflight(key) + 1
+        return token, key, item
+
+    def release(self, token: str) -> bool:
+        lease = self._leases.pop(token, None)
+        if lease is None:
+            return False
+        key = lease[0]
+        left = self._inflight.get(key, 0) - 1
+        if left > 0:
+            self._inflight[key] = left
+        else:
+            self._inflight.pop(key, None)
+        return True
+
+    def expire(self) -> int:
+        if not self.lease_ttl or not self._leases:
+            return 0
+        cutoff = self._clock() - self.lease_ttl
+        stale = [t for t, (_k, started) in self._leases.items() if started <= cutoff]
+        for t in stale:
+            self.release(t)
+        return len(stale)
+
+    def _next(self, respect_caps: bool) -> Optional[Tuple[Hashable, Any]]:
+        blocked = 0
+        while self._active and blocked < len(self._active):
+            key = self._active[0]
+            if (
+                respect_caps
+                and self.max_inflight_per_key
+                and self.inflight(key) >= self.max_inflight_per_key
+            ):
+                self._end_turn()
+                blocked += 1
+                continue
+            blocked = 0
+            if not self._turn_open:
+                self._deficit[key] += self.quantum
+                self._turn_open = True
+            q = self._queues[key]
+            cost, item = q[0]
+            if cost > self._deficit[key]:
+                self._end_turn()
+                continue
+
+            q.popleft()
+            self._deficit[key] -= cost
+            if not q:
+                # Idle keys forfeit their credit (standard DRR)
+                self._active.popleft()
+                del self._queues[key]
+                del self._deficit[key]
+                self._turn_open = False
+            return key, item
+        return None
+
+    def _end_turn(self) -> None:
+        self._active.rotate(-1)
+        self._turn_open = False
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+"""Client-side overload control for core-service calls, shared per process.
+
+Every core-service request from the reindex and topics workers goes through
+`gate().call(...)` (or `call_async` in workers/reindex_async.py):
+
+    TokenBucket   CORE_RATE_LIMIT requests/s with CORE_RATE_BURST burst (0 = off)
+    AIMDLimiter   at most `limit` requests in flight. A 429/502/503/504, or a
+                  latency above CORE_LATENCY_TOLERANCE x the route's moving
+                  average, halves the limit (once per round trip: signals
+                  from requests started before the last decrease are
+                  ignored). Any other response adds 1/limit, i.e. +1 per
+                  window. Below 1 the limit paces a single slot: after a
+                  request of latency t the next one waits t * (1/limit - 1).
+    retries       429/500/502/503/504 are retried up to CORE_RETRY_ATTEMPTS
+                  times per request, after Retry-After or a jittered
+                  exponential delay. The caller sees the last response, and
+                  its status policy applies only after the retries run out.
+                  A 500 is retried (the chunk and topic PUTs are upserts) but
+                  does not lower the limit: it says nothing about load.
+
+The limit starts at CORE_LIMIT_INITIAL and stays within [CORE_LIMIT_MIN,
+CORE_LIMIT_MAX]. Prefork children each hold their own gate, so a node's
+concurrency against core-service is the sum over its processes
+(`oracle_core_limit`, summed over live processes). CORE_LIMIT_ENABLED=false
+keeps only the retries.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from config import get_settings
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+OVERLOAD_STATUSES = frozenset({429, 502, 503, 504})
+RETRY_STATUSES = OVERLOAD_STATUSES | {500}
+MAX_RETRY_DELAY = 30.0
+# Latency above tolerance x average only counts once it is also this much slower (seconds)
+_LATENCY_FLOOR = 0.05
+_EWMA_ALPHA = 0.05
+_POLL_INTERVAL = 0.005
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it (0 if none)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        initial: float = 4.0,
+        min_limit: float = 0.25,
+        max_limit: float = 32.0,
+        backoff: float = 0.5,
+        tolerance: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._clock = clock
+        self._limit = min(self.max_limit, max(min_limit, initial))
+        self._in_flight = 0
+        self._free_at = 0.0
+        self._last_decrease = float("-inf")
+        self._latency: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _wait_time(self) -> Optional[float]:
+        """0 if a slot is free now, seconds until pacing frees it, or None (wait for a release)."""
+        if self._in_flight >= max(1, int(self._limit)):
+            return None
+        return max(0.0, self._free_at - self._clock())
+
+    def try_acquire(self) -> Tuple[bool, Optional[float]]:
+        with self._cond:
+            wait = self._wait_time()
+            if wait == 0.0:
+                self._in_flight += 1
+                return True, None
+            return False, wait
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while True:
+                wait = self._wait_time()
+                if wait == 0.0:
+                    self._in_flight += 1
+                    return True
+                if deadline is not None:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def slow(self, route: str, latency: float) -> bool:
+        """Whether `latency` is well above the route's moving average (and update the average)."""
+        with self._cond:
+            avg = self._latency.get(route)
+            self._latency[route] = latency if avg is None else avg + (latency - avg) * _EWMA_ALPHA
+        return avg is not None and latency > avg * self.tolerance and latency - avg > _LATENCY_FLOOR
+
+    def release(self, started: float, latency: float, overloaded: Optional[bool]) -> None:
+        """End a request; `overloaded` None leaves the limit unchanged (errors, other 5xx)."""
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded:
+                if started >= self._last_decrease:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._last_decrease = self._clock()
+            elif overloaded is not None:
+                step = 1.0 / self._limit if self._limit >= 1 else 0.1
+                self._limit = min(self.max_limit, self._limit + step)
+            if self._limit < 1:
+                self._free_at = max(self._free_at, self._clock() + latency * (1.0 / self._limit - 1.0))
+            self._cond.notify_all()
+
+
+def _retry_delay(resp: Any, attempt: int) -> float:
+    try:
+        after = float(resp.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        after = None
+    if after is not None and after >= 0:
+        return min(MAX_RETRY_DELAY, after)
+    return min(MAX_RETRY_DELAY, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class CoreGate:
+    def __init__(
+        self,
+        limiter: Optional[AIMDLimiter],
+        bucket: Optional[TokenBucket],
+        attempts: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.limiter = limiter
+        self.bucket = bucket
+        self.attempts = max(1, attempts)
+        self._clock = clock
+
+    def _release(self, route: str, started: float, resp: Any) -> bool:
+        """Feed the response to the limiter; True if it should be retried."""
+        status = getattr(resp, "status_code", None)
+        overloaded = status in OVERLOAD_STATUSES
+        if self.limiter is not None:
+            latency = self._clock() - started
+            signal: Optional[bool] = True
+            if not overloaded:
+                # Other 5xx say nothing about load; slow successes do
+                signal = None if status is None or status >= 500 else self.limiter.slow(route, latency)
+            self.limiter.release(started, latency, signal)
+            metrics.CORE_LIMIT.set(self.limiter.limit)
+        return status in RETRY_STATUSES
+
+    def _abort(self, started: float) -> None:
+        if self.limiter is not None:
+            self.limiter.release(started, self._clock() - started, None)
+
+    def _retry_after(self, task: str, route: str, resp: Any, attempt: int) -> float:
+        delay = _retry_delay(resp, attempt)
+        metrics.CORE_RETRIES.labels(task, str(resp.status_code)).inc()
+        logger.warning(
+            "[Core] %s returned %s; retry %d/%d in %.1fs", route, resp.status_code, attempt, self.attempts - 1, delay
+        )
+        return delay
+
+    def call(self, task: str, route: str, send: Callable[[], R]) -> R:
+        """Send through the bucket and limiter, retrying overload responses and 500s."""
+        attempt = 1
+        while True:
+            t0 = self._clock()
+            if self.bucket is not None:
+                time.sleep(self.bucket.reserve())
+            if self.limiter is not None:
+                self.limiter.acquire()
+            started = self._clock()
+            metrics.CORE_WAIT_SECONDS.labels(task).observe(started - t0)
+            try:
+                resp = send()
+            except BaseException:
+                self._abort(started)
+                raise
+            if not self._release(route, started, resp) or attempt >= self.attempts:
+                return resp
+            time.sleep(self._retry_after(task, route, resp, attempt))
+            attempt += 1
+
+    async def call_async(self, task: str, route: str, send: Callable[[], Awaitable[R]]) -> R:
+        """`call` for coroutines; waits without blocking the event loop."""
+        attempt = 1
+        while True:
+            t0 = self._clock()
+            if self.bucket is not None:
+                await asyncio.sleep(self.bucket.reserve())
+            if self.limiter is not None:
+                while True:
+                    ok, wait = self.limiter.try_acquire()
+                    if ok:
+                        break
+                    # A release does not wake the loop; poll while every slot is busy
+                    await asyncio.sleep(wait if wait is not None else _POLL_INTERVAL)
+            started = self._clock()
+            metrics.CORE_WAIT_SECONDS.labels(task).observe(started - t0)
+            try:
+                resp = await send()
+            except BaseException:
+                self._abort(started)
+                raise
+            if not self._release(route, started, resp) or attempt >= self.attempts:
+                return resp
+            await asyncio.sleep(self._retry_after(task, route, resp, attempt))
+            attempt += 1
+
+
+def route_of(method: str, path: str) -> str:
+    """Latency key for a request: method and last path segment (ids vary, endpoints don't)."""
+    return f"{method} {path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]}"
+
+
+_GATE: Optional[Tuple[Tuple[Any, ...], CoreGate]] = None
+_GATE_LOCK = threading.Lock()
+
+
+def gate() -> CoreGate:
+    """Process-wide gate built from settings (rebuilt if the CORE_* settings change)."""
+    global _GATE
+    s = get_settings()
+    key = (
+        s.CORE_LIMIT_ENABLED,
+        s.CORE_LIMIT_INITIAL,
+        s.CORE_LIMIT_MIN,
+        s.CORE_LIMIT_MAX,
+        s.CORE_LATENCY_TOLERANCE,
+        s.CORE_RATE_LIMIT,
+        s.CORE_RATE_BURST,
+        s.CORE_RETRY_ATTEMPTS,
+    )
+    with _GATE_LOCK:
+        if _GATE is None or _GATE[0] != key:
+            limiter = (
+                AIMDLimiter(
+                    s.CORE_LIMIT_INITIAL,
+                    s.CORE_LIMIT_MIN,
+                    s.CORE_LIMIT_MAX,
+                    tolerance=s.CORE_LATENCY_TOLERANCE,
+                )
+                if s.CORE_LIMIT_ENABLED
+                else None
+            )
+            bucket = TokenBucket(s.CORE_RATE_LIMIT, s.CORE_RATE_BURST) if s.CORE_RATE_LIMIT > 0 else None
+            _GATE = (key, CoreGate(limiter, bucket, s.CORE_RETRY_ATTEMPTS))
+        return _GATE[1]
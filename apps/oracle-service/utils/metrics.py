@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+"""Prometheus metrics for the oracle Celery tasks.
+
+Each task records per-stage wall time and item counts, payload sizes and
+core-service request latency:
+
+    oracle_stage_seconds{task,stage}          histogram; stages: download, extract,
+                                              chunk, embed, serialize, tfidf, kmeans,
+                                              snapshot
+    oracle_stage_items_total{task,stage}      pages (extract), chunks (chunk, embed,
+                                              tfidf, kmeans); throughput is
+                                              rate(items) / rate(seconds_sum)
+    oracle_payload_bytes{task,kind}           s3_object, request_body
+    oracle_core_request_seconds{task,method,status}
+                                              one sample per attempt; status is the
+                                              HTTP code or "error" (no response)
+    oracle_core_limit                         adaptive in-flight limit (utils/limiter.py);
+                                              summed over live processes
+    oracle_core_wait_seconds{task}            time a request waited for the rate limit
+                                              and a free slot
+    oracle_core_retries_total{task,status}    overload responses that were retried
+    oracle_task_seconds{task,state}           whole task, from celery_app signals
+    oracle_queue_wait_seconds{task}           core-service publish -> task start, for
+                                              jobs that carry a publish time
+                                              (utils/tracing.py)
+    oracle_trace_spans_dropped_total{reason}  spans lost to a full buffer or export
+                                              queue, or to the exit flush deadline
+
+Celery prefork children each hold their own counters. When
+PROMETHEUS_MULTIPROC_DIR is set (in the environment, before the first import of
+prometheus_client) every process writes its samples to files in that
+directory, and `render()` (health_server's `/metrics`) sums them across
+processes. Without it `render()` exports this process's registry only.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+T = TypeVar("T")
+
+_SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+# 1 KiB .. 256 MiB in powers of 4
+_BYTES_BUCKETS = tuple(float(1024 * 4**i) for i in range(10))
+
+STAGE_SECONDS = Histogram(
+    "oracle_stage_seconds",
+    "Wall time of one task stage",
+    ["task", "stage"],
+    buckets=_SECONDS_BUCKETS,
+)
+STAGE_ITEMS = Counter("oracle_stage_items", "Items processed by a task stage", ["task", "stage"])
+PAYLOAD_BYTES = Histogram(
+    "oracle_payload_bytes",
+    "Size of downloaded objects and serialized request bodies",
+    ["task", "kind"],
+    buckets=_BYTES_BUCKETS,
+)
+CORE_REQUEST_SECONDS = Histogram(
+    "oracle_core_request_seconds",
+    "core-service request latency by response status",
+    ["task", "method", "status"],
+    buckets=_SECONDS_BUCKETS,
+)
+CORE_LIMIT = Gauge(
+    "oracle_core_limit",
+    "Adaptive limit on concurrent core-service requests",
+    multiprocess_mode="livesum",
+)
+CORE_WAIT_SECONDS = Histogram(
+    "oracle_core_wait_seconds",
+    "Time a core-service request waited for the rate limit and a free slot",
+    ["task"],
+    buckets=_SECONDS_BUCKETS,
+)
+CORE_RETRIES = Counter("oracle_core_retries", "Retried core-service overload responses", ["task", "status"])
+TASK_SECONDS = Histogram(
+    "oracle_task_seconds",
+    "Wall time of a task run by final state",
+    ["task", "state"],
+    buckets=_SECONDS_BUCKETS,
+)
+TRACE_SPANS_DROPPED = Counter(
+    "oracle_trace_spans_dropped",
+    "Spans dropped because the trace buffer or export queue was full, or the exit flush timed out",
+    ["reason"],
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "oracle_queue_wait_seconds",
+    "Time from core-service publish to task start",
+    ["task"],
+    buckets=_SECONDS_BUCKETS,
+)
+
+
+def observe_stage(task: str, stage: str, seconds: float, items: int = 0) -> None:
+    STAGE_SECONDS.labels(task, stage).observe(seconds)
+    if items:
+        STAGE_ITEMS.labels(task, stage).inc(items)
+
+
+@contextmanager
+def stage(task: str, name: str) -> Iterator[None]:
+    """Time a block as `name` (recorded even if it raises)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(task, name).observe(time.perf_counter() - t0)
+
+
+def observe_bytes(task: str, kind: str, size: int) -> None:
+    PAYLOAD_BYTES.labels(task, kind).observe(size)
+
+
+def timed_request(task: str, method: str, send: Callable[[], T]) -> T:
+    """Run one core-service request and record its latency under the response status."""
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        resp = send()
+        status = str(getattr(resp, "status_code", "error"))
+        return resp
+    finally:
+        CORE_REQUEST_SECONDS.labels(task, method, status).observe(time.perf_counter() - t0)
+
+
+async def timed_request_async(task: str, method: str, send: Callable[[], Awaitable[T]]) -> T:
+    """`timed_request` for an awaitable request (workers/reindex_async.py)."""
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        resp = await send()
+        status = str(getattr(resp, "status_code", "error"))
+        return resp
+    finally:
+        CORE_REQUEST_SECONDS.labels(task, method, status).observe(time.perf_counter() - t0)
+
+
+def registry() -> CollectorRegistry:
+    """Registry to export: aggregated over all processes in multiprocess mode."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    reg = CollectorRegistry()
+    multiprocess.MultiProcessCollector(reg)
+    return reg
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Drop an exited process's live gauges (e.g. oracle_core_limit) from the multiprocess sum."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(os.getpid() if pid is None else pid)
+
+
+def render(reg: Optional[CollectorRegistry] = None) -> Tuple[bytes, str]:
+    """Text exposition body and its content type."""
+    return generate_latest(reg or registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+"""Opt-in profiling of individual Celery task runs.
+
+A run is profiled when its payload carries `"profile": true`, or at random
+with probability PROFILE_SAMPLE_RATE for the tasks listed in PROFILE_TASKS
+(empty = all). celery_app starts a `TaskProfile` in `task_prerun` and finishes
+it in `task_postrun`. With both switches off, `maybe_start` performs just a
+payload lookup and a float comparison.
+
+PROFILE_MODE selects the collector:
+
+    sample    a daemon thread reads the task thread's stack every
+              PROFILE_INTERVAL_MS (sys._current_frames) -> <task_id>.collapsed
+    cprofile  deterministic cProfile (several times slower) -> <task_id>.pstats,
+              plus the stack sampler for <task_id>.collapsed
+
+`<task_id>.json` holds wall time, sample count and, with PROFILE_TRACEMALLOC,
+the tracemalloc peak. The files go to PROFILE_DIR, or to
+s3://S3_BUCKET/PROFILE_S3_PREFIX/ when a prefix is set. The collapsed files
+are in Brendan Gregg's folded format (`flamegraph.pl`, speedscope).
+"""
+
+import cProfile
+import json
+import logging
+import marshal
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+
+
+class StackSampler:
+    """Counts one thread's call stacks at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class TaskProfile:
+    def __init__(
+        self,
+        task_name: str,
+        task_id: str,
+        mode: str = "sample",
+        interval: float = 0.005,
+        trace_memory: bool = True,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode {mode!r}; expected one of {MODES}")
+        self.task_name = task_name
+        # Used in file names and S3 keys
+        self.task_id = re.sub(r"[^A-Za-z0-9_.-]", "_", task_id)
+        self.mode = mode
+        self.trace_memory = trace_memory
+        self._sampler = StackSampler(threading.get_ident(), interval)
+        self._profiler: Optional[cProfile.Profile] = None
+        self._owns_tracemalloc = False
+        self._t0 = 0.0
+        self.meta: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            tracemalloc.reset_peak()
+        self._sampler.start()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._t0 = time.perf_counter()
+
+    def stop(self, state: Optional[str] = None) -> Dict[str, Any]:
+        wall = time.perf_counter() - self._t0
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._sampler.stop()
+        peak: Optional[int] = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        self.meta = {
+            "task": self.task_name,
+            "taskId": self.task_id,
+            "state": state,
+            "mode": self.mode,
+            "wallSeconds": round(wall, 6),
+            "samples": self._sampler.samples,
+            "intervalMs": self._sampler.interval * 1000.0,
+            "tracemallocPeakBytes": peak,
+        }
+        return self.meta
+
+    def files(self) -> Dict[str, bytes]:
+        """Profile outputs by file name (after `stop`)."""
+        out = {
+            f"{self.task_id}.collapsed": self._sampler.collapsed().encode("utf-8"),
+            f"{self.task_id}.json": json.dumps(self.meta, indent=2).encode("utf-8"),
+        }
+        if self._profiler is not None:
+            # Same bytes as Profile.dump_stats; load with pstats.Stats(path)
+            self._profiler.create_stats()
+            out[f"{self.task_id}.pstats"] = marshal.dumps(self._profiler.stats)  # type: ignore[attr-defined]
+        return out
+
+
+def maybe_start(task_name: str, task_id: str, payload: Any) -> Optional[TaskProfile]:
+    """Start profiling this run if it is flagged or sampled; None otherwise."""
+    settings = get_settings()
+    flagged = isinstance(payload, dict) and payload.get("profile") is True
+    if not flagged:
+        if settings.PROFILE_SAMPLE_RATE <= 0.0:
+            return None
+        tasks = {t.strip() for t in settings.PROFILE_TASKS.split(",") if t.strip()}
+        if tasks and task_name not in tasks:
+            return None
+        if random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return None
+    try:
+        profile = TaskProfile(
+            task_name,
+            task_id,
+            mode=settings.PROFILE_MODE,
+            interval=max(0.001, settings.PROFILE_INTERVAL_MS / 1000.0),
+            trace_memory=settings.PROFILE_TRACEMALLOC,
+        )
+        profile.start()
+    except Exception:
+        logger.exception("[Profile] Failed to start profiler for task %s", task_id)
+        return None
+    logger.info("[Profile] Profiling %s taskId=%s mode=%s", task_name, task_id, profile.mode)
+    return profile
+
+
+def finish(profile: TaskProfile, state: Optional[str] = None) -> List[str]:
+    """Stop `profile` and store its files; returns their paths or s3:// URIs (best-effort)."""
+    settings = get_settings()
+    try:
+        meta = profile.stop(state)
+        files = profile.files()
+        written: List[str] = []
+        if settings.PROFILE_S3_PREFIX:
+            from utils.s3 import _get_s3_client
+
+            bucket = settings.S3_BUCKET or ""
+            prefix = settings.PROFILE_S3_PREFIX.strip("/")
+            s3 = _get_s3_client()
+            for name, data in files.items():
+                s3.put_object(Bucket=bucket, Key=f"{prefix}/{name}", Body=data)
+                written.append(f"s3://{bucket}/{prefix}/{name}")
+        else:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            for name, data in files.items():
+                path = os.path.join(settings.PROFILE_DIR, name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                written.append(path)
+    except Exception:
+        logger.exception("[Profile] Failed to write profile for task %s", profile.task_id)
+        return []
+    logger.info(
+        "[Profile] %s taskId=%s wall=%.3fs samples=%s peak=%s -> %s",
+        profile.task_name,
+        profile.task_id,
+        meta["wallSeconds"],
+        meta["samples"],
+        meta["tracemallocPeakBytes"],
+        written[0].rsplit(".", 1)[0] + ".*" if written else "-",
+    )
+    return written
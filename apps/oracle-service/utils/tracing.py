@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+"""Trace context propagation and spans for oracle jobs.
+
+A job's context is a W3C `traceparent` (trace id + parent span id) plus the
+time core-service published it (epoch ms). It travels as:
+
+    core-service -> raw queue     AMQP headers `traceparent`, `x-published-at`
+    bridge -> Celery task         message headers `traceparent`,
+                                  `oracle_published_at`, `oracle_sent_at`
+    task -> core-service          HTTP headers `traceparent`, `X-Trace-Id`
+
+Spans per job:
+
+    bridge.forward      raw message received -> forwarded to Celery; carries
+                        rawQueueWaitMs (publish -> receive)
+    <task name>         task_prerun -> task_postrun; carries laneWaitMs
+                        (forward -> start), queueWaitMs (publish -> start) and
+                        serviceMs
+    s3.download, core.GET/PUT   children of the task span
+
+queueWaitMs against serviceMs shows whether a job waited on the broker or on
+CPU. Publish times come from core-service's clock, so host clock skew shows up
+in the wait figures.
+
+TRACE_EXPORTER selects the sink: `none` (context still propagates, spans are
+dropped), `jsonl` (one span per line appended to TRACE_JSONL_PATH) or `otlp`
+(OTLP/HTTP JSON POST to TRACE_OTLP_ENDPOINT, e.g. a local collector on :4318).
+Spans are buffered and flushed after each task and each bridged message; a
+background thread exports them, and whatever is still queued at interpreter
+exit is exported then, for up to TRACE_EXIT_TIMEOUT seconds. The buffer
+(TRACE_MAX_BUFFERED_SPANS) and the export queue (TRACE_MAX_QUEUED_BATCHES) are
+bounded, so a slow or unreachable collector drops spans instead of growing the
+worker; drops are counted in oracle_trace_spans_dropped_total.
+"""
+
+import json
+import logging
+import atexit
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+EXPORTERS = ("none", "jsonl", "otlp")
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass(frozen=True)
+class TraceContext:
+    trace_id: str
+    span_id: str
+    published_at_ms: Optional[int] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+@dataclass
+class Span:
+    name: str
+    context: TraceContext
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_CURRENT: ContextVar[Optional[TraceContext]] = ContextVar("oracle_trace", default=None)
+_BUFFER: List[Span] = []
+_BUFFER_LOCK = threading.Lock()
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def parse_traceparent(value: Any) -> Optional[TraceContext]:
+    if not isinstance(value, str):
+        return None
+    m = _TRACEPARENT_RE.match(value.strip().lower())
+    return TraceContext(m.group(1), m.group(2)) if m else None
+
+
+def _to_ms(value: Any) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def new_context(published_at_ms: Optional[int] = None) -> TraceContext:
+    return TraceContext(_new_id(16), _new_id(8), published_at_ms)
+
+
+def from_amqp(headers: Optional[Mapping[str, Any]], properties: Optional[Mapping[str, Any]] = None) -> TraceContext:
+    """Context of a raw core-service message (a new trace if it carries none)."""
+    headers = headers or {}
+    published = _to_ms(headers.get("x-published-at"))
+    if published is None and properties and properties.get("timestamp") is not None:
+        # AMQP timestamp property: whole seconds
+        published = _to_ms(properties["timestamp"])
+        published = published * 1000 if published is not None else None
+    ctx = parse_traceparent(headers.get("traceparent"))
+    if ctx is None:
+        return new_context(published)
+    return TraceContext(ctx.trace_id, ctx.span_id, published)
+
+
+def from_celery_request(request: Any) -> TraceContext:
+    """Context carried in a Celery task's message headers (a new trace if none)."""
+    published = _to_ms(getattr(request, "oracle_published_at", None))
+    ctx = parse_traceparent(getattr(request, "traceparent", None))
+    if ctx is None:
+        return new_context(published)
+    return TraceContext(ctx.trace_id, ctx.span_id, published)
+
+
+def current() -> Optional[TraceContext]:
+    return _CURRENT.get()
+
+
+def activate(ctx: Optional[TraceContext]) -> Token:
+    return _CURRENT.set(ctx)
+
+
+def deactivate(token: Token) -> None:
+    _CURRENT.reset(token)
+
+
+def start_span(name: str, parent: Optional[TraceContext], **attributes: Any) -> Span:
+    """Open a span under `parent` (or as a trace root); finish it with `end_span`."""
+    if parent is None:
+        ctx, parent_id = new_context(), None
+    else:
+        ctx = TraceContext(parent.trace_id, _new_id(8), parent.published_at_ms)
+        parent_id = parent.span_id
+    return Span(name, ctx, parent_id, time.time_ns(), attributes=dict(attributes))
+
+
+def end_span(span: Span, error: Optional[str] = None, **attributes: Any) -> Span:
+    span.end_ns = time.time_ns()
+    span.attributes.update(attributes)
+    if error is not None:
+        span.error = error
+    settings = get_settings()
+    if settings.TRACE_EXPORTER != "none":
+        with _BUFFER_LOCK:
+            full = len(_BUFFER) >= settings.TRACE_MAX_BUFFERED_SPANS
+            if not full:
+                _BUFFER.append(span)
+        if full:
+            _dropped("buffer", 1)
+    return span
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the active context; a no-op outside a traced job."""
+    parent = _CURRENT.get()
+    if parent is None:
+        yield None
+        return
+    s = start_span(name, parent, **attributes)
+    token = _CURRENT.set(s.context)
+    error: Optional[str] = None
+    try:
+        yield s
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _CURRENT.reset(token)
+        end_span(s, error)
+
+
+def http_headers() -> Dict[str, str]:
+    """Headers that carry the active context to core-service."""
+    ctx = _CURRENT.get()
+    if ctx is None:
+        return {}
+    return {"traceparent": ctx.traceparent, "X-Trace-Id": ctx.trace_id}
+
+
+def celery_headers(ctx: Optional[TraceContext] = None) -> Dict[str, Any]:
+    """Message headers for `send_task`, from `ctx` or the active context.
+
+    An explicit `ctx` is a bridged core-service message and keeps its publish
+    time. Without one, a running task is enqueueing a follow-up: that job was
+    published now, so its queue wait does not include the parent's.
+    """
+    now_ms = int(time.time() * 1000)
+    published: Optional[int] = now_ms
+    if ctx is not None:
+        published = ctx.published_at_ms
+    else:
+        ctx = _CURRENT.get()
+        if ctx is None:
+            return {}
+    return {
+        "traceparent": ctx.traceparent,
+        "oracle_published_at": published,
+        "oracle_sent_at": now_ms,
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for `spans`."""
+    out = []
+    for s in spans:
+        item: Dict[str, Any] = {
+            "traceId": s.context.trace_id,
+            "spanId": s.context.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items() if v is not None
+            ],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        out.append(item)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]
+                },
+                "scopeSpans": [{"scope": {"name": "oracle.tracing"}, "spans": out}],
+            }
+        ]
+    }
+
+
+def _dropped(reason: str, count: int) -> None:
+    from utils import metrics
+
+    metrics.TRACE_SPANS_DROPPED.labels(reason).inc(count)
+
+
+class _Exporter:
+    """Background thread that exports flushed batches, so callers never wait on the sink."""
+
+    def __init__(self) -> None:
+        self.queue: "queue.Queue[Tuple[List[Span], Settings]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans: List[Span], settings: Settings) -> bool:
+        """Queue a batch for export; False (batch dropped) when TRACE_MAX_QUEUED_BATCHES are waiting."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+            # Only submit puts, under this lock, so the size check cannot race
+            if self.queue.qsize() >= settings.TRACE_MAX_QUEUED_BATCHES:
+                return False
+            self.queue.put_nowait((spans, settings))
+        return True
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued batches are exported; False if `timeout` passed first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def pending(self) -> int:
+        """Spans in batches not yet taken by the exporter thread."""
+        with self.queue.mutex:
+            return sum(len(spans) for spans, _ in self.queue.queue)
+
+    def _run(self) -> None:
+        while True:
+            spans, settings = self.queue.get()
+            try:
+                _export(spans, settings)
+            finally:
+                self.queue.task_done()
+
+
+_EXPORTER = _Exporter()
+
+
+def _reset_exporter() -> None:
+    # A forked child (prefork pool) has no exporter thread; start its own on demand
+    global _EXPORTER
+    _EXPORTER = _Exporter()
+
+
+os.register_at_fork(after_in_child=_reset_exporter)
+
+
+def flush(wait: bool = False, timeout: Optional[float] = None) -> int:
+    """Hand buffered spans to the exporter thread; returns how many.
+
+    The bridge flushes on its consumer thread and tasks flush after every run,
+    so neither blocks on a slow collector. A batch that finds the export queue
+    full is dropped. `wait=True` exports in the caller after earlier batches
+    are done and returns how many were exported (tests, shutdown); with a
+    `timeout` it gives up at that deadline and drops what is left.
+    """
+    with _BUFFER_LOCK:
+        spans = list(_BUFFER)
+        _BUFFER.clear()
+    settings = get_settings()
+    if wait:
+        started = time.monotonic()
+        if not _EXPORTER.join(timeout):
+            lost = _EXPORTER.pending() + len(spans)
+            logger.warning("[Trace] Exporter still busy after %.1fs; dropping %s spans", timeout, lost)
+            _dropped("exit", lost)
+            return 0
+        if not spans:
+            return 0
+        if timeout is None:
+            return _export(spans, settings)
+        return _export(spans, settings, max(0.1, min(2.0, timeout - (time.monotonic() - started))))
+    # Sink settings as of the flush, not of the export
+    if spans and not _EXPORTER.submit(spans, settings):
+        _dropped("queue", len(spans))
+        return 0
+    return len(spans)
+
+
+def _flush_at_exit() -> None:
+    flush(wait=True, timeout=get_settings().TRACE_EXIT_TIMEOUT)
+
+
+def _export(spans: List[Span], settings: Settings, timeout: float = 2.0) -> int:
+    """Write `spans` to the configured sink (best-effort); returns how many were exported."""
+    try:
+        if settings.TRACE_EXPORTER == "jsonl":
+            with open(settings.TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s.to_dict()) + "\n" for s in spans))
+        elif settings.TRACE_EXPORTER == "otlp":
+            import requests
+
+            requests.post(
+                settings.TRACE_OTLP_ENDPOINT,
+                json=otlp_payload(spans, settings.TRACE_SERVICE_NAME),
+                timeout=timeout,
+            ).raise_for_status()
+    except Exception:
+        logger.warning("[Trace] Failed to export %s spans", len(spans), exc_info=True)
+        return 0
+    return len(spans)
+
+
+atexit.register(_flush_at_exit)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import time
 from typing import Any
 
 import requests
@@ -14,12 +15,15 @@ from celery import shared_task
 from celery.exceptions import Ignore
 
 from config import get_settings
+from utils import codec, metrics, tracing
 from utils.nlp import top_keywords
 from utils.pdf import extract_text
 from utils.s3 import download_to_bytes
 
 logger = logging.getLogger(__name__)
 
+TASK = "oracle.process_document"
+
 
 def _validate_payload(payload: dict[str, Any]) -> tuple[str, str, str]:
     required = ("documentId", "s3Key", "userId")
@@ -64,7 +68,8 @@ def process_document(self, payload: dict[str, Any]) -> dict[str, Any]:
 
     # 1) Download from S3
     try:
-        pdf_bytes = download_to_bytes(bucket, s3_key)
+        with metrics.stage(TASK, "download"), tracing.span("s3.download", s3Key=s3_key):
+            pdf_bytes = download_to_bytes(bucket, s3_key)
     except ClientError as e:
         code = (
             getattr(e, "response", {}).get("Error", {}).get("Code")
@@ -90,16 +95,21 @@ def process_document(self, payload: dict[str, Any]) -> dict[str, Any]:
         )
         raise Ignore() from None
 
+    metrics.observe_bytes(TASK, "s3_object", len(pdf_bytes))
+
     # 2) Extract text
     try:
+        t0 = time.perf_counter()
         text, page_count = extract_text(pdf_bytes)
+        metrics.observe_stage(TASK, "extract", time.perf_counter() - t0, items=page_count)
     except Exception:
         logger.exception("Failed to extract text for documentId=%s; dropping", document_id)
         raise Ignore() from None
 
     # 3) TF-IDF top keywords
     try:
-        keywords: list[tuple[str, float]] = top_keywords(text, top_k=20)
+        with metrics.stage(TASK, "tfidf"):
+            keywords: list[tuple[str, float]] = top_keywords(text, top_k=20)
     except Exception:
         logger.exception("TF-IDF failed for documentId=%s; dropping", document_id)
         raise Ignore() from None
@@ -116,16 +126,24 @@ def process_document(self, payload: dict[str, Any]) -> dict[str, Any]:
         "Content-Type": "application/json",
     }
 
-    try:
-        resp = requests.put(
-            url,
-            json={
-                "engineVersion": settings.ENGINE_VERSION,
-                "resultPayload": result_payload,
-            },
-            headers=headers,
-            timeout=settings.http_timeouts,
+    with metrics.stage(TASK, "serialize"):
+        body = codec.dumps(
+            {"engineVersion": settings.ENGINE_VERSION, "resultPayload": result_payload}
         )
+    metrics.observe_bytes(TASK, "request_body", len(body))
+
+    try:
+        with tracing.span("core.PUT", path=url, bodyBytes=len(body)):
+            resp = metrics.timed_request(
+                TASK,
+                "PUT",
+                lambda: requests.put(
+                    url,
+                    data=body,
+                    headers={**headers, **tracing.http_headers()},
+                    timeout=settings.http_timeouts,
+                ),
+            )
     except requests.exceptions.RequestException:
         logger.exception(
             "HTTP request to core-service failed for documentId=%s; will retry", document_id
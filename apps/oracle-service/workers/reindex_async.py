@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+"""Overlapped I/O for `oracle.v2_reindex_subject` (REINDEX_IO_MODE=async).
+
+The sync loop waits on each S3 download and each chunk PUT in turn, so the
+prefork child is idle for every round trip. Here one event loop per task run
+keeps up to REINDEX_IO_CONCURRENCY of them in flight:
+
+    downloads   boto3 calls on a thread pool, prefetched up to
+                REINDEX_IO_CONCURRENCY documents ahead of the embedder
+    embedding   one thread, documents in listing order, because the
+                near-duplicate index depends on order. ENGINE_POOL=process
+                moves the embedding batches themselves onto a process pool.
+    PUTs        httpx.AsyncClient with a pooled keep-alive connection per
+                in-flight request (HTTP/2 with CORE_HTTP2 when h2 is installed).
+                A batch with near-duplicates is sent only after the PUTs that
+                store their canonical chunks have returned, as in the sync loop.
+
+At most REINDEX_IO_CONCURRENCY documents wait on their PUTs, and at most that
+many request bodies are serialized at once, so memory stays bounded. The
+adaptive limit in utils/limiter.py applies on top: when core-service slows
+down, fewer than REINDEX_IO_CONCURRENCY PUTs are actually sent at once. Status
+handling, retries, metrics, spans and the task result are the same as in the
+sync loop, since both use the helpers in workers/v2_reindex_worker.py. Only the
+order of the per-document logs and aggregate enqueues can differ.
+"""
+
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from app.core.chunk_batch import ChunkBatch
+from config import get_settings
+from utils import limiter, metrics, tracing
+
+if TYPE_CHECKING:
+    from workers.v2_reindex_worker import _Run
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _AsyncHttp:
+    def __init__(self, task: str, base_url: str, api_key: str, timeouts: Tuple[float, float], connections: int):
+        settings = get_settings()
+        http2 = settings.CORE_HTTP2 and _http2_available()
+        if settings.CORE_HTTP2 and not http2:
+            logger.warning("[V2] CORE_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        self.task = task
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"X-Internal-API-Key": api_key, "Content-Type": "application/json"},
+            timeout=httpx.Timeout(timeouts[1], connect=timeouts[0]),
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            http2=http2,
+        )
+
+    async def __aenter__(self) -> "_AsyncHttp":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.client.aclose()
+
+    @retry(
+        retry=retry_if_exception_type((httpx.ConnectError, httpx.TimeoutException)),
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=1, max=30),
+        reraise=True,
+    )
+    async def put(self, path: str, body: bytes) -> httpx.Response:
+        metrics.observe_bytes(self.task, "request_body", len(body))
+        with tracing.span("core.PUT", path=path, bodyBytes=len(body)):
+            return await limiter.gate().call_async(
+                self.task,
+                limiter.route_of("PUT", path),
+                lambda: metrics.timed_request_async(
+                    self.task,
+                    "PUT",
+                    lambda: self.client.put(path, content=body, headers=tracing.http_headers()),
+                ),
+            )
+
+
+async def reindex_documents(run: "_Run", docs: List[Dict[str, Any]]) -> None:
+    """Reindex `docs` into `run` with overlapped downloads, embedding and PUTs."""
+    from workers.v2_reindex_worker import TASK, _chunkify, _doc_ref, _download_pdf, _reindex_payload
+
+    settings = get_settings()
+    width = max(1, settings.REINDEX_IO_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    io_pool = ThreadPoolExecutor(width, thread_name_prefix="reindex-io")
+    cpu_pool = ThreadPoolExecutor(1, thread_name_prefix="reindex-embed")
+    in_flight = asyncio.Semaphore(width)
+    path = f"/internal/reindex/{run.subject_id}/chunks"
+
+    def off_loop(pool: ThreadPoolExecutor, fn: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        # run_in_executor does not carry contextvars; spans need the task's trace context
+        return loop.run_in_executor(pool, contextvars.copy_context().run, fn, *args)
+
+    def serialize(doc_id: str, model: str, dim: int, batch: ChunkBatch) -> bytes:
+        with metrics.stage(TASK, "serialize"):
+            return _reindex_payload(doc_id, model, dim, batch)
+
+    refs = [(i, ref) for i, ref in ((i, _doc_ref(d)) for i, d in enumerate(docs)) if ref is not None]
+    downloads: Dict[int, "asyncio.Future[Optional[bytes]]"] = {}
+    uploads: List["asyncio.Task[None]"] = []
+    # Set once every PUT of a document has returned; duplicates wait on their canonical's
+    uploaded: Dict[str, asyncio.Event] = {}
+
+    async def put_batch(http: _AsyncHttp, doc_id: str, model: str, dim: int, batch: ChunkBatch) -> Any:
+        async with in_flight:
+            body = await off_loop(io_pool, serialize, doc_id, model, dim, batch)
+            try:
+                return await http.put(path, body)
+            except Exception:
+                logger.exception("[V2] Network error PUT chunks for documentId=%s", doc_id)
+                raise
+
+    async def put_after_canonicals(
+        http: _AsyncHttp,
+        doc_id: str,
+        model: str,
+        dim: int,
+        batch: ChunkBatch,
+        earlier: List[Tuple[ChunkBatch, "asyncio.Future[Any]"]],
+    ) -> Any:
+        # core-service links a duplicate only to a chunk it already holds: wait for the
+        # documents it points at, and for earlier batches of this one that hold its canonicals
+        targets = [dup for dup in batch.duplicates if dup is not None]
+        waits: List[Any] = [uploaded[d].wait() for d in {d for d, _ in targets} - {doc_id} if d in uploaded]
+        own = {index for d, index in targets if d == doc_id}
+        waits += [put for b, put in earlier if own.intersection(b.indices.tolist())]
+        if waits:
+            await asyncio.gather(*waits)
+        return await put_batch(http, doc_id, model, dim, batch)
+
+    async def upload(http: _AsyncHttp, position: int, doc_id: str, model: str, dim: int, chunks: ChunkBatch) -> None:
+        batches = _chunkify(chunks, settings.REINDEX_BATCH_SIZE)
+        puts: List[Tuple[ChunkBatch, "asyncio.Future[Any]"]] = []
+        for b in batches:
+            puts.append((b, asyncio.ensure_future(put_after_canonicals(http, doc_id, model, dim, b, list(puts)))))
+        responses = await asyncio.gather(*(put for _, put in puts))
+        for resp, batch in zip(responses, batches):
+            unlinked = run.count_put(resp, doc_id, len(batch))
+            if unlinked:
+                promoted = await off_loop(cpu_pool, run.promote, doc_id, batch, unlinked)
+                if promoted is not None:
+                    run.count_put(await put_batch(http, doc_id, model, dim, promoted), doc_id, 0)
+        uploaded[doc_id].set()
+        run.finish_document(position, doc_id, model, dim, chunks)
+
+    try:
+        async with _AsyncHttp(
+            TASK, settings.CORE_SERVICE_URL, settings.INTERNAL_API_KEY, settings.http_timeouts, width
+        ) as http:
+            started = 0
+            for k, (position, (doc_id, _key)) in enumerate(refs):
+                while started < min(k + 1 + width, len(refs)):
+                    downloads[started] = off_loop(io_pool, _download_pdf, refs[started][1][1])
+                    started += 1
+                pdf_bytes = await downloads.pop(k)
+                if pdf_bytes is None:
+                    continue
+                embedded = await off_loop(cpu_pool, run.embed, doc_id, pdf_bytes)
+                del pdf_bytes
+                if embedded is None:
+                    continue
+                model, dim, chunks = embedded
+                uploaded[doc_id] = asyncio.Event()
+                uploads.append(asyncio.create_task(upload(http, position, doc_id, model, dim, chunks)))
+                # Bound documents held for upload; surface a failed upload before embedding more
+                if sum(not t.done() for t in uploads) >= width:
+                    await asyncio.wait([t for t in uploads if not t.done()], return_when=asyncio.FIRST_COMPLETED)
+                for t in [t for t in uploads if t.done()]:
+                    t.result()
+                    uploads.remove(t)
+            await asyncio.gather(*uploads)
+    finally:
+        for fut in [*uploads, *downloads.values()]:
+            fut.cancel()
+        await asyncio.gather(*uploads, return_exceptions=True)
+        io_pool.shutdown(wait=True, cancel_futures=True)
+        cpu_pool.shutdown(wait=True)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 import logging
 from typing import Any, Dict, List
 
@@ -12,9 +11,12 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 
 from app.core.topics import compute_subject_topics
 from config import get_settings
+from utils import codec, limiter, metrics, tracing
 
 logger = logging.getLogger(__name__)
 
+TASK = "oracle.aggregate_subject_topics"
+
 
 def _is_transient_http(resp: Response) -> bool:
     return 500 <= resp.status_code < 600
@@ -34,7 +36,18 @@ class _Http:
     )
     def get(self, path: str) -> Response:
         url = f"{self.base_url}{path}"
-        return requests.get(url, headers=self.headers, timeout=self.timeouts)
+        with tracing.span("core.GET", path=path):
+            return limiter.gate().call(
+                TASK,
+                limiter.route_of("GET", path),
+                lambda: metrics.timed_request(
+                    TASK,
+                    "GET",
+                    lambda: requests.get(
+                        url, headers={**self.headers, **tracing.http_headers()}, timeout=self.timeouts
+                    ),
+                ),
+            )
 
     @retry(
         retry=retry_if_exception_type((ReqConnectionError, ReqTimeout)),
@@ -44,7 +57,24 @@ class _Http:
     )
     def put(self, path: str, json_body: Dict[str, Any]) -> Response:
         url = f"{self.base_url}{path}"
-        return requests.put(url, headers=self.headers, data=json.dumps(json_body), timeout=self.timeouts)
+        with metrics.stage(TASK, "serialize"):
+            body = codec.dumps(json_body)
+        metrics.observe_bytes(TASK, "request_body", len(body))
+        with tracing.span("core.PUT", path=path, bodyBytes=len(body)):
+            return limiter.gate().call(
+                TASK,
+                limiter.route_of("PUT", path),
+                lambda: metrics.timed_request(
+                    TASK,
+                    "PUT",
+                    lambda: requests.put(
+                        url,
+                        headers={**self.headers, **tracing.http_headers()},
+                        data=body,
+                        timeout=self.timeouts,
+                    ),
+                ),
+            )
 
 
 @shared_task(name="oracle.aggregate_subject_topics")
@@ -75,7 +105,8 @@ def aggregate_subject_topics(payload: dict[str, Any] | None = None) -> dict[str,
         raise RuntimeError("Core-service transient error")
     resp.raise_for_status()
 
-    chunks: List[Dict[str, Any]] = resp.json() or []
+    with metrics.stage(TASK, "parse"):
+        chunks: List[Dict[str, Any]] = codec.loads(resp.content) or []
     if not chunks:
         logger.info("[Topics] No chunks for subjectId=%s; clearing topics", subject_id)
         topics: List[Dict[str, Any]] = []
@@ -86,7 +117,11 @@ def aggregate_subject_topics(payload: dict[str, Any] | None = None) -> dict[str,
             for c in chunks
             if isinstance(c.get("text"), str) and c.get("text").strip()
         ]
-        topics = compute_subject_topics(records)
+        timings: Dict[str, float] = {}
+        topics = compute_subject_topics(records, timings=timings)
+        for name in ("tfidf", "kmeans"):
+            if name in timings:
+                metrics.observe_stage(TASK, name, timings[name], items=len(records))
 
     # 3) Upsert topics to core-service
     try:
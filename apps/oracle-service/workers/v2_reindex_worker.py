@@ -12,23 +12,32 @@ All external calls are retried on transient failures. Permanent data errors
 are logged and skipped without failing the whole job.
 """
 
-import json
+import asyncio
 import logging
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import requests
 from celery import shared_task
 from requests import Response
 from requests.exceptions import ConnectionError as ReqConnectionError, Timeout as ReqTimeout
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
-from app.core.conceptual_engine import ConceptualEngine
-from app.core.topics import compute_subject_topics
+from app.core.ann import IVFIndex, snapshot_lock, snapshot_path
+from app.core.chunk_batch import ChunkBatch
+from app.core.conceptual_engine import get_engine
+from app.core.reduction import SubjectProjection, fit_projection, remove_projection, save_projection
+from app.core.vector_snapshot import write_snapshot
 from config import get_settings
+from utils import codec, limiter, metrics, tracing
+from utils.dedup import NearDuplicateIndex
 from utils.s3 import download_to_bytes
 
 logger = logging.getLogger(__name__)
 
+TASK = "oracle.v2_reindex_subject"
+
 
 def _is_transient_http(resp: Response) -> bool:
     return 500 <= resp.status_code < 600
@@ -38,6 +47,86 @@ def _chunkify(items: List[Any], batch_size: int) -> List[List[Any]]:
     return [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
 
 
+def _reindex_payload(doc_id: str, model: str, dim: int, batch: ChunkBatch) -> bytes:
+    """Body of PUT /internal/reindex/{subjectId}/chunks for one batch.
+
+    Near-duplicates carry `duplicateOf: {documentId, index}` and no vector;
+    core-service links them to the earlier chunk.
+    """
+    return batch.payload_json(doc_id, model, dim)
+
+
+def _write_snapshots(
+    subject_id: str, docs: List[Tuple[str, List[str], np.ndarray]], dim: int, model: str
+) -> Optional[Dict[str, Any]]:
+    """Best-effort: publish the subject's vectors for in-process readers.
+
+    VECTOR_SNAPSHOT_DIR gets the mmap-shared matrix (app/core/vector_snapshot.py)
+    and, with PCA_TARGET_DIM, the subject's PCA projection (app/core/reduction.py);
+    ANN_SNAPSHOT_DIR the trained IVF index used by embed_server's /search, in the
+    reduced space when a projection was fitted. Returns the projection summary.
+    """
+    settings = get_settings()
+    projection: Optional[SubjectProjection] = None
+    if settings.VECTOR_SNAPSHOT_DIR:
+        try:
+            write_snapshot(
+                settings.VECTOR_SNAPSHOT_DIR,
+                subject_id,
+                docs,
+                engine_version=settings.ENGINE_VERSION,
+                dim=dim,
+                model=model,
+            )
+            logger.info("[V2] Wrote vector snapshot subjectId=%s docs=%s", subject_id, len(docs))
+        except Exception:
+            logger.exception("[V2] Failed to write vector snapshot for subjectId=%s", subject_id)
+
+        if settings.PCA_TARGET_DIM > 0:
+            try:
+                projection = fit_projection(
+                    np.vstack([mat for _d, _ids, mat in docs]) if docs else np.zeros((0, dim)),
+                    settings.PCA_TARGET_DIM,
+                    settings.ENGINE_VERSION,
+                    sample_size=settings.PCA_SAMPLE_SIZE,
+                )
+                if projection is None:
+                    # Too few chunks to fit; drop any projection from an earlier, larger reindex
+                    remove_projection(settings.VECTOR_SNAPSHOT_DIR, subject_id)
+                else:
+                    save_projection(settings.VECTOR_SNAPSHOT_DIR, subject_id, projection)
+                    logger.info(
+                        "[V2] PCA subjectId=%s dim=%s->%s explained_variance=%.4f samples=%s",
+                        subject_id,
+                        dim,
+                        projection.target_dim,
+                        projection.explained_variance,
+                        projection.n_samples,
+                    )
+            except Exception:
+                projection = None
+                logger.exception("[V2] Failed to fit PCA projection for subjectId=%s", subject_id)
+
+    if settings.ANN_SNAPSHOT_DIR:
+        try:
+            index = IVFIndex(
+                projection.target_dim if projection is not None else dim,
+                nlist=settings.ANN_NLIST,
+                nprobe=settings.ANN_NPROBE,
+                min_train=settings.ANN_MIN_TRAIN,
+            )
+            for _doc_id, ids, mat in docs:
+                index.add(ids, projection.transform(mat) if projection is not None else mat)
+            # Serialized with embed_server's PUT/DELETE /index rewrites of the same file
+            with snapshot_lock(settings.ANN_SNAPSHOT_DIR, subject_id):
+                index.save(snapshot_path(settings.ANN_SNAPSHOT_DIR, subject_id))
+            logger.info("[V2] Wrote ANN snapshot subjectId=%s vectors=%s", subject_id, len(index))
+        except Exception:
+            logger.exception("[V2] Failed to write ANN snapshot for subjectId=%s", subject_id)
+
+    return projection.summary() if projection is not None else None
+
+
 class _Http:
     def __init__(self, base_url: str, api_key: str, timeouts: tuple[float, float]):
         self.base_url = base_url.rstrip("/")
@@ -52,7 +141,18 @@ class _Http:
     )
     def get(self, path: str) -> Response:
         url = f"{self.base_url}{path}"
-        return requests.get(url, headers=self.headers, timeout=self.timeouts)
+        with tracing.span("core.GET", path=path):
+            return limiter.gate().call(
+                TASK,
+                limiter.route_of("GET", path),
+                lambda: metrics.timed_request(
+                    TASK,
+                    "GET",
+                    lambda: requests.get(
+                        url, headers={**self.headers, **tracing.http_headers()}, timeout=self.timeouts
+                    ),
+                ),
+            )
 
     @retry(
         retry=retry_if_exception_type((ReqConnectionError, ReqTimeout)),
@@ -60,9 +160,174 @@ class _Http:
         wait=wait_exponential(multiplier=1, min=1, max=30),
         reraise=True,
     )
-    def put(self, path: str, json_body: Dict[str, Any]) -> Response:
+    def put(self, path: str, body: bytes) -> Response:
+        """PUT a pre-serialized JSON body."""
         url = f"{self.base_url}{path}"
-        return requests.put(url, headers=self.headers, data=json.dumps(json_body), timeout=self.timeouts)
+        metrics.observe_bytes(TASK, "request_body", len(body))
+        with tracing.span("core.PUT", path=path, bodyBytes=len(body)):
+            return limiter.gate().call(
+                TASK,
+                limiter.route_of("PUT", path),
+                lambda: metrics.timed_request(
+                    TASK,
+                    "PUT",
+                    lambda: requests.put(
+                        url,
+                        headers={**self.headers, **tracing.http_headers()},
+                        data=body,
+                        timeout=self.timeouts,
+                    ),
+                ),
+            )
+
+
+def _doc_ref(d: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(documentId, s3Key) of a listing record; None (logged) if either is missing."""
+    doc_id = str(d.get("id") or "").strip()
+    s3_key = str(d.get("s3Key") or "").strip()
+    if not doc_id or not s3_key:
+        logger.warning("[V2] Skipping invalid doc record: %r", d)
+        return None
+    return doc_id, s3_key
+
+
+def _download_pdf(s3_key: str) -> Optional[bytes]:
+    """Object bytes; None for permanent S3 errors (skip the document), raises on transient ones."""
+    try:
+        with metrics.stage(TASK, "download"), tracing.span("s3.download", s3Key=s3_key):
+            pdf_bytes = download_to_bytes(get_settings().S3_BUCKET or "", s3_key)
+    except Exception as e:
+        # Classify known S3 errors by message (lightweight)
+        msg = str(e)
+        if any(tok in msg for tok in ("NoSuchKey", "NoSuchBucket", "AccessDenied")):
+            logger.warning("[V2] Permanent S3 error for key=%s: %s", s3_key, msg)
+            return None
+        logger.exception("[V2] S3 transient error for key=%s", s3_key)
+        raise
+    metrics.observe_bytes(TASK, "s3_object", len(pdf_bytes))
+    return pdf_bytes
+
+
+@dataclass
+class _Run:
+    """Per-task state shared by the sync loop and workers/reindex_async.py."""
+
+    app: Any
+    subject_id: str
+    total_docs: int
+    engine: Any
+    dedup: Optional[NearDuplicateIndex]
+    keep_vectors: bool
+    docs_ok: int = 0
+    batches_sent: int = 0
+    total_chunks: int = 0
+    promoted: int = 0
+    # Keyed by listing position so async completion order does not reorder the snapshot
+    snapshot_docs: Dict[int, Tuple[str, List[str], np.ndarray]] = field(default_factory=dict)
+    snapshot_dim: int = 0
+    snapshot_model: str = ""
+
+    def embed(self, doc_id: str, pdf_bytes: bytes) -> Optional[Tuple[str, int, ChunkBatch]]:
+        """(model, dim, chunks) for one document; None if the engine failed or found no text."""
+        settings = get_settings()
+        timings: Dict[str, float] = {}
+        try:
+            result = self.engine.chunk_and_embed(pdf_bytes, doc_id, dedup=self.dedup, timings=timings)
+        except Exception:
+            logger.exception("[V2] Engine failed for documentId=%s", doc_id)
+            return None
+        for name, count in (("extract", "pages"), ("chunk", "chunks"), ("embed", "embedded")):
+            if name in timings:
+                metrics.observe_stage(TASK, name, timings[name], items=int(timings.get(count, 0)))
+
+        model = result.get("model") or settings.ENGINE_MODEL_NAME
+        dim = int(result.get("dim") or settings.ENGINE_DIM)
+        chunks = ChunkBatch.coerce(result.get("chunks") or [], dim)
+        if not chunks:
+            logger.info("[V2] No chunks produced for documentId=%s; skipping", doc_id)
+            return None
+        return model, dim, chunks
+
+    def count_put(self, put_resp: Any, doc_id: str, n_chunks: int) -> List[int]:
+        """Apply the PUT status policy: count the batch, drop it (400/404) or raise.
+
+        Returns the indices core-service reported as `unlinkedDuplicates`:
+        duplicates whose canonical chunk it does not hold.
+        """
+        if put_resp.status_code in (400, 404):
+            logger.error(
+                "[V2] Permanent rejection from core-service (status=%s) for documentId=%s",
+                put_resp.status_code,
+                doc_id,
+            )
+            # Drop this batch and move on
+            return []
+        if put_resp.status_code == 401:
+            logger.error("[V2] Unauthorized PUT chunks; check INTERNAL_API_KEY")
+            raise RuntimeError("Unauthorized")
+        if _is_transient_http(put_resp):
+            logger.error("[V2] Core-service 5xx on PUT chunks; retry policy will re-raise")
+            raise RuntimeError("Core-service transient error")
+        put_resp.raise_for_status()
+
+        self.batches_sent += 1
+        self.total_chunks += n_chunks
+        try:
+            unlinked = (codec.loads(put_resp.content) or {}).get("unlinkedDuplicates") or []
+        except Exception:
+            return []
+        return [int(i) for i in unlinked]
+
+    def promote(self, doc_id: str, batch: ChunkBatch, unlinked: List[int]) -> Optional[ChunkBatch]:
+        """Embed the duplicates in `batch` that core-service could not link.
+
+        Their canonical chunk was dropped (a 400/404 batch) or has not been
+        stored, so they would otherwise end up with neither a vector nor a link.
+        """
+        if not unlinked:
+            return None
+        wanted = set(unlinked)
+        picks = [i for i, index in enumerate(batch.indices.tolist()) if batch.rows[i] < 0 and index in wanted]
+        if not picks:
+            return None
+        texts = [batch.texts[i] for i in picks]
+        vectors = self.engine.embed_texts(texts)
+        self.promoted += len(picks)
+        logger.warning("[V2] Embedding %s unlinked duplicate(s) for documentId=%s", len(picks), doc_id)
+        return ChunkBatch.build(
+            texts,
+            (int(batch.tokens[i]) for i in picks),
+            np.asarray(vectors, dtype=np.float32),
+            indices=(int(batch.indices[i]) for i in picks),
+        )
+
+    def finish_document(self, position: int, doc_id: str, model: str, dim: int, chunks: ChunkBatch) -> None:
+        if self.keep_vectors:
+            indices, vectors = chunks.embedded()
+            self.snapshot_docs[position] = (doc_id, [f"{doc_id}:{i}" for i in indices.tolist()], vectors)
+            self.snapshot_dim, self.snapshot_model = dim, model
+
+        self.docs_ok += 1
+        logger.info(
+            "[V2] Reindexed document %s/%s documentId=%s batches_sent=%s",
+            position + 1,
+            self.total_docs,
+            doc_id,
+            self.batches_sent,
+        )
+        # Trigger asynchronous subject-level topic aggregation after each document
+        try:
+            # Avoid import cycles by using send_task; task_routes picks the aggregate lane
+            self.app.send_task(
+                "oracle.aggregate_subject_topics",
+                args=[{"subjectId": self.subject_id}],
+                headers=tracing.celery_headers(),
+            )
+            logger.info("[V2] Enqueued aggregate_subject_topics for subjectId=%s", self.subject_id)
+        except Exception:
+            logger.exception(
+                "[V2] Failed to enqueue aggregate_subject_topics for subjectId=%s", self.subject_id
+            )
 
 
 @shared_task(name="oracle.v2_reindex_subject", bind=True)
@@ -74,7 +339,7 @@ def v2_reindex_subject(self, payload: dict[str, Any]) -> dict[str, Any]:
         return {"status": "error", "reason": "invalid payload"}
 
     http = _Http(settings.CORE_SERVICE_URL, settings.INTERNAL_API_KEY, settings.http_timeouts)
-    engine = ConceptualEngine(model_name=settings.ENGINE_MODEL_NAME, dim=settings.ENGINE_DIM)
+    engine = get_engine()
 
     logger.info("[V2] Reindex start subjectId=%s", subject_id)
 
@@ -96,116 +361,91 @@ def v2_reindex_subject(self, payload: dict[str, Any]) -> dict[str, Any]:
         raise RuntimeError("Core-service transient error")
     resp.raise_for_status()
 
-    docs: List[Dict[str, Any]] = resp.json() or []
-    total_docs = len(docs)
-    docs_ok = 0
-    batches_sent = 0
-    total_chunks = 0
+    docs: List[Dict[str, Any]] = codec.loads(resp.content) or []
+    keep_vectors = bool(settings.VECTOR_SNAPSHOT_DIR or settings.ANN_SNAPSHOT_DIR)
+    pca_summary: Optional[Dict[str, Any]] = None
+    dedup = (
+        NearDuplicateIndex(settings.REINDEX_DEDUP_MAX_DISTANCE, settings.REINDEX_DEDUP_MIN_TOKENS)
+        if settings.REINDEX_DEDUP_ENABLED
+        else None
+    )
+    run = _Run(
+        self.app,
+        subject_id,
+        len(docs),
+        engine,
+        dedup,
+        keep_vectors,
+        snapshot_dim=settings.ENGINE_DIM,
+        snapshot_model=settings.ENGINE_MODEL_NAME,
+    )
 
-    for i, d in enumerate(docs):
-        doc_id = str(d.get("id") or "").strip()
-        s3_key = str(d.get("s3Key") or "").strip()
-        if not doc_id or not s3_key:
-            logger.warning("[V2] Skipping invalid doc record: %r", d)
-            continue
+    if settings.REINDEX_IO_MODE == "async":
+        from workers.reindex_async import reindex_documents
 
-        try:
-            pdf_bytes = download_to_bytes(settings.S3_BUCKET or "", s3_key)
-        except Exception as e:
-            # Classify known S3 errors by message (lightweight)
-            msg = str(e)
-            if any(tok in msg for tok in ("NoSuchKey", "NoSuchBucket", "AccessDenied")):
-                logger.warning("[V2] Permanent S3 error for key=%s: %s", s3_key, msg)
+        asyncio.run(reindex_documents(run, docs))
+    else:
+        for i, d in enumerate(docs):
+            doc = _doc_ref(d)
+            if doc is None:
                 continue
-            logger.exception("[V2] S3 transient error for key=%s", s3_key)
-            raise
-
-        try:
-            result = engine.chunk_and_embed(pdf_bytes, doc_id)
-        except Exception:
-            logger.exception("[V2] Engine failed for documentId=%s", doc_id)
-            continue
-
-        chunks: List[Dict[str, Any]] = result.get("chunks") or []
-        model = result.get("model") or settings.ENGINE_MODEL_NAME
-        dim = int(result.get("dim") or settings.ENGINE_DIM)
-        if not chunks:
-            logger.info("[V2] No chunks produced for documentId=%s; skipping", doc_id)
-            continue
-
-        for batch in _chunkify(chunks, settings.REINDEX_BATCH_SIZE):
-            payload_json = {
-                "documentId": doc_id,
-                "model": model,
-                "dim": dim,
-                "chunks": [
-                    {
-                        "index": c.get("index"),
-                        "text": c.get("text"),
-                        "embedding": c.get("embedding"),
-                        "tokens": c.get("tokens"),
-                    }
-                    for c in batch
-                ],
-            }
-            try:
-                put_resp = http.put(f"/internal/reindex/{subject_id}/chunks", payload_json)
-            except Exception:
-                logger.exception("[V2] Network error PUT chunks for documentId=%s", doc_id)
-                raise
-
-            if put_resp.status_code in (400, 404):
-                logger.error(
-                    "[V2] Permanent rejection from core-service (status=%s) for documentId=%s",
-                    put_resp.status_code,
-                    doc_id,
-                )
-                # Drop this batch and move on
+            doc_id, s3_key = doc
+            pdf_bytes = _download_pdf(s3_key)
+            if pdf_bytes is None:
                 continue
-            if put_resp.status_code == 401:
-                logger.error("[V2] Unauthorized PUT chunks; check INTERNAL_API_KEY")
-                raise RuntimeError("Unauthorized")
-            if _is_transient_http(put_resp):
-                logger.error("[V2] Core-service 5xx on PUT chunks; retry policy will re-raise")
-                raise RuntimeError("Core-service transient error")
-            put_resp.raise_for_status()
-
-            batches_sent += 1
-            total_chunks += len(batch)
-
-        docs_ok += 1
-        logger.info(
-            "[V2] Reindexed document %s/%s documentId=%s batches_sent=%s",
-            i + 1,
-            total_docs,
-            doc_id,
-            batches_sent,
-        )
-        # Trigger asynchronous subject-level topic aggregation after each document
-        try:
-            # Avoid import cycles by using send_task
-            self.app.send_task(
-                "oracle.aggregate_subject_topics",
-                args=[{"subjectId": subject_id}],
-                queue="celery",
+            embedded = run.embed(doc_id, pdf_bytes)
+            if embedded is None:
+                continue
+            model, dim, chunks = embedded
+            for batch in _chunkify(chunks, settings.REINDEX_BATCH_SIZE):
+                with metrics.stage(TASK, "serialize"):
+                    body = _reindex_payload(doc_id, model, dim, batch)
+                try:
+                    put_resp = http.put(f"/internal/reindex/{subject_id}/chunks", body)
+                except Exception:
+                    logger.exception("[V2] Network error PUT chunks for documentId=%s", doc_id)
+                    raise
+                promoted = run.promote(doc_id, batch, run.count_put(put_resp, doc_id, len(batch)))
+                if promoted is not None:
+                    body = _reindex_payload(doc_id, model, dim, promoted)
+                    run.count_put(http.put(f"/internal/reindex/{subject_id}/chunks", body), doc_id, 0)
+            run.finish_document(i, doc_id, model, dim, chunks)
+
+    if keep_vectors:
+        with metrics.stage(TASK, "snapshot"):
+            pca_summary = _write_snapshots(
+                subject_id,
+                [run.snapshot_docs[k] for k in sorted(run.snapshot_docs)],
+                run.snapshot_dim,
+                run.snapshot_model,
             )
-            logger.info("[V2] Enqueued aggregate_subject_topics for subjectId=%s", subject_id)
-        except Exception:
-            logger.exception("[V2] Failed to enqueue aggregate_subject_topics for subjectId=%s", subject_id)
 
     logger.info(
         "[V2] Reindex completed subjectId=%s docs_ok=%s/%s total_chunks=%s batches=%s",
         subject_id,
-        docs_ok,
-        total_docs,
-        total_chunks,
-        batches_sent,
+        run.docs_ok,
+        run.total_docs,
+        run.total_chunks,
+        run.batches_sent,
     )
-
-    return {
+    result_payload: Dict[str, Any] = {
         "status": "ok",
         "subjectId": subject_id,
-        "docs": {"ok": docs_ok, "total": total_docs},
-        "chunks": total_chunks,
-        "batches": batches_sent,
+        "docs": {"ok": run.docs_ok, "total": run.total_docs},
+        "chunks": run.total_chunks,
+        "batches": run.batches_sent,
     }
+    if pca_summary is not None:
+        result_payload["pca"] = pca_summary
+    if dedup is not None:
+        result_payload["dedup"] = {**dedup.stats(), "promoted": run.promoted}
+        logger.info(
+            "[V2] Dedup subjectId=%s chunks=%s exact=%s near=%s ratio=%s promoted=%s",
+            subject_id,
+            dedup.seen,
+            dedup.exact_duplicates,
+            dedup.near_duplicates,
+            result_payload["dedup"]["ratio"],
+            run.promoted,
+        )
+    return result_payload
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+"""Per-process warm start for Celery worker children.
+
+Runs from `worker_process_init` (see celery_app) so the first real job after a
+fork or a `max_tasks_per_child` recycle does not pay for lazy imports, the S3
+client build, or the engine's first call. Every step is best-effort: a failing
+step is logged and skipped, never fatal to the worker.
+"""
+
+import io
+import logging
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def _import_heavy_modules() -> None:
+    import fitz  # noqa: F401  PyMuPDF
+    import sklearn.cluster
+    import sklearn.feature_extraction.text  # noqa: F401
+
+
+def _warm_s3_client() -> None:
+    from utils.s3 import _get_s3_client
+
+    _get_s3_client()
+
+
+def _warm_engine() -> None:
+    from app.core.conceptual_engine import get_engine
+
+    get_engine().embed_texts(["warm up"])
+
+
+def _warm_pdf_extraction() -> None:
+    import fitz
+
+    from utils.pdf import extract_text
+
+    buf = io.BytesIO()
+    with fitz.open() as doc:
+        page = doc.new_page(width=200, height=200)
+        page.insert_text((20, 40), "Warm up.")
+        doc.save(buf)
+    extract_text(buf.getvalue())
+
+
+def _warm_tfidf() -> None:
+    from utils.nlp import top_keywords
+
+    top_keywords("warm up the tfidf vectorizer once", top_k=3)
+
+
+_STEPS: Dict[str, Callable[[], None]] = {
+    "imports": _import_heavy_modules,
+    "s3": _warm_s3_client,
+    "engine": _warm_engine,
+    "pdf": _warm_pdf_extraction,
+    "tfidf": _warm_tfidf,
+}
+
+
+def warm_up() -> Dict[str, float]:
+    """Run all warm-up steps; returns elapsed milliseconds per step plus "total"."""
+    timings: Dict[str, float] = {}
+    t_start = time.perf_counter()
+    for name, step in _STEPS.items():
+        t0 = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("[Warmup] step %s failed; continuing", name, exc_info=True)
+            continue
+        timings[name] = round((time.perf_counter() - t0) * 1000.0, 2)
+    timings["total"] = round((time.perf_counter() - t_start) * 1000.0, 2)
+    logger.info(
+        "[Warmup] worker process ready in %.1f ms (%s)",
+        timings["total"],
+        " ".join(f"{k}={v:.1f}ms" for k, v in timings.items() if k != "total"),
+    )
+    return timings